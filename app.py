@@ -37,6 +37,15 @@ from components.refugios.routes import overpass_bp
 from components.funcionesAdmin.routes import admin_bp
 from components.categorias.routes import categorias_bp
 from components.contactos.routes import contactos_bp
+from components.publicaciones.indice_geo import cargar_indice_geo
+from components.publicaciones.coincidencias import cargar_indice_coincidencias
+from components.imagenes.phash import cargar_indice_phash
+from components.imagenes.subida import configurar_cloudinary
+from components.imagenes.contenido import cargar_indice_contenido
+from components.imagenes.almacen_local import almacen_local_bp
+from components.publicaciones.duplicados import cargar_indice_duplicados
+from components.publicaciones.services import sincronizar_archivadas
+from components.imagenes.services import purgar_imagenes_sueltas
 from core.models import db, Usuario, Notificacion 
 from datetime import datetime, timezone
 
@@ -108,6 +117,13 @@ app.config['CLOUDINARY_CLOUD_NAME'] = os.getenv("CLOUDINARY_CLOUD_NAME")
 app.config['CLOUDINARY_API_KEY'] = os.getenv("CLOUDINARY_API_KEY")
 app.config['CLOUDINARY_API_SECRET'] = os.getenv("CLOUDINARY_API_SECRET")
 app.config['CLOUDINARY_UPLOAD_PRESET'] = os.getenv("CLOUDINARY_UPLOAD_PRESET")
+configurar_cloudinary(app.config)
+# Subida directa: con ALMACEN_LOCAL_DIR se usa el almacén local en lugar de Cloudinary (pruebas sin conexión)
+app.config['ALMACEN_LOCAL_DIR'] = os.getenv("ALMACEN_LOCAL_DIR")
+
+# Avisos "nueva publicación en tu zona": "escritura" (una notificación por vecino)
+# o "lectura" (un evento por publicación que se suma al consultar)
+app.config['NOTIFICACIONES_ZONA'] = os.getenv("NOTIFICACIONES_ZONA", "escritura")
 
 # Registrar Blueprints
 app.register_blueprint(auth_bp)
@@ -130,6 +146,20 @@ app.register_blueprint(overpass_bp)
 app.register_blueprint(admin_bp, url_prefix="/api")
 app.register_blueprint(categorias_bp)
 app.register_blueprint(contactos_bp)
+if app.config['ALMACEN_LOCAL_DIR']:
+    app.register_blueprint(almacen_local_bp)
+
+# Índice geográfico en memoria de este worker (radio y mapa sin escanear la base)
+with app.app_context():
+    cargar_indice_geo()
+    # Vectores para las coincidencias entre publicaciones (perdido / encontrado)
+    cargar_indice_coincidencias()
+    # Hashes perceptuales de las imágenes (fotos parecidas)
+    cargar_indice_phash()
+    # Hash de contenido -> URL (no volver a subir la misma foto)
+    cargar_indice_contenido()
+    # Firmas MinHash para detectar re-posteos casi iguales
+    cargar_indice_duplicados()
 
 @app.before_request
 def handle_options():
@@ -151,7 +181,7 @@ def tarea_archivar_publicaciones():
                 SET estado = 1 
                 WHERE estado = 0 
                 AND COALESCE(fecha_modificacion, fecha_creacion) < NOW() - INTERVAL '6 months'
-                RETURNING id, id_usuario, titulo
+                RETURNING id, id_usuario, titulo, latitud, longitud, id_categoria, fecha_creacion
             """)
             
             result = db.session.execute(sql_query)
@@ -177,6 +207,10 @@ def tarea_archivar_publicaciones():
                     db.session.add(nueva_noti)
 
                 db.session.commit()
+
+                # Las archivadas dejan de aparecer en radio, mapa, teselas y feeds cacheados
+                sincronizar_archivadas(archivos_procesados)
+
                 print(f"ÉXITO: {len(archivos_procesados)} publicaciones archivadas y usuarios notificados.")
             
             else:
@@ -188,6 +222,17 @@ def tarea_archivar_publicaciones():
             print(f"ERROR CRÍTICO en tarea programada: {e}")
             db.session.rollback() # Deshace todo si algo falla
 
+
+
+def tarea_purgar_imagenes_sueltas():
+    with app.app_context():
+        try:
+            borradas = purgar_imagenes_sueltas()
+            print(f"[{datetime.now()}] Imágenes sueltas purgadas: {borradas}")
+        except Exception as e:
+            print(f"ERROR en la purga de imágenes sueltas: {e}")
+            db.session.rollback()
+
             
 if __name__ == '__main__':
     scheduler.init_app(app)
@@ -199,5 +244,12 @@ if __name__ == '__main__':
         hour=3, 
         minute=0
     )
+    scheduler.add_job(
+        id='purgar_imagenes_job',
+        func=tarea_purgar_imagenes_sueltas,
+        trigger='cron',
+        hour=3,
+        minute=30
+    )
     
     app.run(host='0.0.0.0', port=5000, debug=True)
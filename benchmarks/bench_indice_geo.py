@@ -0,0 +1,89 @@
+"""
+Benchmark del índice geográfico en memoria (components/publicaciones/indice_geo.py).
+
+Genera publicaciones sintéticas dentro de Argentina (sin base de datos) y
+reporta, por cada tamaño:
+  - tiempo de carga en frío (equivalente a cargar_indice_geo al iniciar un worker)
+  - memoria usada por el índice (tracemalloc) y la estimación de estadisticas()
+  - latencia de consultas por radio y de la vista completa del mapa
+
+Uso:
+    python -m benchmarks.bench_indice_geo
+    python -m benchmarks.bench_indice_geo --tamanios 100000 500000 --radio 10
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from components.publicaciones.indice_geo import IndiceGeo
+
+LAT_MIN, LAT_MAX = -55.0, -22.0
+LON_MIN, LON_MAX = -73.0, -53.0
+
+# Ciudades donde se concentra la mayoría de las publicaciones
+CIUDADES = [(-34.6037, -58.3816), (-31.4201, -64.1888), (-32.9442, -60.6505), (-24.7821, -65.4232)]
+
+
+def _filas_sinteticas(cantidad, semilla=42):
+    rnd = random.Random(semilla)
+    ahora = datetime.now(timezone.utc)
+    for id_publicacion in range(1, cantidad + 1):
+        if rnd.random() < 0.7:
+            lat_c, lon_c = rnd.choice(CIUDADES)
+            lat, lon = rnd.gauss(lat_c, 0.15), rnd.gauss(lon_c, 0.15)
+        else:
+            lat, lon = rnd.uniform(LAT_MIN, LAT_MAX), rnd.uniform(LON_MIN, LON_MAX)
+        fecha = ahora - timedelta(minutes=rnd.randint(0, 60 * 24 * 180))
+        yield (id_publicacion, lat, lon, rnd.randint(1, 4), fecha)
+
+
+def _mediana_ms(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[10_000, 100_000, 250_000])
+    parser.add_argument("--radio", type=float, default=10.0, help="Radio en km")
+    parser.add_argument("--repeticiones", type=int, default=7)
+    args = parser.parse_args()
+
+    lat_q, lon_q = CIUDADES[1]
+    print(f"{'filas':>9} | {'carga (s)':>9} | {'MiB reales':>10} | {'MiB estim.':>10} | "
+          f"{'MiB/100k':>8} | {'radio (ms)':>10} | {'resultados':>10}")
+    print("-" * 86)
+
+    for tamanio in args.tamanios:
+        filas = list(_filas_sinteticas(tamanio))
+
+        indice = IndiceGeo()
+        indice.cargar(filas)
+        stats = indice.estadisticas()
+
+        # Segunda carga solo para medir memoria (tracemalloc hace lenta la carga)
+        tracemalloc.start()
+        medido = IndiceGeo()
+        medido.cargar(filas)
+        memoria_real, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del medido
+
+        resultados = len(indice.en_radio(lat_q, lon_q, args.radio))
+        radio_ms = _mediana_ms(lambda: indice.en_radio(lat_q, lon_q, args.radio), args.repeticiones)
+
+        mib_real = memoria_real / 2 ** 20
+        print(f"{tamanio:>9} | {stats['segundos_carga']:>9.3f} | {mib_real:>10.1f} | "
+              f"{stats['bytes_aproximados'] / 2 ** 20:>10.1f} | {mib_real * 100_000 / tamanio:>8.1f} | "
+              f"{radio_ms:>10.2f} | {resultados:>10}")
+
+
+if __name__ == "__main__":
+    main()
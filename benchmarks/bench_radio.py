@@ -0,0 +1,127 @@
+"""
+Benchmark del filtro por radio a medida que crece la tabla de publicaciones.
+
+Compara, para varios tamaños de tabla:
+  - el filtro anterior (acos sobre coordenadas[1]/[2], recorre todas las filas)
+  - el filtro actual (_filtrar_por_radio: caja + índice GiST y luego distancia exacta)
+
+Trabaja sobre una tabla temporal `publicaciones` (copia de la estructura real,
+con sus índices) que tapa a la tabla real solo dentro de la transacción del
+benchmark, así que no modifica datos. Requiere DATABASE_URL y las migraciones
+aplicadas.
+
+Uso:
+    python -m benchmarks.bench_radio
+    python -m benchmarks.bench_radio --tamanios 10000 100000 500000 --radio 10
+"""
+import argparse
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+from flask import Flask
+from sqlalchemy import func, text
+
+from core.models import db, Publicacion
+from components.publicaciones.services import _query_ids_activas, _filtrar_por_radio
+
+# Caja aproximada de Argentina continental
+LAT_MIN, LAT_MAX = -55.0, -22.0
+LON_MIN, LON_MAX = -73.0, -53.0
+
+# Punto de consulta: Córdoba capital
+LAT_CONSULTA, LON_CONSULTA = -31.4201, -64.1888
+
+
+def _filtro_anterior(query, lat, lon, radio_km):
+    """Filtro por radio tal como estaba antes (acos sobre el array coordenadas)."""
+    pub_lat = Publicacion.coordenadas[1]
+    pub_lon = Publicacion.coordenadas[2]
+    distancia = 6371 * func.acos(
+        func.least(1.0, func.greatest(-1.0,
+            func.sin(func.radians(lat)) * func.sin(func.radians(pub_lat)) +
+            func.cos(func.radians(lat)) * func.cos(func.radians(pub_lat)) * func.cos(func.radians(pub_lon) - func.radians(lon))
+        ))
+    )
+    return query.filter(distancia <= radio_km)
+
+
+def _medir(construir_query, repeticiones):
+    """Devuelve la mediana en ms de ejecutar la primera página de la query."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        construir_query().order_by(
+            Publicacion.fecha_creacion.desc(), Publicacion.id.desc()
+        ).limit(12).all()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def _cargar_filas(desde, hasta):
+    """Inserta publicaciones sintéticas con ids en [desde, hasta)."""
+    db.session.execute(text("""
+        INSERT INTO publicaciones (id, id_usuario, titulo, fecha_creacion, estado,
+                                   coordenadas, latitud, longitud)
+        SELECT g, 1, 'bench ' || g, NOW() - (g || ' minutes')::interval, 0,
+               ARRAY[lat, lon], lat, lon
+        FROM (
+            SELECT g,
+                   :lat_min + random() * (:lat_max - :lat_min) AS lat,
+                   :lon_min + random() * (:lon_max - :lon_min) AS lon
+            FROM generate_series(:desde, :hasta - 1) AS g
+        ) AS puntos
+    """), {
+        "desde": desde, "hasta": hasta,
+        "lat_min": LAT_MIN, "lat_max": LAT_MAX,
+        "lon_min": LON_MIN, "lon_max": LON_MAX,
+    })
+    db.session.execute(text("ANALYZE publicaciones"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[10_000, 50_000, 100_000, 250_000, 500_000])
+    parser.add_argument("--radio", type=float, default=10.0, help="Radio en km")
+    parser.add_argument("--repeticiones", type=int, default=7)
+    args = parser.parse_args()
+
+    load_dotenv()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
+    db.init_app(app)
+
+    with app.app_context():
+        db.session.execute(text("""
+            CREATE TEMP TABLE publicaciones
+            (LIKE public.publicaciones INCLUDING DEFAULTS INCLUDING INDEXES)
+            ON COMMIT DROP
+        """))
+
+        print(f"Radio: {args.radio} km alrededor de ({LAT_CONSULTA}, {LON_CONSULTA})")
+        print(f"{'filas':>10} | {'anterior (ms)':>14} | {'caja+GiST (ms)':>15}")
+        print("-" * 46)
+
+        cargadas = 0
+        try:
+            for tamanio in sorted(args.tamanios):
+                _cargar_filas(cargadas + 1, tamanio + 1)
+                cargadas = tamanio
+
+                anterior = _medir(
+                    lambda: _filtro_anterior(_query_ids_activas(), LAT_CONSULTA, LON_CONSULTA, args.radio),
+                    args.repeticiones
+                )
+                actual = _medir(
+                    lambda: _filtrar_por_radio(_query_ids_activas(), LAT_CONSULTA, LON_CONSULTA, args.radio),
+                    args.repeticiones
+                )
+                print(f"{tamanio:>10} | {anterior:>14.2f} | {actual:>15.2f}")
+        finally:
+            # Nada de lo insertado llega a la base real
+            db.session.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ categorias_bp = Blueprint("categorias", __name__)
 from flask import Blueprint, jsonify
 from core.models import Categoria, db
 from functools import lru_cache # Importar esto
+from core.http_cache import etag_de, responder_con_etag, CACHE_CATALOGO
 
 categorias_bp = Blueprint("categorias", __name__)
 
@@ -16,6 +17,11 @@ def get_cached_categories():
             .order_by(Categoria.id)\
             .all()
 
+# El ETag sale de la misma lista cacheada, así que tampoco cambia mientras viva el proceso
+@lru_cache(maxsize=1)
+def get_etag_categorias():
+    return etag_de('categorias', *(tuple(c) for c in get_cached_categories()))
+
 @categorias_bp.route('/api/categorias', methods=['GET'])
 def get_categorias():
     try:
@@ -24,13 +30,13 @@ def get_categorias():
         # Las siguientes veces retornará lo que tiene en memoria RAM instantáneamente.
         cats = get_cached_categories()
 
-        return jsonify([
+        return responder_con_etag(get_etag_categorias(), lambda: [
             {
                 "id": c.id, 
                 "nombre": c.nombre, 
                 "descripcion": c.descripcion
             } for c in cats
-        ]), 200
+        ], CACHE_CATALOGO)
 
     except Exception as e:
         print(f"Error: {e}")
@@ -2,12 +2,14 @@ from flask import Blueprint, request, jsonify, g
 from components.comentarios.services import (
     crear_comentario,
     obtener_comentarios_por_publicacion,
+    version_comentarios_publicacion,
     obtener_comentario_por_su_id,
     obtener_todos,
     actualizar_comentario,
     eliminar_comentario
 )
 from auth.services import require_auth
+from core.http_cache import etag_de, responder_con_etag, CACHE_CONTENIDO
 
 comentarios_bp = Blueprint("comentarios", __name__)
 
@@ -23,7 +25,12 @@ def crear():
 @comentarios_bp.route("/comentarios/publicacion/<int:id_publicacion>", methods=["GET"])
 def get_comentario_por_id_publicacion(id_publicacion):
     """Obtiene comentarios por ID de publicación."""
-    return jsonify(obtener_comentarios_por_publicacion(id_publicacion)), 200
+    version = version_comentarios_publicacion(id_publicacion)
+    return responder_con_etag(
+        etag_de('comentarios', id_publicacion, *version),
+        lambda: obtener_comentarios_por_publicacion(id_publicacion),
+        CACHE_CONTENIDO
+    )
 
 
 @comentarios_bp.route("/comentarios/<int:id_comentario>", methods=["GET"])
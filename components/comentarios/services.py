@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 from core.models import db, Comentario, Publicacion, Notificacion,Usuario
+from sqlalchemy import func
 from components.notificaciones.services import crear_notificacion
 import pytz
 
@@ -44,26 +45,39 @@ def crear_comentario(data):
 
 
 
+def version_comentarios_publicacion(id_public):
+    """(cantidad, id máximo, última modificación) de los comentarios de una publicación, para el ETag."""
+    return tuple(
+        db.session.query(
+            func.count(Comentario.id), func.max(Comentario.id), func.max(Comentario.fecha_modificacion)
+        )
+        .filter(Comentario.id_publicacion == id_public)
+        .one()
+    )
+
+
+def serializar_comentario(c):
+    """Dict de un comentario tal como lo devuelve /comentarios/publicacion/<id>."""
+    return {
+        "id": c.id,
+        "id_usuario": c.id_usuario,
+        "descripcion": c.descripcion,
+        "fecha_creacion": (
+            c.fecha_creacion.astimezone(zona_arg).isoformat()
+            if c.fecha_creacion else None
+        ),
+        "fecha_modificacion": (
+            c.fecha_modificacion.astimezone(zona_arg).isoformat()
+            if c.fecha_modificacion else None
+        ),
+        "id_anterior": c.id_anterior
+    }
+
+
 def obtener_comentarios_por_publicacion(id_public):
     """Obtiene todos los comentarios asociados a una publicación por su ID."""
     comentarios = Comentario.query.filter_by(id_publicacion=id_public).all()
-    resultado = []
-    for c in comentarios:
-        resultado.append({
-            "id": c.id,
-            "id_usuario": c.id_usuario,
-            "descripcion": c.descripcion,
-            "fecha_creacion": (
-                c.fecha_creacion.astimezone(zona_arg).isoformat()
-                if c.fecha_creacion else None
-            ),
-            "fecha_modificacion": (
-                c.fecha_modificacion.astimezone(zona_arg).isoformat()
-                if c.fecha_modificacion else None
-            ),
-            "id_anterior": c.id_anterior
-        })
-    return resultado
+    return [serializar_comentario(c) for c in comentarios]
 
 
 def obtener_comentario_por_su_id(id_comentario):
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from core.models import db, Etiqueta
+from components.publicaciones.tarjetas import invalidar_tarjetas_de_etiqueta
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
+from core.http_cache import etag_de, huella, responder_con_etag, CACHE_LISTA
 
 # 1. Quitamos el url_prefix para tener control total de la ruta
 etiquetas_bp = Blueprint('etiquetas', __name__)
@@ -9,8 +12,13 @@ etiquetas_bp = Blueprint('etiquetas', __name__)
 @etiquetas_bp.route('/api/etiquetas', methods=['GET'])
 def listar_etiquetas():
     """Lista todas las etiquetas ordenadas por nombre."""
-    etiquetas = Etiqueta.query.order_by(Etiqueta.nombre).all()
-    return jsonify([{"id": e.id, "nombre": e.nombre} for e in etiquetas])
+    version = db.session.query(func.count(Etiqueta.id), huella(Etiqueta.id, Etiqueta.id, Etiqueta.nombre)).one()
+
+    def construir():
+        etiquetas = Etiqueta.query.order_by(Etiqueta.nombre).all()
+        return [{"id": e.id, "nombre": e.nombre} for e in etiquetas]
+
+    return responder_con_etag(etag_de('etiquetas', *version), construir, CACHE_LISTA)
 
 
 # 3. Lo mismo para el POST: ruta sin barra final
@@ -61,6 +69,8 @@ def actualizar_etiqueta(id_etiqueta):
         return jsonify({"error": "Otra etiqueta con ese nombre ya existe"}), 409
 
     etiqueta.nombre = nuevo_nombre
+    # El nombre de la etiqueta se ve en las tarjetas del listado
+    invalidar_tarjetas_de_etiqueta(id_etiqueta)
     try:
         db.session.commit()
     except IntegrityError:
@@ -77,6 +87,7 @@ def eliminar_etiqueta(id_etiqueta):
     if not etiqueta:
         return jsonify({"error": "Etiqueta no encontrada"}), 404
 
+    invalidar_tarjetas_de_etiqueta(id_etiqueta)
     db.session.delete(etiqueta)
     try:
         db.session.commit()
@@ -2,6 +2,8 @@
 from flask import Blueprint, request, jsonify
 from core.models import db, Usuario, Publicacion, Reporte
 from components.funcionesAdmin.services import actualizar_datos_usuario
+from components.publicaciones.serializador import leer_campos, opciones_carga, serializar, CAMPOS_ADMIN
+from components.publicaciones.services import obtener_grupos_duplicados
 from firebase_admin import auth
 from datetime import datetime
 from core.auth_middleware import require_admin   # <--- IMPORTANTE
@@ -95,6 +97,7 @@ def admin_obtener_publicaciones():
 
         page = request.args.get("page", default=1, type=int)
         limit = request.args.get("limit", default=15, type=int)
+        campos = leer_campos(request.args.get("fields"), CAMPOS_ADMIN)
 
         query = Publicacion.query
 
@@ -128,7 +131,18 @@ def admin_obtener_publicaciones():
         query = query.order_by(Publicacion.fecha_creacion.desc())
         total = query.count()
 
-        publicaciones = query.offset((page - 1) * limit).limit(limit).all()
+        pagina = query.offset((page - 1) * limit).limit(limit)
+        if campos is not None:
+            # Solo las columnas y relaciones de los campos pedidos
+            resultado = [serializar(pub, campos) for pub in pagina.options(*opciones_carga(campos)).all()]
+            return jsonify({
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "publicaciones": resultado
+            }), 200
+
+        publicaciones = pagina.all()
 
         resultado = []
         for pub in publicaciones:
@@ -149,6 +163,29 @@ def admin_obtener_publicaciones():
             "publicaciones": resultado
         }), 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# --- Publicaciones casi duplicadas ---
+@admin_bp.route('/admin/publicaciones/duplicados', methods=['GET'])
+@require_admin
+def admin_obtener_duplicados():
+    try:
+        page = request.args.get("page", default=1, type=int)
+        limit = request.args.get("limit", default=20, type=int)
+
+        grupos, total = obtener_grupos_duplicados(page=page, limit=limit)
+
+        return jsonify({
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "grupos": grupos
+        }), 200
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,100 @@
+"""
+Almacén local que imita la API de subida de Cloudinary, para probar la subida
+directa con firma (/imagenes/firma + /imagenes/confirmar) sin conexión.
+
+Se activa con ALMACEN_LOCAL_DIR: la firma apunta acá en lugar de a Cloudinary.
+Verifica la firma y la hora de los parámetros como Cloudinary, guarda el archivo
+en el directorio (convertido al `format` firmado, si viene, pero sin aplicar la
+transformación) y responde con public_id, version, format y signature firmada
+con el mismo secreto.
+"""
+import hmac
+import os
+import time
+from io import BytesIO
+
+from flask import Blueprint, current_app, jsonify, request, send_from_directory, url_for
+from PIL import Image, UnidentifiedImageError
+
+from components.imagenes.services import firmar_parametros, firma_respuesta
+
+almacen_local_bp = Blueprint("almacen_local", __name__)
+
+# Cloudinary rechaza firmas con más de una hora
+SEGUNDOS_VALIDEZ_TIMESTAMP = 3600
+
+# Campos del form que no entran en la firma (igual que en Cloudinary)
+_SIN_FIRMA = {"file", "api_key", "signature", "resource_type", "cloud_name"}
+
+_FORMATOS_PIL = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif", "HEIF": "heic"}
+# Formato pedido en los parámetros -> nombre para Image.save
+_GUARDAR_COMO = {"jpg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+def _error(mensaje, status):
+    return jsonify({"error": {"message": mensaje}}), status
+
+
+@almacen_local_bp.route("/almacen-local/v1_1/<cloud_name>/image/upload", methods=["POST"])
+def subir(cloud_name):
+    """Recibe la subida firmada (multipart con `file` y los parámetros de /imagenes/firma)."""
+    config = current_app.config
+    formulario = request.form.to_dict()
+    archivo = request.files.get("file")
+    if archivo is None:
+        return _error("Missing required parameter - file", 400)
+    if formulario.get("api_key") != config.get("CLOUDINARY_API_KEY"):
+        return _error("Invalid api_key", 401)
+
+    parametros = {k: v for k, v in formulario.items() if k not in _SIN_FIRMA}
+    firma = firmar_parametros(parametros, config["CLOUDINARY_API_SECRET"])
+    if not hmac.compare_digest(formulario.get("signature", ""), firma):
+        return _error("Invalid Signature", 401)
+    timestamp = formulario.get("timestamp", "")
+    if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > SEGUNDOS_VALIDEZ_TIMESTAMP:
+        return _error("Stale request", 400)
+
+    contenido = archivo.read()
+    pedido = parametros.get("format")
+    if pedido and pedido not in _GUARDAR_COMO:
+        return _error(f"Invalid format {pedido}", 400)
+    try:
+        with Image.open(BytesIO(contenido)) as imagen:
+            formato = _FORMATOS_PIL.get(imagen.format)
+            ancho, alto = imagen.size
+            permitidos = [f for f in parametros.get("allowed_formats", "").split(",") if f]
+            if formato is None or (permitidos and formato not in permitidos):
+                return _error("Image format not allowed", 400)
+            if pedido and pedido != formato:
+                salida = BytesIO()
+                imagen.save(salida, _GUARDAR_COMO[pedido])
+                contenido, formato = salida.getvalue(), pedido
+    except (UnidentifiedImageError, OSError):
+        return _error("Invalid image file", 400)
+
+    public_id = parametros.get("public_id") or f"{int(time.time())}_{os.urandom(6).hex()}"
+    version = int(time.time())
+    destino = os.path.join(config["ALMACEN_LOCAL_DIR"], f"v{version}", f"{public_id}.{formato}")
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    with open(destino, "wb") as salida:
+        salida.write(contenido)
+
+    url = url_for("almacen_local.archivo", version=version, ruta=f"{public_id}.{formato}", _external=True)
+    return jsonify({
+        "public_id": public_id,
+        "version": version,
+        "signature": firma_respuesta(public_id, version, config["CLOUDINARY_API_SECRET"]),
+        "format": formato,
+        "width": ancho,
+        "height": alto,
+        "bytes": len(contenido),
+        "resource_type": "image",
+        "url": url,
+        "secure_url": url,
+    }), 200
+
+
+@almacen_local_bp.route("/almacen-local/archivos/v<int:version>/<path:ruta>", methods=["GET"])
+def archivo(version, ruta):
+    """Sirve un archivo subido al almacén local."""
+    return send_from_directory(os.path.join(current_app.config["ALMACEN_LOCAL_DIR"], f"v{version}"), ruta)
@@ -0,0 +1,82 @@
+"""
+Índice de contenido de las imágenes subidas: (usuario, hash) -> URL ya guardada.
+
+El hash es SHA-256 de la imagen normalizada por el pipeline de subida
+(enderezada, achicada, en RGB/RGBA): la misma foto adjuntada otra vez por el
+mismo usuario, aunque cambie el EXIF o el nombre del archivo, da el mismo hash
+y /subir-imagenes devuelve la URL existente sin volver a subirla. La búsqueda
+es por usuario: una foto igual subida por otra persona no devuelve su URL (ni
+la liga a sus publicaciones), se sube de nuevo.
+
+El hash queda en imagenes.hash_contenido, así cada worker arma el índice desde
+la base al iniciar y lo recarga completo cada SEGUNDOS_RECARGA (incorpora lo
+que subieron los otros workers).
+"""
+import hashlib
+import threading
+import time
+
+from core.recarga import IndiceRecargable
+
+
+def hash_contenido(imagen):
+    """SHA-256 (hex) de los píxeles de una imagen PIL ya normalizada, con su modo y tamaño."""
+    digest = hashlib.sha256(f"{imagen.mode}:{imagen.width}x{imagen.height}:".encode())
+    digest.update(imagen.tobytes())
+    return digest.hexdigest()
+
+
+class IndiceContenido:
+    """(id_usuario, hash_contenido) -> URL de una imagen que ese usuario ya subió con ese contenido."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._urls = {}
+        self.cargado = False
+        self.cargado_en = None
+
+    def cargar(self, filas):
+        """Reconstruye el índice desde filas (id_usuario, hash_contenido, url)."""
+        urls = {}
+        for id_usuario, hash_imagen, url in filas:
+            urls.setdefault((id_usuario, hash_imagen), url)
+        with self._lock:
+            self._urls = urls
+            self.cargado = True
+            self.cargado_en = time.monotonic()
+
+    def url_de(self, id_usuario, hash_imagen):
+        with self._lock:
+            return self._urls.get((id_usuario, hash_imagen))
+
+    def agregar(self, id_usuario, hash_imagen, url):
+        with self._lock:
+            self._urls.setdefault((id_usuario, hash_imagen), url)
+
+    def estadisticas(self):
+        with self._lock:
+            return {"cargado": self.cargado, "hashes": len(self._urls)}
+
+
+indice_contenido = IndiceContenido()
+
+
+def _cargar_indice_contenido():
+    # Import diferido para no crear un ciclo con core.models al importar el paquete
+    from core.models import db, Imagen, Publicacion
+
+    # Las imágenes anteriores a imagenes.id_usuario son del dueño de su publicación
+    id_usuario = db.func.coalesce(Imagen.id_usuario, Publicacion.id_usuario)
+    indice_contenido.cargar(
+        tuple(fila) for fila in
+        db.session.query(id_usuario, Imagen.hash_contenido, Imagen.url)
+        .outerjoin(Publicacion, Publicacion.id == Imagen.id_publicacion)
+        .filter(Imagen.hash_contenido.isnot(None), Imagen.url.isnot(None), id_usuario.isnot(None))
+        .order_by(Imagen.id)
+        .yield_per(5000)
+    )
+
+
+_recarga = IndiceRecargable(indice_contenido, _cargar_indice_contenido, "el índice de contenido de imágenes")
+cargar_indice_contenido = _recarga.cargar
+indice_contenido_disponible = _recarga.disponible
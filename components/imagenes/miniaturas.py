@@ -0,0 +1,235 @@
+"""
+Miniaturas servidas por la app (/imagenes/<id>/thumb?w=) para marcadores del
+mapa y tarjetas, con cache en disco.
+
+La primera vez se descarga la imagen (la variante de tarjeta, que alcanza
+para todos los ANCHOS), se achica con Pillow en un pool de threads y se guarda
+en DIRECTORIO_MINIATURAS con nombre = hash del contenido y el ancho: dos
+Imagenes con la misma foto comparten archivo. Después se sirve desde disco con
+headers de cache inmutables.
+
+El directorio se limita a BYTES_MAXIMOS_CACHE borrando los archivos usados
+hace más tiempo (LRU por fecha de modificación, que se actualiza en cada hit).
+El tamaño sale de escanear el directorio, compartido por todos los workers,
+después de los renders (cada SEGUNDOS_ENTRE_RECORTES como mucho, o antes si se
+escribió mucho). Las miniaturas se sirven desde los bytes leídos, no desde la
+ruta: un archivo que otro worker borra entretanto se vuelve a generar.
+
+Pedidos simultáneos de la misma miniatura que todavía no existe esperan un
+único render (single-flight).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from components.imagenes.phash import descargar
+from components.imagenes.variantes import variante_de
+
+DIRECTORIO_MINIATURAS = os.getenv("MINIATURAS_DIR") or os.path.join(tempfile.gettempdir(), "miniaturas")
+BYTES_MAXIMOS_CACHE = int(os.getenv("MINIATURAS_MAX_MB", "512")) * 1024 * 1024
+MINIATURAS_WORKERS = int(os.getenv("MINIATURAS_WORKERS", "4"))
+SEGUNDOS_ENTRE_RECORTES = 30
+# Al pasarse del máximo se borra hasta este porcentaje (margen para no escanear en cada render)
+FRACCION_TRAS_RECORTE = 0.9
+
+# Anchos que se generan: el pedido se redondea hacia arriba (acota las variantes en disco)
+ANCHOS = (64, 128, 160, 256, 320, 480)
+ANCHO_POR_DEFECTO = 160
+# Los marcadores del mapa se dibujan a 64 px; 128 cubre pantallas 2x
+ANCHO_MARCADOR = 128
+CALIDAD_WEBP = 75
+
+SEGUNDOS_CACHE_HTTP = 365 * 24 * 3600
+
+_pool = ThreadPoolExecutor(max_workers=MINIATURAS_WORKERS, thread_name_prefix="miniaturas")
+
+
+def ancho_permitido(ancho):
+    """El menor de ANCHOS que sea >= ancho (o el mayor si se pide más)."""
+    if ancho is None:
+        return ANCHO_POR_DEFECTO
+    return next((a for a in ANCHOS if a >= ancho), ANCHOS[-1])
+
+
+def url_thumb(imagen, ancho=ANCHO_MARCADOR):
+    """Ruta (relativa a la API) de la miniatura servida por la app, o None sin imagen."""
+    if imagen is None:
+        return None
+    return f"/imagenes/{imagen.id}/thumb?w={ancho_permitido(ancho)}"
+
+
+def clave_miniatura(imagen, ancho):
+    """Nombre del archivo en cache: hash del contenido (o de la URL si todavía no lo tiene) y ancho."""
+    origen = imagen.hash_contenido or hashlib.sha256((imagen.url or "").encode("utf-8")).hexdigest()
+    return f"{origen}_{ancho}"
+
+
+def renderizar(contenido, ancho):
+    """WebP de `ancho` px de ancho máximo (sin agrandar) a partir de los bytes de la imagen."""
+    with Image.open(BytesIO(contenido)) as imagen:
+        imagen.draft("RGB", (ancho, ancho))
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen = imagen.convert("RGBA" if "A" in imagen.getbands() else "RGB")
+        imagen.thumbnail((ancho, ancho * 4), Image.Resampling.LANCZOS)
+        salida = BytesIO()
+        imagen.save(salida, "WEBP", quality=CALIDAD_WEBP)
+        return salida.getvalue()
+
+
+class CacheMiniaturas:
+    """Miniaturas en disco con el tamaño total acotado por un escaneo del directorio compartido."""
+
+    def __init__(self, directorio, bytes_maximos):
+        self.directorio = directorio
+        self.bytes_maximos = bytes_maximos
+        # Reentrante: el callback de un futuro que ya terminó corre en el mismo thread
+        self._lock = threading.RLock()
+        self._lock_recorte = threading.Lock()
+        self._en_curso = {}
+        self._recortado_en = None
+        self._escritos_desde_recorte = 0
+        self.archivos = 0
+        self.bytes = 0
+        self.aciertos = 0
+        self.renders = 0
+        self.esperas = 0
+        self.desalojos = 0
+
+    def ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], f"{clave}.webp")
+
+    def _leer(self, ruta):
+        """Bytes del archivo, o None si no existe (o lo acaba de borrar otro worker)."""
+        try:
+            with open(ruta, "rb") as archivo:
+                contenido = archivo.read()
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        return contenido
+
+    def recortar(self):
+        """
+        Escanea el directorio (compartido por todos los workers) y borra las
+        miniaturas usadas hace más tiempo hasta quedar en FRACCION_TRAS_RECORTE
+        del máximo.
+        """
+        if not self._lock_recorte.acquire(blocking=False):
+            return
+        try:
+            archivos = []
+            for raiz, _, nombres in os.walk(self.directorio):
+                for nombre in nombres:
+                    if not nombre.endswith(".webp"):
+                        continue
+                    ruta = os.path.join(raiz, nombre)
+                    try:
+                        datos = os.stat(ruta)
+                    except FileNotFoundError:
+                        continue
+                    archivos.append((datos.st_mtime, datos.st_size, ruta))
+            total = sum(tamanio for _, tamanio, _ in archivos)
+            desalojos = 0
+            if total > self.bytes_maximos:
+                objetivo = self.bytes_maximos * FRACCION_TRAS_RECORTE
+                for _, tamanio, ruta in sorted(archivos):
+                    if total <= objetivo:
+                        break
+                    try:
+                        os.remove(ruta)
+                        desalojos += 1
+                    except FileNotFoundError:
+                        pass
+                    total -= tamanio
+            with self._lock:
+                self.archivos = len(archivos) - desalojos
+                self.bytes = total
+                self.desalojos += desalojos
+                self._recortado_en = time.monotonic()
+                self._escritos_desde_recorte = 0
+        finally:
+            self._lock_recorte.release()
+
+    def _toca_recortar(self):
+        """Con el lock tomado: al primer uso, cada SEGUNDOS_ENTRE_RECORTES o tras escribir mucho."""
+        return (
+            self._recortado_en is None
+            or time.monotonic() - self._recortado_en > SEGUNDOS_ENTRE_RECORTES
+            or self._escritos_desde_recorte > self.bytes_maximos * (1 - FRACCION_TRAS_RECORTE)
+        )
+
+    def _generar(self, clave, origen, ancho):
+        contenido = renderizar(descargar(origen, reducida=False), ancho)
+        ruta = self.ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: nadie lee un archivo a medio escribir
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as salida:
+            salida.write(contenido)
+        os.replace(temporal, ruta)
+        with self._lock:
+            self.renders += 1
+            self._escritos_desde_recorte += len(contenido)
+            recortar = self._toca_recortar()
+        if recortar:
+            # Fuera del render: el escaneo no demora la respuesta
+            _pool.submit(self.recortar)
+        return contenido
+
+    def obtener(self, clave, origen, ancho):
+        """
+        Bytes de la miniatura. Se leen del disco y no se devuelve la ruta: otro
+        worker puede borrar el archivo en cualquier momento. Si no existe (o
+        desapareció) se genera, una sola vez aunque la pidan varios.
+        """
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+        if futuro is None:
+            contenido = self._leer(self.ruta(clave))
+            if contenido is not None:
+                with self._lock:
+                    self.aciertos += 1
+                return contenido
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is None:
+                futuro = _pool.submit(self._generar, clave, origen, ancho)
+                self._en_curso[clave] = futuro
+                futuro.add_done_callback(lambda _, clave=clave: self._terminar(clave))
+            else:
+                self.esperas += 1
+        return futuro.result()
+
+    def _terminar(self, clave):
+        with self._lock:
+            self._en_curso.pop(clave, None)
+
+    def estadisticas(self):
+        """Contadores de este worker; archivos y bytes son del directorio en el último escaneo."""
+        with self._lock:
+            return {
+                "archivos": self.archivos,
+                "bytes": self.bytes,
+                "bytes_maximos": self.bytes_maximos,
+                "aciertos": self.aciertos,
+                "renders": self.renders,
+                "esperas": self.esperas,
+                "desalojos": self.desalojos,
+                "en_curso": len(self._en_curso),
+            }
+
+
+cache_miniaturas = CacheMiniaturas(DIRECTORIO_MINIATURAS, BYTES_MAXIMOS_CACHE)
+
+
+def miniatura(imagen, ancho):
+    """(bytes, clave) de la miniatura de `imagen` en el ancho permitido más cercano."""
+    ancho = ancho_permitido(ancho)
+    clave = clave_miniatura(imagen, ancho)
+    return cache_miniaturas.obtener(clave, variante_de(imagen, "tarjeta"), ancho), clave
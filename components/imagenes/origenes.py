@@ -0,0 +1,52 @@
+"""
+Orígenes de imágenes que el servidor puede descargar.
+
+Imagen.url la escribe el cliente (POST /imagenes, crear/actualizar_publicacion),
+así que nunca se descarga una URL cualquiera: solo las de nuestra cuenta de
+Cloudinary (res.cloudinary.com/<CLOUDINARY_CLOUD_NAME>/...) y, con
+ALMACEN_LOCAL_DIR, los archivos del almacén local, que se leen directo del
+disco. Lo usan el phash, las variantes, las miniaturas y el PDF.
+"""
+import os
+from urllib.parse import urlparse
+
+from flask import current_app, has_app_context
+from werkzeug.utils import safe_join
+
+PREFIJO_ALMACEN_LOCAL = "/almacen-local/archivos/"
+
+
+class OrigenNoPermitido(ValueError):
+    """La URL no es de un almacenamiento propio."""
+
+
+def _config(nombre):
+    # Las descargas también corren en pools sin contexto de app (miniaturas)
+    if has_app_context():
+        return current_app.config.get(nombre)
+    return os.getenv(nombre)
+
+
+def ruta_almacen_local(url):
+    """Ruta en disco de una URL del almacén local, o None si no es del almacén (o no está activo)."""
+    directorio = _config("ALMACEN_LOCAL_DIR")
+    ruta = urlparse(url or "").path
+    if not directorio or not ruta.startswith(PREFIJO_ALMACEN_LOCAL):
+        return None
+    return safe_join(directorio, ruta[len(PREFIJO_ALMACEN_LOCAL):])
+
+
+def es_cloudinary_propia(url):
+    partes = urlparse(url or "")
+    cloud_name = _config("CLOUDINARY_CLOUD_NAME")
+    return (
+        bool(cloud_name)
+        and partes.scheme == "https"
+        and partes.hostname == "res.cloudinary.com"
+        and partes.port is None
+        and partes.path.startswith(f"/{cloud_name}/")
+    )
+
+
+def origen_permitido(url):
+    return es_cloudinary_propia(url) or ruta_almacen_local(url) is not None
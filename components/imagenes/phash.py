@@ -0,0 +1,227 @@
+"""
+Hash perceptual (pHash) de las imágenes y búsqueda de fotos parecidas.
+
+El pHash resume una imagen en 64 bits a partir de las frecuencias bajas de su
+DCT: dos fotos casi iguales (recortadas, recomprimidas, con otro tamaño) quedan
+a pocos bits de distancia de Hamming. Se guarda en imagenes.phash.
+
+Para buscar sin comparar contra todas, cada worker arma en memoria un índice
+multi-hash (IndicePhash): tablas por tramo del hash donde solo se miran las
+entradas que pueden estar a la distancia pedida.
+
+Los hashes se calculan fuera del request, en el pool de core.tareas
+(encolar_hash_imagenes), y `flask imagenes calcular-phash` completa los que falten.
+"""
+import os
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import requests
+from PIL import Image
+
+from core.recarga import IndiceRecargable
+from components.imagenes.origenes import OrigenNoPermitido, es_cloudinary_propia, ruta_almacen_local
+
+LADO_DCT = 32
+LADO_HASH = 8
+BYTES_MAXIMOS_IMAGEN = 10 * 1024 * 1024
+TIMEOUT_DESCARGA = 10
+
+# Distancia (bits distintos de 64) hasta la que dos fotos se consideran parecidas
+DISTANCIA_SIMILAR = 10
+# Máxima que se puede pedir: más arriba la búsqueda deja de ser selectiva
+DISTANCIA_MAXIMA = 16
+
+# Matriz de la DCT-II ortonormal de LADO_DCT puntos: D = C @ X @ C.T
+_k = np.arange(LADO_DCT)[:, None]
+_n = np.arange(LADO_DCT)[None, :]
+_MATRIZ_DCT = np.cos(np.pi * (2 * _n + 1) * _k / (2 * LADO_DCT)) * np.sqrt(2 / LADO_DCT)
+_MATRIZ_DCT[0] /= np.sqrt(2)
+
+
+def _url_reducida(url):
+    """En Cloudinary se pide la imagen ya achicada: el hash solo usa 32x32 píxeles."""
+    if "res.cloudinary.com" in url and "/upload/" in url:
+        return url.replace("/upload/", f"/upload/w_{LADO_DCT * 2},h_{LADO_DCT * 2},c_scale/", 1)
+    return url
+
+
+def descargar(url, reducida=True):
+    """
+    Bytes de la imagen (achicada para el hash, salvo reducida=False), cortando
+    en BYTES_MAXIMOS_IMAGEN. Solo de orígenes propios (ver imagenes.origenes):
+    lanza OrigenNoPermitido con cualquier otra URL.
+    """
+    ruta_local = ruta_almacen_local(url)
+    if ruta_local is not None:
+        if os.path.getsize(ruta_local) > BYTES_MAXIMOS_IMAGEN:
+            raise ValueError("La imagen supera el tamaño máximo")
+        with open(ruta_local, "rb") as archivo:
+            return archivo.read()
+    if not es_cloudinary_propia(url):
+        raise OrigenNoPermitido(f"Origen de imagen no permitido: {url}")
+
+    destino = _url_reducida(url) if reducida else url
+    with requests.get(destino, timeout=TIMEOUT_DESCARGA, stream=True, allow_redirects=False) as respuesta:
+        respuesta.raise_for_status()
+        contenido = bytearray()
+        for bloque in respuesta.iter_content(64 * 1024):
+            contenido += bloque
+            if len(contenido) > BYTES_MAXIMOS_IMAGEN:
+                raise ValueError("La imagen supera el tamaño máximo")
+        return bytes(contenido)
+
+
+def phash_de_bytes(contenido):
+    """pHash de 64 bits como entero con signo (para guardarlo en un BIGINT)."""
+    with Image.open(BytesIO(contenido)) as imagen:
+        pixeles = np.asarray(
+            imagen.convert("L").resize((LADO_DCT, LADO_DCT), Image.Resampling.LANCZOS), dtype=np.float64
+        )
+    bajas = (_MATRIZ_DCT @ pixeles @ _MATRIZ_DCT.T)[:LADO_HASH, :LADO_HASH].ravel()
+    # La componente continua (brillo medio) no entra en la mediana
+    bits = bajas > np.median(bajas[1:])
+    valor = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return valor - (1 << 64) if valor >= (1 << 63) else valor
+
+
+def calcular_phash(url):
+    return phash_de_bytes(descargar(url))
+
+
+def distancia_hamming(a, b):
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def _mascaras(bits, maximo):
+    """Máscaras de `bits` bits con hasta `maximo` bits en 1 (las variantes a probar por tramo)."""
+    mascaras = [0]
+    for _ in range(maximo):
+        mascaras = sorted({m | (1 << b) for m in mascaras for b in range(bits)} | set(mascaras))
+    return mascaras
+
+
+class IndicePhash:
+    """
+    Hashes de las imágenes (id_imagen -> (phash, id_publicacion)) en un índice
+    multi-hash: el hash de 64 bits se parte en TRAMOS tramos de 16 bits y cada
+    tramo tiene su tabla valor -> ids. Si dos hashes están a distancia <= r, por
+    el principio del palomar algún tramo está a <= r // TRAMOS, así que alcanza
+    con mirar en cada tabla las variantes del tramo a esa distancia y verificar
+    la distancia completa solo de esos candidatos.
+    """
+
+    TRAMOS = 4
+    BITS_TRAMO = 16
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._imagenes = {}
+        self._tablas = [{} for _ in range(self.TRAMOS)]
+        self.cargado = False
+        self.cargado_en = None
+
+    def _tramos(self, phash):
+        valor = phash & 0xFFFFFFFFFFFFFFFF
+        mascara = (1 << self.BITS_TRAMO) - 1
+        return [(valor >> (self.BITS_TRAMO * i)) & mascara for i in range(self.TRAMOS)]
+
+    def _insertar(self, tablas, id_imagen, phash):
+        for tabla, tramo in zip(tablas, self._tramos(phash)):
+            tabla.setdefault(tramo, set()).add(id_imagen)
+
+    def _borrar(self, id_imagen):
+        previo = self._imagenes.pop(id_imagen, None)
+        if previo is None:
+            return
+        for tabla, tramo in zip(self._tablas, self._tramos(previo[0])):
+            ids = tabla.get(tramo)
+            if ids is not None:
+                ids.discard(id_imagen)
+                if not ids:
+                    del tabla[tramo]
+
+    def cargar(self, filas):
+        """Reconstruye el índice desde filas (id_imagen, phash, id_publicacion)."""
+        imagenes = {}
+        tablas = [{} for _ in range(self.TRAMOS)]
+        for id_imagen, phash, id_publicacion in filas:
+            imagenes[id_imagen] = (phash, id_publicacion)
+            self._insertar(tablas, id_imagen, phash)
+        with self._lock:
+            self._imagenes, self._tablas = imagenes, tablas
+            self.cargado = True
+            self.cargado_en = time.monotonic()
+
+    def agregar(self, id_imagen, phash, id_publicacion):
+        with self._lock:
+            self._borrar(id_imagen)
+            self._imagenes[id_imagen] = (phash, id_publicacion)
+            self._insertar(self._tablas, id_imagen, phash)
+
+    def quitar(self, ids_imagenes):
+        with self._lock:
+            for id_imagen in ids_imagenes:
+                self._borrar(id_imagen)
+
+    def similares(self, phash, distancia_maxima=DISTANCIA_SIMILAR):
+        """
+        [(id_imagen, id_publicacion, distancia)] de las imágenes parecidas a `phash`.
+        La búsqueda por tramos solo es exacta hasta DISTANCIA_MAXIMA: una distancia
+        mayor se recorta a ese valor.
+        """
+        distancia_maxima = min(distancia_maxima, DISTANCIA_MAXIMA)
+        mascaras = _mascaras_por_radio(distancia_maxima // self.TRAMOS)
+        resultado = []
+        with self._lock:
+            candidatos = set()
+            for tabla, tramo in zip(self._tablas, self._tramos(phash)):
+                for mascara in mascaras:
+                    ids = tabla.get(tramo ^ mascara)
+                    if ids:
+                        candidatos |= ids
+            for id_imagen in candidatos:
+                otro, id_publicacion = self._imagenes[id_imagen]
+                distancia = distancia_hamming(phash, otro)
+                if distancia <= distancia_maxima:
+                    resultado.append((id_imagen, id_publicacion, distancia))
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "cargado": self.cargado,
+                "imagenes": len(self._imagenes),
+                "valores_por_tabla": [len(tabla) for tabla in self._tablas],
+            }
+
+
+_MASCARAS = {}
+
+
+def _mascaras_por_radio(radio):
+    if radio not in _MASCARAS:
+        _MASCARAS[radio] = _mascaras(IndicePhash.BITS_TRAMO, radio)
+    return _MASCARAS[radio]
+
+
+indice_phash = IndicePhash()
+
+
+def _cargar_indice_phash():
+    # Import diferido para no crear un ciclo con core.models al importar el paquete
+    from core.models import db, Imagen
+
+    indice_phash.cargar(
+        tuple(fila) for fila in
+        db.session.query(Imagen.id, Imagen.phash, Imagen.id_publicacion)
+        .filter(Imagen.phash.isnot(None))
+        .yield_per(5000)
+    )
+
+
+_recarga = IndiceRecargable(indice_phash, _cargar_indice_phash, "el índice de hashes de imágenes")
+cargar_indice_phash = _recarga.cargar
+indice_phash_disponible = _recarga.disponible
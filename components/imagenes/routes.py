@@ -1,10 +1,29 @@
-from flask import Blueprint, jsonify, request
+import click
+from io import BytesIO
+from auth.services import require_auth
+from core.auth_middleware import require_admin
+from flask import Blueprint, jsonify, request, g, send_file
 from components.imagenes.services import (
     obtener_todas_las_imagenes,
     obtener_imagenes_por_publicacion,
     crear_imagen,
     eliminar_imagen,
+    calcular_phash_pendientes,
+    generar_variantes_pendientes,
+    CONCURRENCIA_VARIANTES,
+    TAMANIO_LOTE_VARIANTES,
+    emitir_firma_subida,
+    confirmar_subida,
+    purgar_imagenes_sueltas,
+    HORAS_IMAGEN_SUELTA,
+    CONCURRENCIA_PHASH,
+    TAMANIO_LOTE_PHASH,
 )
+from components.imagenes.subida import metricas_subida
+from components.imagenes.miniaturas import miniatura, cache_miniaturas, SEGUNDOS_CACHE_HTTP
+from components.imagenes.origenes import origen_permitido
+from components.imagenes.variantes import variante_de
+from core.models import db, Imagen
 
 imagenes_bp = Blueprint("imagenes", __name__)
 
@@ -28,8 +47,100 @@ def crear_imagen_view():
     data = request.get_json()
     return crear_imagen(data)
 
+# GET /imagenes/<int:id_imagen>/thumb?w=
+@imagenes_bp.route("/imagenes/<int:id_imagen>/thumb", methods=["GET"])
+def get_miniatura(id_imagen):
+    """Miniatura WebP de una imagen (cacheada en disco; el navegador la guarda como inmutable)."""
+    ancho = request.args.get("w", type=int)
+    if ancho is not None and ancho <= 0:
+        return jsonify({"error": "w debe ser un entero positivo"}), 400
+
+    imagen = db.session.get(Imagen, id_imagen)
+    # Solo se descargan imágenes de nuestro almacenamiento (la URL la escribe el cliente)
+    if not imagen or not origen_permitido(variante_de(imagen, "tarjeta")):
+        return jsonify({"error": "Imagen no encontrada"}), 404
+    # No retener la conexión mientras se descarga y achica (expunge: que el rollback no la expire)
+    db.session.expunge(imagen)
+    db.session.rollback()
+
+    try:
+        contenido, clave = miniatura(imagen, ancho)
+    except Exception as error:
+        print(f"Error generando la miniatura de la imagen {id_imagen}: {error}")
+        return jsonify({"error": "No se pudo generar la miniatura"}), 502
+
+    respuesta = send_file(
+        BytesIO(contenido), mimetype="image/webp", etag=clave, conditional=True, max_age=SEGUNDOS_CACHE_HTTP
+    )
+    respuesta.cache_control.public = True
+    respuesta.cache_control.immutable = True
+    return respuesta
+
+# GET /imagenes/miniaturas/estadisticas
+@imagenes_bp.route("/imagenes/miniaturas/estadisticas", methods=["GET"])
+@require_admin
+def get_estadisticas_miniaturas():
+    """Estado del cache de miniaturas en disco de este worker (aciertos, renders, desalojos)."""
+    return jsonify(cache_miniaturas.estadisticas()), 200
+
+# POST /imagenes/firma
+@imagenes_bp.route("/imagenes/firma", methods=["POST"])
+@require_auth
+def firma_subida_directa():
+    """Parámetros firmados para subir una imagen directo al almacenamiento (sin pasar por Flask)."""
+    resultado, status = emitir_firma_subida(g.usuario_actual.id)
+    return jsonify(resultado), status
+
+# POST /imagenes/confirmar
+@imagenes_bp.route("/imagenes/confirmar", methods=["POST"])
+@require_auth
+def confirmar_subida_directa():
+    """
+    Confirma una subida directa con la respuesta del almacenamiento
+    (public_id, version, signature) y opcionalmente id_publicacion.
+    """
+    data = request.get_json(silent=True) or {}
+    resultado, status = confirmar_subida(g.usuario_actual.id, data)
+    return jsonify(resultado), status
+
+# GET /imagenes/subidas/metricas
+@imagenes_bp.route("/imagenes/subidas/metricas", methods=["GET"])
+@require_admin
+def get_metricas_subida():
+    """Tiempos por etapa de /subir-imagenes (lectura, decodificación, ..., subida) en este worker."""
+    return jsonify(metricas_subida()), 200
+
 # DELETE /imagenes/<int:id_imagen>
 @imagenes_bp.route("/imagenes/<int:id_imagen>", methods=["DELETE"])
 def eliminar_imagen_view(id_imagen):
     """Elimina una imagen por su ID."""
     return eliminar_imagen(id_imagen)
+
+
+# CLI: flask imagenes calcular-phash
+@imagenes_bp.cli.command('calcular-phash')
+@click.option('--concurrencia', default=CONCURRENCIA_PHASH, show_default=True, help='Descargas en paralelo.')
+@click.option('--lote', default=TAMANIO_LOTE_PHASH, show_default=True, help='Imágenes por UPDATE/commit.')
+def calcular_phash_cli(concurrencia, lote):
+    """Calcula el hash perceptual de las imágenes que todavía no lo tienen."""
+    hasheadas, fallidas = calcular_phash_pendientes(concurrencia=concurrencia, tamanio_lote=lote)
+    click.echo(f"phash calculado: {hasheadas} imágenes ({fallidas} fallidas, quedan para la próxima corrida).")
+
+
+# CLI: flask imagenes generar-variantes
+@imagenes_bp.cli.command('generar-variantes')
+@click.option('--concurrencia', default=CONCURRENCIA_VARIANTES, show_default=True, help='Descargas en paralelo.')
+@click.option('--lote', default=TAMANIO_LOTE_VARIANTES, show_default=True, help='Imágenes por UPDATE/commit.')
+def generar_variantes_cli(concurrencia, lote):
+    """Completa variantes (miniatura, tarjeta, completa) y metadatos de las imágenes existentes."""
+    completadas, fallidas = generar_variantes_pendientes(concurrencia=concurrencia, tamanio_lote=lote)
+    click.echo(f"Variantes generadas: {completadas} imágenes ({fallidas} fallidas, quedan para la próxima corrida).")
+
+
+# CLI: flask imagenes purgar-sueltas
+@imagenes_bp.cli.command('purgar-sueltas')
+@click.option('--horas', default=HORAS_IMAGEN_SUELTA, show_default=True, help='Antigüedad mínima de la subida.')
+def purgar_sueltas_cli(horas):
+    """Borra las imágenes subidas que nunca se asociaron a una publicación."""
+    borradas = purgar_imagenes_sueltas(horas=horas)
+    click.echo(f"Imágenes sueltas purgadas: {borradas}.")
@@ -1,33 +1,34 @@
-from core.models import Imagen, db
-from flask import jsonify
+import hmac
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from PIL import Image as PilImage, ImageOps
+
+import cloudinary.utils
+from core.models import Imagen, Publicacion, db
+from core.tareas import encolar
+from components.publicaciones.tarjetas import invalidar_tarjetas
+from components.imagenes.phash import calcular_phash, indice_phash, descargar
+from components.imagenes.variantes import COLUMNAS_CONTENIDO, metadatos, urls_variantes
+from flask import jsonify, current_app, url_for
+from sqlalchemy import bindparam
 
 def obtener_todas_las_imagenes():
     """Obtiene todas las imágenes de la base de datos."""
     imagenes = Imagen.query.all()
-    resultado = []
-
-    for img in imagenes:
-        resultado.append({
-            'id': img.id,
-            'id_publicacion': img.id_publicacion,
-            'url': img.url
-        })
-
-    return resultado
+    return [img.to_dict() for img in imagenes]
 
 def obtener_imagenes_por_publicacion(id_publicacion):
     """Obtiene todas las imágenes asociadas a una publicación por su ID."""
     imagenes = Imagen.query.filter_by(id_publicacion=id_publicacion).all()
-    resultado = []
-
-    for img in imagenes:
-        resultado.append({
-            'id': img.id,
-            'id_publicacion': img.id_publicacion,
-            'url': img.url
-        })
-
-    return resultado
+    # url_thumb: miniatura servida y cacheada por la app (/imagenes/<id>/thumb?w=)
+    return [
+        dict(img.to_dict(), url_thumb=url_for("imagenes.get_miniatura", id_imagen=img.id, _external=True))
+        for img in imagenes
+    ]
 
 
 def crear_imagen(data):
@@ -38,7 +39,10 @@ def crear_imagen(data):
             url=data.get("url")
         )
         db.session.add(nueva_imagen)
+        # La imagen principal se ve en la tarjeta del listado
+        invalidar_tarjetas([nueva_imagen.id_publicacion])
         db.session.commit()
+        encolar_hash_imagenes([nueva_imagen.id])
         return jsonify({"mensaje": "Imagen creada exitosamente", "id": nueva_imagen.id}), 201
 
     except Exception as error:
@@ -54,11 +58,441 @@ def eliminar_imagen(id_imagen):
         return jsonify({"error": "Imagen no encontrada"}), 404
 
     try:
+        invalidar_tarjetas([imagen.id_publicacion])
         db.session.delete(imagen)
         db.session.commit()
+        indice_phash.quitar([id_imagen])
         return jsonify({"mensaje": "Imagen eliminada exitosamente"}), 200
 
     except Exception as error:
         db.session.rollback()
         return jsonify({"error": str(error)}), 400
-    
\ No newline at end of file
+    
+
+
+# --- HASH PERCEPTUAL ---
+
+TAMANIO_LOTE_PHASH = 200
+CONCURRENCIA_PHASH = 4
+
+
+def _phash_o_none(url):
+    try:
+        return calcular_phash(url)
+    except Exception as error:
+        print(f"No se pudo calcular el phash de {url}: {error}")
+        return None
+
+
+def _guardar_phash(hashes):
+    """Guarda {id_imagen: phash} con un UPDATE en bloque y hace commit."""
+    if not hashes:
+        return
+    tabla = Imagen.__table__
+    db.session.execute(
+        tabla.update().where(tabla.c.id == bindparam('b_id')).values(phash=bindparam('b_phash')),
+        [{"b_id": id_imagen, "b_phash": phash} for id_imagen, phash in hashes.items()]
+    )
+    db.session.commit()
+
+
+def hashear_imagenes(ids):
+    """
+    Calcula y guarda el phash de esas imágenes y las agrega al índice en memoria.
+    Corre en el pool de core.tareas (encolar_hash_imagenes).
+    """
+    filas = (
+        db.session.query(Imagen.id, Imagen.url, Imagen.id_publicacion)
+        .filter(Imagen.id.in_(ids), Imagen.phash.is_(None), Imagen.url.isnot(None))
+        .all()
+    )
+    # La misma URL ya hasheada (una foto que ya estaba en otra publicación) no se vuelve a descargar
+    conocidos = dict(
+        db.session.query(Imagen.url, Imagen.phash)
+        .filter(Imagen.url.in_([fila.url for fila in filas]), Imagen.phash.isnot(None))
+        .all()
+    )
+    # No retener la conexión mientras se descargan las imágenes
+    db.session.rollback()
+
+    hashes = {}
+    for fila in filas:
+        phash = conocidos[fila.url] if fila.url in conocidos else _phash_o_none(fila.url)
+        if phash is not None:
+            hashes[fila.id] = phash
+
+    _guardar_phash(hashes)
+    for fila in filas:
+        if fila.id in hashes:
+            indice_phash.agregar(fila.id, hashes[fila.id], fila.id_publicacion)
+
+
+def encolar_hash_imagenes(ids):
+    """Calcula el phash de las imágenes recién creadas sin demorar la respuesta."""
+    ids = [id_imagen for id_imagen in ids if id_imagen is not None]
+    if ids:
+        encolar(hashear_imagenes, ids)
+
+
+def calcular_phash_pendientes(concurrencia=CONCURRENCIA_PHASH, tamanio_lote=TAMANIO_LOTE_PHASH):
+    """
+    Completa el phash de las imágenes que no lo tienen, por lotes de
+    `tamanio_lote` descargando a lo sumo `concurrencia` imágenes a la vez.
+    Las que fallan quedan en NULL para la próxima corrida. Devuelve (hasheadas, fallidas).
+    """
+    hasheadas = fallidas = 0
+    ultimo_id = 0
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        while True:
+            filas = (
+                db.session.query(Imagen.id, Imagen.url)
+                .filter(Imagen.phash.is_(None), Imagen.url.isnot(None), Imagen.id > ultimo_id)
+                .order_by(Imagen.id)
+                .limit(tamanio_lote)
+                .all()
+            )
+            if not filas:
+                break
+            ultimo_id = filas[-1].id
+            db.session.rollback()
+
+            hashes = {
+                fila.id: phash
+                for fila, phash in zip(filas, pool.map(_phash_o_none, [fila.url for fila in filas]))
+                if phash is not None
+            }
+            _guardar_phash(hashes)
+            hasheadas += len(hashes)
+            fallidas += len(filas) - len(hashes)
+            print(f"phash: {hasheadas} imágenes hasheadas, {fallidas} fallidas (hasta id {ultimo_id})")
+
+    return hasheadas, fallidas
+
+
+# --- VARIANTES Y METADATOS ---
+
+TAMANIO_LOTE_VARIANTES = 100
+CONCURRENCIA_VARIANTES = 4
+
+
+def _variantes_o_none(url):
+    """Columnas de variantes y metadatos de la imagen en `url` (descarga la original)."""
+    try:
+        contenido = descargar(url, reducida=False)
+        with PilImage.open(BytesIO(contenido)) as imagen:
+            imagen = ImageOps.exif_transpose(imagen)
+            datos = metadatos(imagen, len(contenido))
+        return dict(datos, **urls_variantes(url, datos["ancho"], datos["alto"]))
+    except Exception as error:
+        print(f"No se pudieron calcular las variantes de {url}: {error}")
+        return None
+
+
+def _guardar_variantes(filas, columnas_por_id):
+    """UPDATE en bloque de variantes y metadatos; invalida las tarjetas afectadas y hace commit."""
+    if not columnas_por_id:
+        return
+    tabla = Imagen.__table__
+    db.session.execute(
+        tabla.update().where(tabla.c.id == bindparam('b_id')).values(
+            {columna: bindparam(f'b_{columna}') for columna in COLUMNAS_CONTENIDO if columna != "hash_contenido"}
+        ),
+        [
+            dict({f"b_{columna}": valor for columna, valor in columnas.items()}, b_id=id_imagen)
+            for id_imagen, columnas in columnas_por_id.items()
+        ]
+    )
+    # La imagen principal de la tarjeta pasa a ser la variante
+    invalidar_tarjetas({fila.id_publicacion for fila in filas if fila.id in columnas_por_id})
+    db.session.commit()
+
+
+def completar_variantes(ids):
+    """Variantes y metadatos de esas imágenes (subida directa). Corre en el pool de core.tareas."""
+    filas = (
+        db.session.query(Imagen.id, Imagen.url, Imagen.id_publicacion)
+        .filter(Imagen.id.in_(ids), Imagen.ancho.is_(None), Imagen.url.isnot(None))
+        .all()
+    )
+    # No retener la conexión mientras se descargan las imágenes
+    db.session.rollback()
+    columnas = {fila.id: _variantes_o_none(fila.url) for fila in filas}
+    _guardar_variantes(filas, {id_imagen: c for id_imagen, c in columnas.items() if c is not None})
+
+
+def generar_variantes_pendientes(concurrencia=CONCURRENCIA_VARIANTES, tamanio_lote=TAMANIO_LOTE_VARIANTES):
+    """
+    Completa variantes y metadatos de las imágenes que no los tienen (las
+    anteriores a que se generaran al subir), por lotes de `tamanio_lote`
+    descargando a lo sumo `concurrencia` a la vez. Las que fallan quedan en
+    NULL para la próxima corrida. Devuelve (completadas, fallidas).
+    """
+    completadas = fallidas = 0
+    ultimo_id = 0
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        while True:
+            filas = (
+                db.session.query(Imagen.id, Imagen.url, Imagen.id_publicacion)
+                .filter(Imagen.ancho.is_(None), Imagen.url.isnot(None), Imagen.id > ultimo_id)
+                .order_by(Imagen.id)
+                .limit(tamanio_lote)
+                .all()
+            )
+            if not filas:
+                break
+            ultimo_id = filas[-1].id
+            db.session.rollback()
+
+            columnas = {
+                fila.id: resultado
+                for fila, resultado in zip(filas, pool.map(_variantes_o_none, [fila.url for fila in filas]))
+                if resultado is not None
+            }
+            _guardar_variantes(filas, columnas)
+            completadas += len(columnas)
+            fallidas += len(filas) - len(columnas)
+            print(f"variantes: {completadas} imágenes completadas, {fallidas} fallidas (hasta id {ultimo_id})")
+
+    return completadas, fallidas
+
+
+# --- SUBIDA DIRECTA CON FIRMA ---
+#
+# El cliente pide parámetros firmados (emitir_firma_subida), sube el archivo
+# directo a Cloudinary (o al almacén local de components.imagenes.almacen_local)
+# y después confirma con lo que le devolvió el almacenamiento (confirmar_subida).
+# Los bytes no pasan por los workers de Flask.
+
+CARPETA_SUBIDA_DIRECTA = "publicaciones"
+# Cloudinary achica al recibir (como el pipeline de /subir-imagenes)
+TRANSFORMACION_ENTRANTE = "c_limit,w_1600,h_1600"
+FORMATOS_PERMITIDOS = ("jpg", "jpeg", "png", "webp", "heic")
+# Formato en que queda guardada: va en los parámetros firmados, así confirmar_subida
+# no depende del "format" que informa el cliente (la firma de la respuesta no lo cubre)
+FORMATO_SUBIDA_DIRECTA = "webp"
+# Segundos entre la emisión de la firma y la subida para que se pueda confirmar
+VIGENCIA_FIRMA = 600
+MAXIMO_IMAGENES_POR_PUBLICACION = 5
+
+
+def firmar_parametros(parametros, secreto):
+    """Firma de una subida (la misma cuenta que hace Cloudinary con los parámetros del form)."""
+    return cloudinary.utils.api_sign_request(parametros, secreto)
+
+
+def firma_respuesta(public_id, version, secreto):
+    """Firma que acompaña la respuesta de una subida (public_id + version)."""
+    return cloudinary.utils.api_sign_request(
+        {"public_id": public_id, "version": version}, secreto, signature_version=1
+    )
+
+
+def _almacen_local():
+    return bool(current_app.config.get('ALMACEN_LOCAL_DIR'))
+
+
+def _url_subida(cloud_name):
+    if _almacen_local():
+        return url_for("almacen_local.subir", cloud_name=cloud_name, _external=True)
+    return f"https://api.cloudinary.com/v1_1/{cloud_name}/image/upload"
+
+
+def _url_entrega(cloud_name, public_id, version, formato):
+    if _almacen_local():
+        return url_for(
+            "almacen_local.archivo", version=version, ruta=f"{public_id}.{formato}", _external=True
+        )
+    return f"https://res.cloudinary.com/{cloud_name}/image/upload/v{version}/{public_id}.{formato}"
+
+
+def emitir_firma_subida(id_usuario):
+    """
+    Parámetros firmados para que el cliente suba una imagen directo al
+    almacenamiento. El public_id queda en la carpeta del usuario y lleva la hora
+    de emisión, así confirmar_subida sabe de quién es y si la firma ya venció.
+    """
+    config = current_app.config
+    if not config.get('CLOUDINARY_API_SECRET') or not config.get('CLOUDINARY_API_KEY'):
+        return {"error": "La subida directa no está configurada"}, 503
+
+    timestamp = int(time.time())
+    parametros = {
+        "timestamp": timestamp,
+        "public_id": f"{CARPETA_SUBIDA_DIRECTA}/{id_usuario}/{timestamp}_{uuid.uuid4().hex[:12]}",
+        "transformation": TRANSFORMACION_ENTRANTE,
+        "allowed_formats": ",".join(FORMATOS_PERMITIDOS),
+        "format": FORMATO_SUBIDA_DIRECTA,
+    }
+    cloud_name = config.get('CLOUDINARY_CLOUD_NAME') or "local"
+    return {
+        "url_subida": _url_subida(cloud_name),
+        "parametros": dict(
+            parametros,
+            api_key=config['CLOUDINARY_API_KEY'],
+            signature=firmar_parametros(parametros, config['CLOUDINARY_API_SECRET']),
+        ),
+        "vence_en": timestamp + VIGENCIA_FIRMA,
+    }, 200
+
+
+def _emision_de(public_id, id_usuario):
+    """Hora de emisión codificada en el public_id, o None si no es de la carpeta del usuario."""
+    prefijo = f"{CARPETA_SUBIDA_DIRECTA}/{id_usuario}/"
+    if not public_id.startswith(prefijo):
+        return None
+    emision = public_id[len(prefijo):].split("_", 1)[0]
+    return int(emision) if emision.isdigit() else None
+
+
+def confirmar_subida(id_usuario, data):
+    """
+    Verifica la firma de la respuesta del almacenamiento (public_id, version,
+    signature) y crea la Imagen. El formato de la URL es el que se firmó al
+    emitir la subida, no el que manda el cliente. Con id_publicacion queda asociada a esa
+    publicación; sin ella queda suelta hasta que crear/actualizar_publicacion
+    reciba su URL (ver imagenes_para_publicacion).
+    """
+    secreto = current_app.config.get('CLOUDINARY_API_SECRET')
+    if not secreto:
+        return {"error": "La subida directa no está configurada"}, 503
+
+    public_id = str(data.get("public_id") or "")
+    version = data.get("version")
+    firma = str(data.get("signature") or "")
+    if not public_id or not firma or not isinstance(version, int) or isinstance(version, bool):
+        return {"error": "Faltan public_id, version o signature"}, 400
+
+    if not hmac.compare_digest(firma, firma_respuesta(public_id, version, secreto)):
+        return {"error": "Firma inválida"}, 403
+    emision = _emision_de(public_id, id_usuario)
+    # version es la hora de la subida (firmada): tiene que caer dentro de la vigencia
+    if emision is None or not 0 <= version - emision <= VIGENCIA_FIRMA:
+        return {"error": "La subida no corresponde a una firma vigente de este usuario"}, 403
+
+    id_publicacion = data.get("id_publicacion")
+    if id_publicacion is not None:
+        publicacion = db.session.get(Publicacion, id_publicacion)
+        if not publicacion or publicacion.id_usuario != id_usuario:
+            return {"error": "Publicación no encontrada"}, 404
+        if Imagen.query.filter_by(id_publicacion=id_publicacion).count() >= MAXIMO_IMAGENES_POR_PUBLICACION:
+            return {"error": "No puedes subir más de 5 imágenes por publicación"}, 400
+
+    url = _url_entrega(
+        current_app.config.get('CLOUDINARY_CLOUD_NAME') or "local", public_id, version, FORMATO_SUBIDA_DIRECTA
+    )
+    # Confirmar dos veces la misma subida devuelve la misma imagen
+    existente = Imagen.query.filter_by(url=url).first()
+    if existente:
+        return {"id": existente.id, "url": url, "id_publicacion": existente.id_publicacion}, 200
+
+    imagen = Imagen(id_publicacion=id_publicacion, url=url, id_usuario=id_usuario)
+    db.session.add(imagen)
+    if id_publicacion is not None:
+        invalidar_tarjetas([id_publicacion])
+    db.session.commit()
+    # Lo subió el cliente: variantes y metadatos se calculan descargándola
+    encolar(completar_variantes, [imagen.id])
+    if id_publicacion is not None:
+        encolar_hash_imagenes([imagen.id])
+    return {"id": imagen.id, "url": url, "id_publicacion": id_publicacion}, 201
+
+
+def imagenes_para_publicacion(id_publicacion, urls, id_usuario):
+    """
+    Imagenes (ya agregadas a la sesión) para las URLs de una publicación de
+    `id_usuario`: las subidas de ese usuario que todavía están sueltas se
+    asocian en lugar de duplicarse; las demás se crean, con el hash, las
+    variantes y los metadatos de otra imagen con la misma URL.
+    """
+    sueltas, contenido = {}, {}
+    if urls:
+        for imagen in Imagen.query.filter(Imagen.url.in_(urls)):
+            # Una subida de otro usuario no se adopta (ni se le saca a su dueño)
+            if imagen.id_publicacion is None and id_usuario is not None and imagen.id_usuario == id_usuario:
+                sueltas.setdefault(imagen.url, imagen)
+            if imagen.ancho is not None or imagen.hash_contenido:
+                contenido.setdefault(
+                    imagen.url, {columna: getattr(imagen, columna) for columna in COLUMNAS_CONTENIDO}
+                )
+
+    imagenes = []
+    for url in urls:
+        imagen = sueltas.pop(url, None)
+        if imagen is None:
+            imagen = Imagen(url=url, id_usuario=id_usuario, **contenido.get(url, {}))
+            db.session.add(imagen)
+        imagen.id_publicacion = id_publicacion
+        imagenes.append(imagen)
+    return imagenes
+
+
+def reemplazar_imagenes_publicacion(id_publicacion, urls, id_usuario):
+    """
+    Deja en la publicación exactamente las imágenes de `urls`, comparando por
+    URL: las que siguen se conservan tal cual (con su phash, hash de contenido,
+    variantes y metadatos), se borran solo las que se sacaron y se crean solo
+    las nuevas. No hace commit. Devuelve (ids_borrados, imagenes_creadas).
+    """
+    actuales = {}
+    for imagen in Imagen.query.filter_by(id_publicacion=id_publicacion).order_by(Imagen.id):
+        actuales.setdefault(imagen.url, []).append(imagen)
+
+    nuevas = []
+    for url in urls:
+        if actuales.get(url):
+            actuales[url].pop(0)
+        else:
+            nuevas.append(url)
+
+    borradas = [imagen for sobrantes in actuales.values() for imagen in sobrantes]
+    for imagen in borradas:
+        db.session.delete(imagen)
+    return [imagen.id for imagen in borradas], imagenes_para_publicacion(id_publicacion, nuevas, id_usuario)
+
+
+def registrar_subidas(resultados, id_usuario):
+    """
+    Guarda como imágenes sueltas (sin publicación) las que /subir-imagenes subió
+    por primera vez, con su hash de contenido, variantes y metadatos: así el
+    índice de contenido se puede reconstruir desde la base y crear_publicacion
+    copia esos datos (o adopta la fila, si es del mismo usuario) por URL.
+    """
+    nuevas = [r for r in resultados if r["url"] and r["hash_contenido"] and r["variantes"] and not r["duplicada"]]
+    if not nuevas:
+        return
+    try:
+        db.session.add_all(
+            Imagen(
+                url=r["url"], hash_contenido=r["hash_contenido"], id_usuario=id_usuario,
+                **r["variantes"], **r["metadatos"]
+            )
+            for r in nuevas
+        )
+        db.session.commit()
+    except Exception as error:
+        db.session.rollback()
+        print(f"No se pudieron registrar las imágenes subidas: {error}")
+
+
+# Horas que una imagen puede quedar suelta (subida pero sin publicación) antes de purgarse
+HORAS_IMAGEN_SUELTA = 48
+
+
+def purgar_imagenes_sueltas(horas=HORAS_IMAGEN_SUELTA):
+    """
+    Borra las imágenes que siguen sin publicación `horas` después de subirse
+    (subidas abandonadas). El archivo queda en el almacenamiento. Devuelve
+    cuántas se borraron.
+    """
+    limite = datetime.now(timezone.utc) - timedelta(hours=horas)
+    ids = [
+        id_imagen for (id_imagen,) in
+        db.session.query(Imagen.id)
+        .filter(Imagen.id_publicacion.is_(None), Imagen.fecha_creacion < limite)
+        .all()
+    ]
+    if ids:
+        Imagen.query.filter(Imagen.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    indice_phash.quitar(ids)
+    return len(ids)
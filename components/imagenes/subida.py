@@ -0,0 +1,231 @@
+"""
+Subida de imágenes a Cloudinary (/subir-imagenes).
+
+Cada archivo se decodifica, se endereza según su EXIF, se achica a LADO_MAXIMO
+y se recodifica como WebP antes de subirlo: una foto de celular de varios MB
+queda en unos cientos de KB (y sin los metadatos EXIF, que pueden traer la
+ubicación). Los archivos se procesan y suben en paralelo en un pool acotado
+(CONCURRENCIA_SUBIDA) y el resultado se informa archivo por archivo.
+
+Antes de codificar se busca el hash del contenido normalizado en el índice de
+components.imagenes.contenido: si el mismo usuario ya subió esa foto, se
+devuelve esa URL sin codificar ni subir nada.
+
+Los tiempos de cada etapa vuelven en la respuesta y se acumulan por worker
+(GET /imagenes/subidas/metricas), junto con los duplicados evitados.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import cloudinary
+import cloudinary.uploader
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from components.imagenes.contenido import hash_contenido, indice_contenido, indice_contenido_disponible
+from components.imagenes.variantes import EAGER_SUBIDA, metadatos, urls_variantes
+
+LADO_MAXIMO = 1600
+CALIDAD_WEBP = 80
+BYTES_MAXIMOS_ARCHIVO = 20 * 1024 * 1024
+# Las fotos de celular andan por 12-50 Mpx; más que esto se rechaza antes de decodificar
+PIXELES_MAXIMOS = 80_000_000
+TIMEOUT_SUBIDA = 30
+
+CONCURRENCIA_SUBIDA = int(os.getenv("SUBIDA_WORKERS", "5"))
+
+ETAPAS = ("lectura", "decodificacion", "procesado", "hash", "codificacion", "metadatos", "subida")
+
+_pool = ThreadPoolExecutor(max_workers=CONCURRENCIA_SUBIDA, thread_name_prefix="subida")
+
+
+def configurar_cloudinary(config):
+    """Configura el cliente de Cloudinary una sola vez al iniciar la app."""
+    cloudinary.config(
+        cloud_name=config.get('CLOUDINARY_CLOUD_NAME'),
+        api_key=config.get('CLOUDINARY_API_KEY'),
+        api_secret=config.get('CLOUDINARY_API_SECRET')
+    )
+
+
+class ArchivoInvalido(ValueError):
+    """El archivo no se puede usar como imagen (se informa tal cual al cliente)."""
+
+
+def _ms(desde):
+    return round((time.perf_counter() - desde) * 1000, 2)
+
+
+def normalizar_imagen(contenido, tiempos):
+    """
+    Decodifica, endereza y achica. Devuelve la imagen PIL (RGB o RGBA) y anota
+    en `tiempos` lo que tardó cada etapa.
+    """
+    inicio = time.perf_counter()
+    try:
+        imagen = Image.open(BytesIO(contenido))
+        if imagen.width * imagen.height > PIXELES_MAXIMOS:
+            raise ArchivoInvalido("La imagen tiene demasiados píxeles")
+        # En JPEG decodifica directamente a una escala reducida (1/2, 1/4, 1/8)
+        imagen.draft("RGB", (LADO_MAXIMO, LADO_MAXIMO))
+        imagen.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as error:
+        raise ArchivoInvalido("El archivo no es una imagen válida") from error
+    tiempos["decodificacion"] = _ms(inicio)
+
+    inicio = time.perf_counter()
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode not in ("RGB", "RGBA"):
+        transparente = "A" in imagen.getbands() or "transparency" in imagen.info
+        imagen = imagen.convert("RGBA" if transparente else "RGB")
+    imagen.thumbnail((LADO_MAXIMO, LADO_MAXIMO), Image.Resampling.LANCZOS)
+    tiempos["procesado"] = _ms(inicio)
+    return imagen
+
+
+def codificar_webp(imagen, tiempos):
+    inicio = time.perf_counter()
+    salida = BytesIO()
+    imagen.save(salida, "WEBP", quality=CALIDAD_WEBP, method=4)
+    tiempos["codificacion"] = _ms(inicio)
+    return salida.getvalue()
+
+
+def _nombre_webp(nombre):
+    base = os.path.splitext(os.path.basename(nombre or ""))[0] or "imagen"
+    return f"{base}.webp"
+
+
+def _procesar_y_subir(nombre, contenido, upload_preset, id_usuario, tiempos):
+    resultado = {
+        "archivo": nombre,
+        "url": None,
+        "error": None,
+        "bytes_original": len(contenido),
+        "bytes_subidos": None,
+        "ancho": None,
+        "alto": None,
+        "hash_contenido": None,
+        "duplicada": False,
+        "metadatos": None,
+        "variantes": None,
+        "tiempos_ms": tiempos,
+    }
+    try:
+        if len(contenido) > BYTES_MAXIMOS_ARCHIVO:
+            raise ArchivoInvalido("La imagen supera el tamaño máximo")
+        imagen = normalizar_imagen(contenido, tiempos)
+        resultado["ancho"], resultado["alto"] = imagen.size
+
+        inicio = time.perf_counter()
+        resultado["hash_contenido"] = hash_contenido(imagen)
+        tiempos["hash"] = _ms(inicio)
+        existente = indice_contenido.url_de(id_usuario, resultado["hash_contenido"])
+        if existente:
+            resultado["url"], resultado["duplicada"] = existente, True
+            return resultado
+
+        datos = codificar_webp(imagen, tiempos)
+        resultado["bytes_subidos"] = len(datos)
+
+        inicio = time.perf_counter()
+        resultado["metadatos"] = metadatos(imagen, len(datos))
+        tiempos["metadatos"] = _ms(inicio)
+
+        inicio = time.perf_counter()
+        # Miniatura y tarjeta quedan generadas en Cloudinary sin demorar la subida
+        respuesta = cloudinary.uploader.upload(
+            (_nombre_webp(nombre), datos), upload_preset=upload_preset, timeout=TIMEOUT_SUBIDA,
+            eager=EAGER_SUBIDA, eager_async=True
+        )
+        tiempos["subida"] = _ms(inicio)
+        resultado["url"] = respuesta.get("secure_url")
+        if resultado["url"]:
+            indice_contenido.agregar(id_usuario, resultado["hash_contenido"], resultado["url"])
+            resultado["variantes"] = urls_variantes(resultado["url"], imagen.width, imagen.height)
+        else:
+            resultado["error"] = "Error al subir la imagen"
+    except ArchivoInvalido as error:
+        resultado["error"] = str(error)
+    except Exception as error:
+        print(f"Error Cloudinary ({nombre}): {error}")
+        resultado["error"] = "Error al subir la imagen"
+    return resultado
+
+
+# Métricas de este worker: por etapa, cantidad / total / máximo en ms
+_metricas = {
+    "archivos": 0,
+    "fallidos": 0,
+    "bytes_original": 0,
+    "bytes_subidos": 0,
+    # Archivos que ya estaban subidos (mismo hash_contenido) y los bytes
+    # recibidos que no se volvieron a codificar, subir ni guardar
+    "duplicadas": 0,
+    "bytes_ahorrados": 0,
+    "etapas": {etapa: {"cantidad": 0, "ms_total": 0.0, "ms_max": 0.0} for etapa in ETAPAS + ("total",)},
+}
+_lock_metricas = threading.Lock()
+
+
+def _registrar(resultados):
+    with _lock_metricas:
+        for resultado in resultados:
+            _metricas["archivos"] += 1
+            _metricas["fallidos"] += resultado["url"] is None
+            _metricas["bytes_original"] += resultado["bytes_original"]
+            _metricas["bytes_subidos"] += resultado["bytes_subidos"] or 0
+            if resultado["duplicada"]:
+                _metricas["duplicadas"] += 1
+                _metricas["bytes_ahorrados"] += resultado["bytes_original"]
+            for etapa, ms in resultado["tiempos_ms"].items():
+                acumulado = _metricas["etapas"][etapa]
+                acumulado["cantidad"] += 1
+                acumulado["ms_total"] += ms
+                acumulado["ms_max"] = max(acumulado["ms_max"], ms)
+
+
+def metricas_subida():
+    """Copia de las métricas de subida de este worker, con el promedio por etapa."""
+    with _lock_metricas:
+        etapas = {}
+        for etapa, acumulado in _metricas["etapas"].items():
+            cantidad = acumulado["cantidad"]
+            etapas[etapa] = {
+                "cantidad": cantidad,
+                "ms_promedio": round(acumulado["ms_total"] / cantidad, 2) if cantidad else None,
+                "ms_max": round(acumulado["ms_max"], 2),
+            }
+        exitosas = _metricas["archivos"] - _metricas["fallidos"]
+        tasa = round(_metricas["duplicadas"] / exitosas, 4) if exitosas else None
+        return dict(_metricas, etapas=etapas, tasa_duplicadas=tasa, indice=indice_contenido.estadisticas())
+
+
+def subir_archivos(archivos, upload_preset, id_usuario):
+    """
+    Procesa y sube los archivos (FileStorage del request) de `id_usuario` en paralelo.
+    Devuelve (resultados en el orden recibido, tiempos_ms del request).
+    """
+    inicio_total = time.perf_counter()
+    indice_contenido_disponible()
+
+    # El stream del request se lee en este thread; al pool solo van los bytes
+    pendientes = []
+    for archivo in archivos:
+        inicio = time.perf_counter()
+        contenido = archivo.read(BYTES_MAXIMOS_ARCHIVO + 1)
+        pendientes.append((archivo.filename, contenido, {"lectura": _ms(inicio)}))
+
+    futuros = [
+        _pool.submit(_procesar_y_subir, nombre, contenido, upload_preset, id_usuario, tiempos)
+        for nombre, contenido, tiempos in pendientes
+    ]
+    resultados = [futuro.result() for futuro in futuros]
+    for resultado in resultados:
+        tiempos = resultado["tiempos_ms"]
+        tiempos["total"] = round(sum(tiempos.values()), 2)
+
+    _registrar(resultados)
+    return resultados, {"total": _ms(inicio_total)}
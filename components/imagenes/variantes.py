@@ -0,0 +1,90 @@
+"""
+Variantes y metadatos de las imágenes para las vistas de listado.
+
+Cada Imagen guarda, además de la URL original, las URLs de tres variantes
+(miniatura para marcadores del mapa, tarjeta para los listados y completa para
+el detalle y el PDF), su tamaño, el color dominante y un placeholder mínimo
+(data URI WebP de LADO_PLACEHOLDER px) para mostrar mientras carga.
+
+En Cloudinary las variantes son transformaciones en la URL; al subir se piden
+como `eager` para que ya estén generadas. Otras URLs (almacén local) usan la
+original para todas las variantes.
+"""
+import base64
+from io import BytesIO
+
+from PIL import Image
+
+# Variante -> transformación de Cloudinary
+VARIANTES = {
+    "miniatura": "c_fill,g_auto,w_160,h_160,q_auto",
+    "tarjeta": "c_limit,w_480,h_480,q_auto",
+    "completa": "c_limit,w_1600,h_1600,q_auto",
+}
+LADO_COMPLETA = 1600
+LADO_PLACEHOLDER = 16
+
+# Las que se generan al subir (la completa ya es lo que sube /subir-imagenes)
+EAGER_SUBIDA = [VARIANTES["miniatura"], VARIANTES["tarjeta"]]
+
+# Columnas de Imagen que dependen solo del contenido (se copian entre filas con la misma URL)
+COLUMNAS_CONTENIDO = (
+    "hash_contenido", "url_miniatura", "url_tarjeta", "url_completa",
+    "ancho", "alto", "tamanio_bytes", "color_dominante", "placeholder",
+)
+
+
+def _es_cloudinary(url):
+    return bool(url) and "res.cloudinary.com" in url and "/upload/" in url
+
+
+def url_variante(url, variante):
+    """URL de la variante para una imagen de Cloudinary (las demás devuelven la original)."""
+    if not _es_cloudinary(url):
+        return url
+    return url.replace("/upload/", f"/upload/{VARIANTES[variante]}/", 1)
+
+
+def urls_variantes(url, ancho=None, alto=None):
+    """{url_miniatura, url_tarjeta, url_completa}. Si ya entra en LADO_COMPLETA, la completa es la original."""
+    entra = ancho is not None and alto is not None and max(ancho, alto) <= LADO_COMPLETA
+    return {
+        "url_miniatura": url_variante(url, "miniatura"),
+        "url_tarjeta": url_variante(url, "tarjeta"),
+        "url_completa": url if entra else url_variante(url, "completa"),
+    }
+
+
+def color_dominante(imagen):
+    """Color más frecuente (#rrggbb) de la imagen reducida a una paleta de 8 colores."""
+    chica = imagen.convert("RGB")
+    chica.thumbnail((64, 64))
+    paleta = chica.quantize(colors=8, method=Image.Quantize.MEDIANCUT)
+    _, indice = max(paleta.getcolors())
+    r, g, b = paleta.getpalette()[indice * 3:indice * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def placeholder(imagen):
+    """Data URI de una versión de LADO_PLACEHOLDER px (unos cientos de bytes) para mostrar borrosa."""
+    chica = imagen.convert("RGBA" if "A" in imagen.getbands() else "RGB")
+    chica.thumbnail((LADO_PLACEHOLDER, LADO_PLACEHOLDER))
+    salida = BytesIO()
+    chica.save(salida, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(salida.getvalue()).decode("ascii")
+
+
+def metadatos(imagen, tamanio_bytes):
+    """Metadatos de una imagen PIL ya decodificada (y enderezada)."""
+    return {
+        "ancho": imagen.width,
+        "alto": imagen.height,
+        "tamanio_bytes": tamanio_bytes,
+        "color_dominante": color_dominante(imagen),
+        "placeholder": placeholder(imagen),
+    }
+
+
+def variante_de(imagen, variante):
+    """URL guardada de la variante, o la original si la imagen todavía no tiene variantes."""
+    return getattr(imagen, f"url_{variante}") or imagen.url
@@ -4,9 +4,12 @@ from components.notificaciones.services import (
     obtener_notificaciones_por_usuario,
     obtener_todas,
     marcar_notificacion_como_leida,
-    eliminar_notificacion
+    eliminar_notificacion,
+    marcar_zona_como_leida,
+    metricas_notificaciones_zona
 )
 from auth.services import require_auth
+from core.auth_middleware import require_admin
 
 notificaciones_bp = Blueprint("notificaciones", __name__)
 
@@ -32,6 +35,13 @@ def get_por_usuario():
     return jsonify(notis), 200
 
 
+@notificaciones_bp.route("/notificaciones/fanout", methods=["GET"])
+@require_admin
+def get_metricas_fanout():
+    """Latencia y cantidad de filas del fan-out "nueva publicación en tu zona" (este worker)."""
+    return jsonify(metricas_notificaciones_zona()), 200
+
+
 @notificaciones_bp.route("/notificaciones", methods=["GET"])
 def get_todo():
     """Admin: Obtiene todas."""
@@ -46,6 +56,23 @@ def marcar_leida(id_noti):
     return jsonify(marcar_notificacion_como_leida(id_noti))
 
 
+@notificaciones_bp.route("/notificaciones/zona/leidas", methods=["PATCH"])
+@require_auth
+def marcar_zona_leida():
+    """
+    Marca como leídos los avisos de zona (modo lectura) hasta `hasta`
+    (id_evento_zona) o, si no viene, todos los de la localidad del usuario.
+    """
+    data = request.get_json(silent=True) or {}
+    hasta = data.get("hasta")
+    if hasta is not None and (not isinstance(hasta, int) or isinstance(hasta, bool)):
+        return jsonify({"error": "hasta debe ser un id_evento_zona"}), 400
+    resultado = marcar_zona_como_leida(g.usuario_actual.id, hasta)
+    if isinstance(resultado, tuple):
+        return jsonify(resultado[0]), resultado[1]
+    return jsonify(resultado), 200
+
+
 @notificaciones_bp.route("/notificaciones/<int:id_noti>", methods=["DELETE"])
 @require_auth
 def eliminar(id_noti):
@@ -1,6 +1,10 @@
-from core.models import db, Notificacion, Publicacion
+from core.models import db, Notificacion, Publicacion, Usuario, EventoZona
 from datetime import datetime, timezone
+from flask import current_app
 from ..usuarios.services import get_usuario
+from sqlalchemy import insert, select, update, func, literal, Integer, Text, Boolean, DateTime
+import threading
+import time
 import pytz
 
 zona_arg = pytz.timezone("America/Argentina/Buenos_Aires")
@@ -32,9 +36,14 @@ def crear_notificacion(data):
         return {"error": str(error)}, 400
 
 
+LIMITE_NOTIFICACIONES = 50
+
+
 def obtener_notificaciones_por_usuario(id_usuario, solo_no_leidas=False):
     """
     Esta es la función que llamará el Frontend cada X segundos.
+    Junta las notificaciones personales (filas de notificaciones) con los
+    avisos de zona guardados como eventos_zona.
     """
     query = Notificacion.query.filter_by(id_usuario=id_usuario)
     
@@ -42,9 +51,12 @@ def obtener_notificaciones_por_usuario(id_usuario, solo_no_leidas=False):
         query = query.filter_by(leido=False)
         
     # Ordenamos por las más recientes primero
-    notificaciones = query.order_by(Notificacion.fecha_creacion.desc()).limit(50).all()
+    notificaciones = query.order_by(Notificacion.fecha_creacion.desc()).limit(LIMITE_NOTIFICACIONES).all()
     
-    return [n.to_dict() for n in notificaciones]
+    resultado = [(n.fecha_creacion, n.to_dict()) for n in notificaciones]
+    resultado += _eventos_zona_de(id_usuario, solo_no_leidas)
+    resultado.sort(key=lambda par: par[0], reverse=True)
+    return [datos for _, datos in resultado[:LIMITE_NOTIFICACIONES]]
 
 
 def obtener_todas():
@@ -78,4 +90,198 @@ def obtener_user_por_idpublicacion(publicacion_id):
     publicacion = Publicacion.query.get(publicacion_id)
     if publicacion:
         return publicacion.id_usuario
-    return None
\ No newline at end of file
+    return None
+
+
+# --- "NUEVA PUBLICACIÓN EN TU ZONA" ---
+
+# Cómo se guarda el aviso (app.config['NOTIFICACIONES_ZONA']):
+#   "escritura": una fila de notificaciones por vecino (notificar_zona, en segundo plano)
+#   "lectura": un solo evento por publicación que se suma al leer (registrar_evento_zona)
+MODO_ZONA_ESCRITURA = "escritura"
+MODO_ZONA_LECTURA = "lectura"
+
+TITULO_ZONA = "Nueva Publicación"
+
+
+def _descripcion_zona(titulo):
+    return f"Se publicó algo nuevo en tu zona: '{titulo}'."
+
+
+def zona_por_lectura():
+    """True si los avisos de zona se guardan como eventos_zona. Requiere contexto de app."""
+    return current_app.config.get("NOTIFICACIONES_ZONA", MODO_ZONA_ESCRITURA) == MODO_ZONA_LECTURA
+
+
+def registrar_evento_zona(id_publicacion, id_localidad, id_autor, titulo, fecha):
+    """
+    Agrega a la sesión (sin commit) el evento de zona de una publicación nueva:
+    queda en la misma transacción que la publicación y es una sola fila sin
+    importar cuántos vecinos tenga la localidad.
+    """
+    evento = EventoZona(
+        id_localidad=id_localidad,
+        id_publicacion=id_publicacion,
+        id_autor=id_autor,
+        titulo=TITULO_ZONA,
+        descripcion=_descripcion_zona(titulo),
+        fecha_creacion=fecha,
+    )
+    db.session.add(evento)
+    return evento
+
+
+def _evento_a_dict(evento, id_usuario, leido_hasta):
+    # Mismo formato que Notificacion.to_dict; el id lleva prefijo para no
+    # confundirse con el de una notificación (se marcan con marcar_zona_como_leida)
+    return {
+        "id": f"zona-{evento.id}",
+        "id_evento_zona": evento.id,
+        "id_usuario": id_usuario,
+        "id_publicacion": evento.id_publicacion,
+        "id_referencia": None,
+        "titulo": evento.titulo,
+        "descripcion": evento.descripcion,
+        "tipo": "zona",
+        "fecha_creacion": evento.fecha_creacion.isoformat() if evento.fecha_creacion else None,
+        "leido": evento.id <= leido_hasta,
+    }
+
+
+def _eventos_zona_de(id_usuario, solo_no_leidas=False):
+    """
+    [(fecha, dict)] con los últimos eventos de la localidad del usuario (menos
+    los suyos y los anteriores a su registro). Leído = id <= su marca de lectura.
+    """
+    usuario = db.session.get(Usuario, id_usuario)
+    if not usuario or usuario.id_localidad is None:
+        return []
+    leido_hasta = usuario.id_evento_zona_leido or 0
+
+    query = EventoZona.query.filter(
+        EventoZona.id_localidad == usuario.id_localidad,
+        EventoZona.id_autor != id_usuario
+    )
+    if usuario.fecha_registro is not None:
+        query = query.filter(EventoZona.fecha_creacion >= usuario.fecha_registro)
+    if solo_no_leidas:
+        query = query.filter(EventoZona.id > leido_hasta)
+
+    eventos = query.order_by(EventoZona.id.desc()).limit(LIMITE_NOTIFICACIONES).all()
+    return [(e.fecha_creacion, _evento_a_dict(e, id_usuario, leido_hasta)) for e in eventos]
+
+
+def marcar_zona_como_leida(id_usuario, hasta=None):
+    """
+    Avanza la marca de lectura de los avisos de zona del usuario hasta el evento
+    `hasta` (o hasta el último de su localidad). Nunca la hace retroceder.
+    """
+    if hasta is None:
+        usuario = db.session.get(Usuario, id_usuario)
+        if not usuario:
+            return {"error": "Usuario no encontrado"}, 404
+        if usuario.id_localidad is None:
+            return {"mensaje": "Sin avisos de zona", "id_evento_zona_leido": usuario.id_evento_zona_leido}
+        hasta = (
+            db.session.query(func.max(EventoZona.id))
+            .filter(EventoZona.id_localidad == usuario.id_localidad)
+            .scalar()
+        ) or 0
+
+    leido_hasta = db.session.execute(
+        update(Usuario)
+        .where(Usuario.id == id_usuario)
+        .values(id_evento_zona_leido=func.greatest(func.coalesce(Usuario.id_evento_zona_leido, 0), hasta))
+        .returning(Usuario.id_evento_zona_leido)
+    ).scalar()
+    db.session.commit()
+    if leido_hasta is None:
+        return {"error": "Usuario no encontrado"}, 404
+    return {"mensaje": "Avisos de zona marcados como leídos", "id_evento_zona_leido": leido_hasta}
+
+
+# Usuarios por INSERT ... SELECT (y por commit): acota lo que dura cada transacción
+TAMANIO_LOTE_ZONA = 5000
+
+# Métricas del fan-out en este worker (GET /notificaciones/fanout)
+_metricas_zona = {
+    "ejecuciones": 0,
+    "errores": 0,
+    "notificaciones": 0,
+    "segundos_total": 0.0,
+    "segundos_max": 0.0,
+    "ultima": None,
+}
+_lock_metricas = threading.Lock()
+
+
+def notificar_zona(id_publicacion, id_localidad, id_autor, titulo, fecha):
+    """
+    Crea la notificación "Nueva Publicación" para cada usuario de la localidad
+    (menos el autor). Corre en el pool de core.tareas después del commit de la
+    publicación, así que no demora la respuesta ni tiene locks de esa transacción.
+
+    Cada lote es un solo INSERT ... SELECT sobre usuarios (los ids nunca pasan
+    por Python), recorrido por id de a TAMANIO_LOTE_ZONA con un commit por lote.
+    """
+    inicio = time.perf_counter()
+    total = 0
+    error = None
+    ultimo_id = 0
+    try:
+        while True:
+            destinatarios = (
+                select(Usuario.id)
+                .where(Usuario.id_localidad == id_localidad, Usuario.id != id_autor, Usuario.id > ultimo_id)
+                .order_by(Usuario.id)
+                .limit(TAMANIO_LOTE_ZONA)
+                .subquery()
+            )
+            sentencia = insert(Notificacion).from_select(
+                ["id_usuario", "id_publicacion", "titulo", "descripcion", "fecha_creacion", "leido"],
+                select(
+                    destinatarios.c.id,
+                    literal(id_publicacion, Integer),
+                    literal(TITULO_ZONA, Text),
+                    literal(_descripcion_zona(titulo), Text),
+                    literal(fecha, DateTime(timezone=True)),
+                    literal(False, Boolean),
+                )
+            ).returning(Notificacion.id_usuario)
+
+            insertados = db.session.execute(sentencia).scalars().all()
+            db.session.commit()
+            total += len(insertados)
+            if len(insertados) < TAMANIO_LOTE_ZONA:
+                break
+            ultimo_id = max(insertados)
+    except Exception as e:
+        db.session.rollback()
+        error = str(e)
+        print(f"Error notificando la zona de la publicación {id_publicacion}: {e}")
+    finally:
+        segundos = time.perf_counter() - inicio
+        with _lock_metricas:
+            _metricas_zona["ejecuciones"] += 1
+            _metricas_zona["errores"] += error is not None
+            _metricas_zona["notificaciones"] += total
+            _metricas_zona["segundos_total"] += segundos
+            _metricas_zona["segundos_max"] = max(_metricas_zona["segundos_max"], segundos)
+            _metricas_zona["ultima"] = {
+                "id_publicacion": id_publicacion,
+                "notificaciones": total,
+                "segundos": round(segundos, 4),
+                "error": error,
+            }
+        print(f"Fan-out zona publicación {id_publicacion}: {total} notificaciones en {segundos:.3f} s")
+
+
+def metricas_notificaciones_zona():
+    """Copia de las métricas del fan-out de este worker."""
+    with _lock_metricas:
+        metricas = dict(_metricas_zona)
+    ejecuciones = metricas["ejecuciones"]
+    metricas["segundos_promedio"] = round(metricas["segundos_total"] / ejecuciones, 4) if ejecuciones else None
+    metricas["segundos_total"] = round(metricas["segundos_total"], 4)
+    metricas["segundos_max"] = round(metricas["segundos_max"], 4)
+    return metricas
@@ -10,6 +10,8 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from PIL import Image as PilImage
 import os
 from core.models import db, Publicacion, Imagen, Usuario
+from components.imagenes.variantes import variante_de
+from components.imagenes.phash import descargar
 from urllib.parse import urljoin
 from flask import has_app_context, current_app
 
@@ -52,9 +54,11 @@ def generar_pdf_publicacion(id_publicacion):
     # Imagen principal
     if imagen:
         try:
-            response = requests.get(imagen.url, timeout=10)
-            if response.status_code == 200:
-                img_data = BytesIO(response.content)
+            # La variante completa (hasta 1600 px) alcanza para la hoja y pesa mucho menos;
+            # descargar solo acepta URLs de nuestro almacenamiento
+            contenido = descargar(variante_de(imagen, "completa"), reducida=False)
+            if contenido:
+                img_data = BytesIO(contenido)
                 pil_img = PilImage.open(img_data)
                 img_width, img_height = pil_img.size
 
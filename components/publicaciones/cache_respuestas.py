@@ -0,0 +1,125 @@
+"""
+Cache de respuestas del home (GET /publicaciones) y de /publicaciones/filtrar.
+
+Solo se guardan las primeras PAGINAS_CACHEADAS páginas y, en filtrar, las
+combinaciones sin ubicación ni autor (categoría, etiquetas y fechas), que son
+las que se repiten entre visitantes.
+
+Cada entrada recuerda qué publicaciones trae y cuál es la más vieja, así una
+escritura solo invalida las páginas que realmente cambian
+(invalidar_respuestas): las que contienen la publicación y las que quedan en o
+después de su posición en el orden (fecha_creacion desc, id desc), porque un
+alta o una baja corre todo lo que viene detrás.
+"""
+import threading
+from datetime import datetime
+
+from core.cache import CacheMemoria
+from components.publicaciones.indice_geo import fecha_a_timestamp
+
+PAGINAS_CACHEADAS = 3
+LIMIT_MAXIMO_CACHEADO = 50
+
+# Las invalidaciones son locales a este worker: el TTL acota lo que tarda en
+# verse una escritura hecha en otro
+cache_respuestas = CacheMemoria("respuestas", maxsize=1024, ttl=60)
+
+# Se incrementa en cada invalidación: una respuesta calculada mientras hubo una
+# escritura puede estar vieja y no se guarda. El lock cubre el incremento y la
+# comparación con el guardado (los threads del worker escriben a la vez)
+_generacion = 0
+_lock_generacion = threading.Lock()
+
+
+def clave_feed(page, limit, cursor):
+    """Clave para GET /publicaciones, o None si la página no se cachea."""
+    if cursor or page >= PAGINAS_CACHEADAS or limit > LIMIT_MAXIMO_CACHEADO:
+        return None
+    return ("feed", page, limit, cursor is not None)
+
+
+def clave_filtrar(filtros, page, limit, cursor):
+    """Clave para /publicaciones/filtrar, o None si la combinación no se cachea."""
+    if cursor or page >= PAGINAS_CACHEADAS or limit > LIMIT_MAXIMO_CACHEADO:
+        return None
+    if filtros.get("lat") is not None or filtros.get("lon") is not None or filtros.get("id_usuario"):
+        return None
+    etiquetas = tuple(sorted({e.strip() for e in filtros.get("etiquetas") or [] if e.strip()}))
+    return (
+        "filtrar",
+        int(filtros["id_categoria"]) if filtros.get("id_categoria") else None,
+        etiquetas,
+        filtros.get("fecha_min") or None,
+        filtros.get("fecha_max") or None,
+        page, limit, cursor is not None,
+    )
+
+
+def generacion_actual():
+    with _lock_generacion:
+        return _generacion
+
+
+def obtener_respuesta(clave):
+    entrada = cache_respuestas.obtener(clave)
+    return entrada["datos"] if entrada is not None else None
+
+
+def guardar_respuesta(clave, datos, limit, generacion):
+    """
+    Guarda la respuesta (lista de tarjetas o {"publicaciones", "next_cursor"}).
+    `generacion` es generacion_actual() de antes de calcularla. Las respuestas
+    vacías no se guardan (los services también devuelven vacío ante un error).
+    """
+    tarjetas = datos["publicaciones"] if isinstance(datos, dict) else datos
+    if not tarjetas:
+        return
+    orden = [
+        (fecha_a_timestamp(datetime.fromisoformat(t["fecha_creacion"])) or 0.0, t["id"])
+        for t in tarjetas if t.get("fecha_creacion")
+    ]
+    entrada = {
+        "datos": datos,
+        "ids": frozenset(t["id"] for t in tarjetas),
+        # La más vieja de la página; None si hay alguna sin fecha (no se puede ubicar)
+        "minimo": min(orden) if orden and len(orden) == len(tarjetas) else None,
+        "completa": len(tarjetas) >= limit,
+    }
+    with _lock_generacion:
+        # Una invalidación no puede colarse entre la comparación y el guardado
+        if generacion == _generacion:
+            cache_respuestas.guardar(clave, entrada)
+
+
+def _afectada(clave, entrada, id_publicacion, posicion, categorias):
+    if id_publicacion in entrada["ids"]:
+        return True
+
+    # En filtrar, una publicación de otra categoría no entra ni sale de la página
+    id_categoria = clave[1] if clave[0] == "filtrar" else None
+    if id_categoria is not None and categorias is not None and id_categoria not in categorias:
+        return False
+
+    if posicion is None or entrada["minimo"] is None or not entrada["completa"]:
+        return True
+    # Entra (o sale) en o antes del final de la página: todo lo de después se corre
+    return posicion >= entrada["minimo"]
+
+
+def invalidar_respuestas(id_publicacion=None, fecha_ts=None, categorias=None):
+    """
+    Invalida las respuestas que cambian por una escritura de la publicación.
+    `fecha_ts` es su fecha de creación (timestamp) y `categorias` las categorías que
+    tuvo antes y después del cambio; si no se conocen se invalida de más.
+    Sin `id_publicacion` invalida todas (un cambio que toca muchas publicaciones).
+    """
+    global _generacion
+    with _lock_generacion:
+        _generacion += 1
+        if id_publicacion is None:
+            cache_respuestas.limpiar()
+            return
+        posicion = (fecha_ts, id_publicacion) if fecha_ts is not None else None
+        for clave, entrada in cache_respuestas.entradas():
+            if _afectada(clave, entrada, id_publicacion, posicion, categorias):
+                cache_respuestas.invalidar(clave)
@@ -0,0 +1,352 @@
+"""
+Coincidencias entre publicaciones (por ejemplo un "perdido" con un "encontrado").
+
+Cada worker guarda en arrays NumPy un vector de características por
+publicación activa: autor, categoría, posición, fecha, etiquetas (como bits) y
+el texto de título y descripción (bolsa de palabras hasheada y normalizada).
+Para buscar las coincidencias de una publicación se puntúan todas las
+candidatas de una vez con operaciones sobre los arrays, sin recorrerlas en
+Python ni ir a la base.
+
+Solo se comparan publicaciones de distinto autor y de otra categoría (o de las
+categorías de CATEGORIAS_COMPLEMENTARIAS en la config de la app, si está), y
+se descartan las que están a más de RADIO_MAXIMO_KM o a más de DIAS_MAXIMOS.
+
+Como el índice geográfico, se carga al iniciar la app, se actualiza en forma
+incremental desde los servicios de publicaciones y se recarga completo cada
+SEGUNDOS_RECARGA para ver lo que escribieron los otros workers.
+"""
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from flask import current_app
+
+from core.recarga import IndiceRecargable
+from components.publicaciones.indice_geo import RADIO_TIERRA_KM, SIN_CATEGORIA, SLOT_LIBRE, fecha_a_timestamp
+
+# Peso de cada señal en el puntaje final (suman 1)
+PESO_DISTANCIA = 0.35
+PESO_FECHA = 0.20
+PESO_ETIQUETAS = 0.25
+PESO_TEXTO = 0.20
+
+# Distancia y diferencia de fechas a las que la señal cae a 1/e
+ESCALA_KM = 5.0
+ESCALA_DIAS = 7.0
+RADIO_MAXIMO_KM = 50.0
+DIAS_MAXIMOS = 60
+
+# Columnas del vector de texto y bits para las etiquetas (2 palabras de 64 bits)
+DIMENSION_TEXTO = 128
+BITS_ETIQUETAS = 128
+
+CAPACIDAD_INICIAL = 1024
+
+SEGUNDOS_POR_DIA = 86400.0
+
+_PALABRAS_VACIAS = frozenset((
+    "los", "las", "una", "uno", "unos", "unas", "con", "por", "para", "que", "del",
+    "sus", "como", "fue", "esta", "este", "esto", "estaba", "pero", "muy", "sin",
+    "mas", "hay", "tiene", "tenia", "cuando", "donde", "desde", "hasta", "ayer", "hoy",
+))
+
+
+def _palabras(texto):
+    return [p for p in re.findall(r"[a-z0-9]+", texto or "") if len(p) >= 3 and p not in _PALABRAS_VACIAS]
+
+
+def vector_texto(texto):
+    """
+    Vector float32 de DIMENSION_TEXTO con las palabras de `texto` (ya normalizado,
+    como texto_busqueda) hasheadas a columnas con signo, normalizado a norma 1:
+    el producto escalar entre dos vectores es su similitud coseno.
+    """
+    vector = np.zeros(DIMENSION_TEXTO, dtype=np.float32)
+    for palabra in _palabras(texto):
+        h = zlib.crc32(palabra.encode("utf-8"))
+        vector[h % DIMENSION_TEXTO] += 1.0 if (h >> 16) & 1 else -1.0
+    norma = np.linalg.norm(vector)
+    return vector / norma if norma > 0 else vector
+
+
+def bits_etiquetas(ids_etiquetas):
+    """Las etiquetas como un conjunto de bits (uint64 x 2)."""
+    bits = np.zeros(BITS_ETIQUETAS // 64, dtype=np.uint64)
+    for id_etiqueta in ids_etiquetas:
+        bit = id_etiqueta % BITS_ETIQUETAS
+        bits[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+    return bits
+
+
+def caracteristicas(id_publicacion, id_usuario, id_categoria, lat, lon, fecha_creacion, texto, ids_etiquetas):
+    """Arma el registro que guarda el índice para una publicación."""
+    return {
+        "id": id_publicacion,
+        "id_usuario": id_usuario,
+        "categoria": id_categoria or SIN_CATEGORIA,
+        "lat": lat if lat is not None else np.nan,
+        "lon": lon if lon is not None else np.nan,
+        "fecha": fecha_a_timestamp(fecha_creacion) or 0.0,
+        "etiquetas": bits_etiquetas(ids_etiquetas),
+        "texto": vector_texto(texto),
+    }
+
+
+class IndiceCoincidencias:
+    """Vectores de características de las publicaciones activas, en arrays NumPy."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._vaciar(CAPACIDAD_INICIAL)
+        self.cargado = False
+        self.cargado_en = None
+        self.segundos_carga = None
+
+    def _vaciar(self, capacidad):
+        self._ids = np.full(capacidad, SLOT_LIBRE, dtype=np.int64)
+        self._usuarios = np.zeros(capacidad, dtype=np.int64)
+        self._categorias = np.zeros(capacidad, dtype=np.int64)
+        self._lats = np.full(capacidad, np.nan)
+        self._lons = np.full(capacidad, np.nan)
+        self._fechas = np.zeros(capacidad)
+        self._etiquetas = np.zeros((capacidad, BITS_ETIQUETAS // 64), dtype=np.uint64)
+        self._textos = np.zeros((capacidad, DIMENSION_TEXTO), dtype=np.float32)
+        # Slots usados (los libres quedan en _libres y con id SLOT_LIBRE)
+        self._usados = 0
+        self._slot_por_id = {}
+        self._libres = []
+
+    # --- Escritura ---
+
+    def _crecer(self):
+        capacidad = len(self._ids) * 2
+        for nombre in ("_ids", "_usuarios", "_categorias", "_lats", "_lons", "_fechas", "_etiquetas", "_textos"):
+            viejo = getattr(self, nombre)
+            nuevo = np.full((capacidad,) + viejo.shape[1:], SLOT_LIBRE if nombre == "_ids" else 0, dtype=viejo.dtype)
+            nuevo[:len(viejo)] = viejo
+            setattr(self, nombre, nuevo)
+
+    def _insertar(self, registro):
+        if self._libres:
+            slot = self._libres.pop()
+        else:
+            if self._usados == len(self._ids):
+                self._crecer()
+            slot = self._usados
+            self._usados += 1
+
+        self._ids[slot] = registro["id"]
+        self._usuarios[slot] = registro["id_usuario"]
+        self._categorias[slot] = registro["categoria"]
+        self._lats[slot] = registro["lat"]
+        self._lons[slot] = registro["lon"]
+        self._fechas[slot] = registro["fecha"]
+        self._etiquetas[slot] = registro["etiquetas"]
+        self._textos[slot] = registro["texto"]
+        self._slot_por_id[registro["id"]] = slot
+
+    def _borrar(self, id_publicacion):
+        slot = self._slot_por_id.pop(id_publicacion, None)
+        if slot is not None:
+            self._ids[slot] = SLOT_LIBRE
+            self._libres.append(slot)
+
+    def cargar(self, registros):
+        """Reconstruye el índice completo desde registros armados con caracteristicas()."""
+        inicio = time.perf_counter()
+        nuevo = IndiceCoincidencias()
+        for registro in registros:
+            nuevo._insertar(registro)
+
+        with self._lock:
+            self._ids, self._usuarios, self._categorias = nuevo._ids, nuevo._usuarios, nuevo._categorias
+            self._lats, self._lons, self._fechas = nuevo._lats, nuevo._lons, nuevo._fechas
+            self._etiquetas, self._textos = nuevo._etiquetas, nuevo._textos
+            self._usados, self._slot_por_id, self._libres = nuevo._usados, nuevo._slot_por_id, nuevo._libres
+            self.cargado = True
+            self.cargado_en = time.monotonic()
+            self.segundos_carga = time.perf_counter() - inicio
+
+    def agregar_o_actualizar(self, registro):
+        with self._lock:
+            self._borrar(registro["id"])
+            self._insertar(registro)
+
+    def quitar(self, id_publicacion):
+        with self._lock:
+            self._borrar(id_publicacion)
+
+    # --- Lectura ---
+
+    def registro(self, id_publicacion):
+        """El registro indexado de una publicación, o None si no está."""
+        with self._lock:
+            slot = self._slot_por_id.get(id_publicacion)
+            if slot is None:
+                return None
+            return {
+                "id": id_publicacion,
+                "id_usuario": int(self._usuarios[slot]),
+                "categoria": int(self._categorias[slot]),
+                "lat": float(self._lats[slot]),
+                "lon": float(self._lons[slot]),
+                "fecha": float(self._fechas[slot]),
+                "etiquetas": self._etiquetas[slot].copy(),
+                "texto": self._textos[slot].copy(),
+            }
+
+    def buscar(self, registro, cantidad=10, categorias=None, puntaje_minimo=0.0):
+        """
+        Retorna las `cantidad` mejores coincidencias de `registro` como
+        [(id, puntaje, {distancia_km, dias, etiquetas, texto})] ordenadas por puntaje.
+        `categorias` son las categorías candidatas; None = cualquier otra categoría.
+        """
+        with self._lock:
+            n = self._usados
+            ids = self._ids[:n]
+            fechas = self._fechas[:n]
+
+            dias = np.abs(fechas - registro["fecha"]) / SEGUNDOS_POR_DIA
+            posibles = (ids != SLOT_LIBRE) & (ids != registro["id"]) & (dias <= DIAS_MAXIMOS)
+            posibles &= self._usuarios[:n] != registro["id_usuario"]
+            if categorias is None:
+                posibles &= self._categorias[:n] != registro["categoria"]
+            else:
+                posibles &= np.isin(self._categorias[:n], list(categorias))
+
+            indices = np.flatnonzero(posibles)
+            distancias = self._distancias(registro["lat"], registro["lon"], indices)
+            # Sin coordenadas (NaN) no se puede descartar por distancia
+            cerca = ~(distancias > RADIO_MAXIMO_KM)
+            indices, distancias = indices[cerca], distancias[cerca]
+
+            comunes = np.bitwise_count(self._etiquetas[indices] & registro["etiquetas"]).sum(axis=1)
+            todas = np.bitwise_count(self._etiquetas[indices] | registro["etiquetas"]).sum(axis=1)
+            similitud_texto = np.clip(self._textos[indices] @ registro["texto"], 0.0, 1.0)
+            candidatos = ids[indices]
+            dias = dias[indices]
+
+        senal_distancia = np.nan_to_num(np.exp(-distancias / ESCALA_KM), nan=0.0)
+        senal_fecha = np.exp(-dias / ESCALA_DIAS)
+        senal_etiquetas = np.divide(comunes, todas, out=np.zeros(len(todas)), where=todas > 0)
+        puntajes = (
+            PESO_DISTANCIA * senal_distancia
+            + PESO_FECHA * senal_fecha
+            + PESO_ETIQUETAS * senal_etiquetas
+            + PESO_TEXTO * similitud_texto
+        )
+
+        elegibles = np.flatnonzero(puntajes >= puntaje_minimo)
+        if len(elegibles) > cantidad:
+            elegibles = elegibles[np.argpartition(-puntajes[elegibles], cantidad - 1)[:cantidad]]
+        # Mayor puntaje primero; a igual puntaje, la más nueva
+        elegibles = elegibles[np.lexsort((-candidatos[elegibles], -puntajes[elegibles]))]
+
+        return [
+            (int(candidatos[i]), round(float(puntajes[i]), 4), {
+                "distancia_km": None if np.isnan(distancias[i]) else round(float(distancias[i]), 3),
+                "dias": round(float(dias[i]), 1),
+                "etiquetas": round(float(senal_etiquetas[i]), 3),
+                "texto": round(float(similitud_texto[i]), 3),
+            })
+            for i in elegibles
+        ]
+
+    def _distancias(self, lat, lon, indices):
+        """Haversine en km desde (lat, lon) a los slots `indices` (NaN si falta alguna coordenada)."""
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2, lon2 = np.radians(self._lats[indices]), np.radians(self._lons[indices])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "cargado": self.cargado,
+                "publicaciones": len(self._slot_por_id),
+                "capacidad": len(self._ids),
+                "bytes_aproximados": sum(
+                    arr.nbytes for arr in (
+                        self._ids, self._usuarios, self._categorias, self._lats,
+                        self._lons, self._fechas, self._etiquetas, self._textos
+                    )
+                ),
+                "segundos_carga": round(self.segundos_carga, 4) if self.segundos_carga is not None else None,
+            }
+
+
+indice_coincidencias = IndiceCoincidencias()
+
+
+def _registros_activos():
+    # Import diferido para no crear un ciclo con core.models al importar el paquete
+    from core.models import db, Publicacion, PublicacionEtiqueta
+
+    activa = (Publicacion.estado == 0) | (Publicacion.estado.is_(None))
+    etiquetas = {}
+    for id_publicacion, id_etiqueta in (
+        db.session.query(PublicacionEtiqueta.id_publicacion, PublicacionEtiqueta.id_etiqueta)
+        .join(Publicacion, Publicacion.id == PublicacionEtiqueta.id_publicacion)
+        .filter(activa)
+        .yield_per(5000)
+    ):
+        etiquetas.setdefault(id_publicacion, []).append(id_etiqueta)
+
+    filas = (
+        db.session.query(
+            Publicacion.id, Publicacion.id_usuario, Publicacion.id_categoria,
+            Publicacion.latitud, Publicacion.longitud, Publicacion.fecha_creacion,
+            Publicacion.texto_busqueda
+        )
+        .filter(activa)
+        .yield_per(5000)
+    )
+    for fila in filas:
+        yield caracteristicas(*fila, etiquetas.get(fila.id, ()))
+
+
+def _cargar_indice_coincidencias():
+    indice_coincidencias.cargar(_registros_activos())
+    stats = indice_coincidencias.estadisticas()
+    print(
+        f"Índice de coincidencias cargado: {stats['publicaciones']} publicaciones, "
+        f"{stats['bytes_aproximados'] / 1024:.0f} KiB en {stats['segundos_carga']:.3f} s"
+    )
+
+
+_recarga = IndiceRecargable(indice_coincidencias, _cargar_indice_coincidencias, "el índice de coincidencias")
+cargar_indice_coincidencias = _recarga.cargar
+indice_coincidencias_disponible = _recarga.disponible
+
+
+def registro_de(pub):
+    """Registro de características de una publicación cargada."""
+    return caracteristicas(
+        pub.id, pub.id_usuario, pub.id_categoria, pub.latitud, pub.longitud,
+        pub.fecha_creacion, pub.texto_busqueda, [et.id for et in pub.etiquetas]
+    )
+
+
+def sincronizar_coincidencias(id_publicacion, pub):
+    """
+    Refleja en el índice el estado actual de una publicación ya commiteada.
+    `pub` es None si la publicación fue eliminada.
+    """
+    if not indice_coincidencias.cargado:
+        return
+    if pub is not None and (pub.estado == 0 or pub.estado is None):
+        indice_coincidencias.agregar_o_actualizar(registro_de(pub))
+    else:
+        indice_coincidencias.quitar(id_publicacion)
+
+
+def categorias_candidatas(id_categoria):
+    """
+    Categorías contra las que se compara una publicación según
+    CATEGORIAS_COMPLEMENTARIAS ({id_categoria: [ids]}), o None (cualquier otra).
+    """
+    complementarias = current_app.config.get("CATEGORIAS_COMPLEMENTARIAS") or {}
+    return complementarias.get(id_categoria or SIN_CATEGORIA)
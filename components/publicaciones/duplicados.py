@@ -0,0 +1,205 @@
+"""
+Detección de publicaciones casi duplicadas (MinHash + LSH).
+
+El texto normalizado de título y descripción (el mismo que texto_busqueda) se
+parte en shingles de TAMANIO_SHINGLE palabras y se resume en una firma MinHash
+de NUM_PERMUTACIONES valores: la proporción de valores iguales entre dos firmas
+estima la similitud de Jaccard de los textos.
+
+Para no comparar contra todas, la firma se corta en BANDAS bandas y cada banda
+va a una tabla (LSH): solo se comparan las publicaciones que comparten alguna
+banda entera, que con FILAS_POR_BANDA = 8 son casi solo las de similitud
+mayor a ~0.7.
+
+Como los otros índices en memoria, se carga al iniciar la app, se mantiene
+desde _propagar_cambio y se recarga completo cada SEGUNDOS_RECARGA. La marca que
+ven los moderadores (publicaciones.id_duplicado_de) sí queda en la base.
+"""
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from core.recarga import IndiceRecargable
+
+NUM_PERMUTACIONES = 128
+BANDAS = 16
+FILAS_POR_BANDA = NUM_PERMUTACIONES // BANDAS
+TAMANIO_SHINGLE = 3
+
+# Similitud estimada a partir de la cual una publicación es duplicado de otra
+UMBRAL_DUPLICADO = 0.8
+
+# Hash universal (a * x + b) mod PRIMO con coeficientes fijos: las firmas son
+# iguales en todos los workers y entre reinicios
+PRIMO = 4294967291
+_rng = np.random.default_rng(20261018)
+_COEF_A = _rng.integers(1, PRIMO, NUM_PERMUTACIONES, dtype=np.uint64)
+_COEF_B = _rng.integers(0, PRIMO, NUM_PERMUTACIONES, dtype=np.uint64)
+
+
+def _shingles(texto):
+    palabras = re.findall(r"[a-z0-9]+", texto or "")
+    if len(palabras) <= TAMANIO_SHINGLE:
+        return {" ".join(palabras)} if palabras else set()
+    return {" ".join(palabras[i:i + TAMANIO_SHINGLE]) for i in range(len(palabras) - TAMANIO_SHINGLE + 1)}
+
+
+def firma_minhash(texto):
+    """Firma MinHash (uint32 x NUM_PERMUTACIONES) de un texto ya normalizado, o None si está vacío."""
+    shingles = _shingles(texto)
+    if not shingles:
+        return None
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    x %= np.uint64(PRIMO)
+    # (p - 1)^2 + (p - 1) < 2^64: no hay overflow en uint64
+    return ((x[:, None] * _COEF_A + _COEF_B) % np.uint64(PRIMO)).min(axis=0).astype(np.uint32)
+
+
+def _bandas(firma):
+    return [firma[i * FILAS_POR_BANDA:(i + 1) * FILAS_POR_BANDA].tobytes() for i in range(BANDAS)]
+
+
+class IndiceDuplicados:
+    """Firmas MinHash de las publicaciones activas con sus tablas LSH por banda."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._publicaciones = {}
+        self._tablas = [{} for _ in range(BANDAS)]
+        self.cargado = False
+        self.cargado_en = None
+
+    def _insertar(self, publicaciones, tablas, id_publicacion, firma, id_usuario, id_locacion, id_original):
+        publicaciones[id_publicacion] = (firma, id_usuario, id_locacion, id_original)
+        for tabla, banda in zip(tablas, _bandas(firma)):
+            tabla.setdefault(banda, set()).add(id_publicacion)
+
+    def _borrar(self, id_publicacion):
+        previo = self._publicaciones.pop(id_publicacion, None)
+        if previo is None:
+            return
+        for tabla, banda in zip(self._tablas, _bandas(previo[0])):
+            ids = tabla.get(banda)
+            if ids is not None:
+                ids.discard(id_publicacion)
+                if not ids:
+                    del tabla[banda]
+
+    def cargar(self, filas):
+        """Reconstruye el índice desde filas (id, firma, id_usuario, id_locacion, id_duplicado_de)."""
+        publicaciones = {}
+        tablas = [{} for _ in range(BANDAS)]
+        for id_publicacion, firma, id_usuario, id_locacion, id_original in filas:
+            if firma is not None:
+                self._insertar(publicaciones, tablas, id_publicacion, firma, id_usuario, id_locacion, id_original)
+        with self._lock:
+            self._publicaciones, self._tablas = publicaciones, tablas
+            self.cargado = True
+            self.cargado_en = time.monotonic()
+
+    def agregar_o_actualizar(self, id_publicacion, firma, id_usuario, id_locacion, id_original=None):
+        with self._lock:
+            self._borrar(id_publicacion)
+            if firma is not None:
+                self._insertar(
+                    self._publicaciones, self._tablas, id_publicacion, firma, id_usuario, id_locacion, id_original
+                )
+
+    def quitar(self, id_publicacion):
+        with self._lock:
+            self._borrar(id_publicacion)
+
+    def similares(self, firma, id_usuario=None, id_locacion=None, umbral=UMBRAL_DUPLICADO, excluir=None):
+        """
+        [(id, similitud, id_original)] de las publicaciones con similitud estimada
+        >= umbral. Si se pasa id_usuario o id_locacion, solo las del mismo autor
+        o de la misma localidad.
+        """
+        if firma is None:
+            return []
+        resultado = []
+        with self._lock:
+            candidatos = set()
+            for tabla, banda in zip(self._tablas, _bandas(firma)):
+                candidatos |= tabla.get(banda, set())
+            candidatos.discard(excluir)
+
+            for id_candidato in candidatos:
+                otra, usuario, locacion, id_original = self._publicaciones[id_candidato]
+                if (id_usuario is not None or id_locacion is not None) and not (
+                        (id_usuario is not None and usuario == id_usuario)
+                        or (id_locacion is not None and locacion == id_locacion)):
+                    continue
+                similitud = float(np.count_nonzero(otra == firma)) / NUM_PERMUTACIONES
+                if similitud >= umbral:
+                    resultado.append((id_candidato, similitud, id_original))
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "cargado": self.cargado,
+                "publicaciones": len(self._publicaciones),
+                "buckets": sum(len(tabla) for tabla in self._tablas),
+            }
+
+
+indice_duplicados = IndiceDuplicados()
+
+
+def original_de(similares):
+    """
+    De los resultados de similares(), el id de la publicación original: la más
+    vieja (id más chico), siguiendo su marca si ella misma era un duplicado.
+    """
+    if not similares:
+        return None
+    id_publicacion, _, id_original = min(similares)
+    return id_original or id_publicacion
+
+
+def _filas_activas():
+    # Import diferido para no crear un ciclo con core.models al importar el paquete
+    from core.models import db, Publicacion
+
+    filas = (
+        db.session.query(
+            Publicacion.id, Publicacion.texto_busqueda, Publicacion.id_usuario,
+            Publicacion.id_locacion, Publicacion.id_duplicado_de
+        )
+        .filter((Publicacion.estado == 0) | (Publicacion.estado.is_(None)))
+        .yield_per(5000)
+    )
+    for fila in filas:
+        yield fila.id, firma_minhash(fila.texto_busqueda), fila.id_usuario, fila.id_locacion, fila.id_duplicado_de
+
+
+def _cargar_indice_duplicados():
+    inicio = time.perf_counter()
+    indice_duplicados.cargar(_filas_activas())
+    print(
+        f"Índice de duplicados cargado: {indice_duplicados.estadisticas()['publicaciones']} "
+        f"publicaciones en {time.perf_counter() - inicio:.3f} s"
+    )
+
+
+_recarga = IndiceRecargable(indice_duplicados, _cargar_indice_duplicados, "el índice de duplicados")
+cargar_indice_duplicados = _recarga.cargar
+indice_duplicados_disponible = _recarga.disponible
+
+
+def sincronizar_duplicados(id_publicacion, pub):
+    """
+    Refleja en el índice el estado actual de una publicación ya commiteada.
+    `pub` es None si la publicación fue eliminada.
+    """
+    if not indice_duplicados.cargado:
+        return
+    if pub is not None and (pub.estado == 0 or pub.estado is None):
+        indice_duplicados.agregar_o_actualizar(
+            pub.id, firma_minhash(pub.texto_busqueda), pub.id_usuario, pub.id_locacion, pub.id_duplicado_de
+        )
+    else:
+        indice_duplicados.quitar(id_publicacion)
@@ -0,0 +1,426 @@
+"""
+Índice geográfico en memoria de las publicaciones activas.
+
+Cada worker guarda (id, lat, lon, categoría, fecha de creación) de las
+publicaciones activas en arrays compactos y las agrupa en una grilla de celdas
+de TAMANIO_CELDA grados. Las consultas por radio o por caja solo recorren las
+celdas que tocan la zona pedida, así que no hace falta calcular la distancia a
+todas las filas en Postgres: la base solo se usa después para hidratar la
+página final.
+
+Se carga al iniciar la app (cargar_indice_geo) y se mantiene al día en forma
+incremental desde los servicios de publicaciones (sincronizar_publicacion).
+Como cada worker tiene su propia copia, además se recarga completo cada
+SEGUNDOS_RECARGA para incorporar lo que escribieron los otros workers.
+"""
+import heapq
+import math
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+from core.recarga import IndiceRecargable
+
+RADIO_TIERRA_KM = 6371
+KM_POR_GRADO_LAT = 111.32
+
+# ~11 km de lado en latitud: pocas celdas por consulta para radios de 1 a 50 km
+TAMANIO_CELDA = 0.1
+
+SIN_CATEGORIA = 0
+SLOT_LIBRE = -1
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia de círculo máximo (haversine) en km."""
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def caja_alrededor(lat, lon, radio_km):
+    """Devuelve (lat_min, lon_min, lat_max, lon_max) de la caja que contiene el círculo."""
+    delta_lat = radio_km / KM_POR_GRADO_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    delta_lon = min(radio_km / (KM_POR_GRADO_LAT * cos_lat), 180.0)
+    return lat - delta_lat, lon - delta_lon, lat + delta_lat, lon + delta_lon
+
+
+def _a_timestamp(fecha):
+    if fecha is None:
+        return 0.0
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return round(fecha.timestamp(), 6)
+
+
+class IndiceGeo:
+    """Grilla en memoria de publicaciones activas, respaldada por arrays."""
+
+    def __init__(self, tamanio_celda=TAMANIO_CELDA):
+        self.tamanio_celda = tamanio_celda
+        self._lock = threading.RLock()
+        self._vaciar()
+        self.cargado = False
+        self.cargado_en = None
+        self.segundos_carga = None
+
+    def _vaciar(self):
+        # Un "slot" es la posición de una publicación en los arrays paralelos
+        self._ids = array('q')
+        self._lats = array('d')
+        self._lons = array('d')
+        self._categorias = array('q')
+        self._fechas = array('d')
+        self._slot_por_id = {}
+        self._celdas = {}
+        self._libres = []
+
+    # --- Escritura ---
+
+    def _celda(self, lat, lon):
+        return (math.floor(lat / self.tamanio_celda), math.floor(lon / self.tamanio_celda))
+
+    def cargar(self, filas):
+        """Reconstruye el índice completo desde filas (id, lat, lon, id_categoria, fecha_creacion)."""
+        inicio = time.perf_counter()
+        nuevo = IndiceGeo(self.tamanio_celda)
+        for fila in filas:
+            nuevo._insertar(*fila)
+
+        with self._lock:
+            self._ids, self._lats, self._lons = nuevo._ids, nuevo._lats, nuevo._lons
+            self._categorias, self._fechas = nuevo._categorias, nuevo._fechas
+            self._slot_por_id, self._celdas, self._libres = nuevo._slot_por_id, nuevo._celdas, nuevo._libres
+            self.cargado = True
+            self.cargado_en = time.monotonic()
+            self.segundos_carga = time.perf_counter() - inicio
+
+    def _insertar(self, id_publicacion, lat, lon, id_categoria, fecha_creacion):
+        id_categoria = id_categoria or SIN_CATEGORIA
+        fecha = fecha_creacion if isinstance(fecha_creacion, float) else _a_timestamp(fecha_creacion)
+
+        if self._libres:
+            slot = self._libres.pop()
+            self._ids[slot] = id_publicacion
+            self._lats[slot] = lat
+            self._lons[slot] = lon
+            self._categorias[slot] = id_categoria
+            self._fechas[slot] = fecha
+        else:
+            slot = len(self._ids)
+            self._ids.append(id_publicacion)
+            self._lats.append(lat)
+            self._lons.append(lon)
+            self._categorias.append(id_categoria)
+            self._fechas.append(fecha)
+
+        self._slot_por_id[id_publicacion] = slot
+        self._celdas.setdefault(self._celda(lat, lon), array('q')).append(slot)
+
+    def _borrar(self, id_publicacion):
+        slot = self._slot_por_id.pop(id_publicacion, None)
+        if slot is None:
+            return
+        celda = self._celda(self._lats[slot], self._lons[slot])
+        slots = self._celdas.get(celda)
+        if slots is not None:
+            slots.remove(slot)
+            if not slots:
+                del self._celdas[celda]
+        self._ids[slot] = SLOT_LIBRE
+        self._libres.append(slot)
+
+    def agregar_o_actualizar(self, id_publicacion, lat, lon, id_categoria, fecha_creacion):
+        with self._lock:
+            self._borrar(id_publicacion)
+            self._insertar(id_publicacion, lat, lon, id_categoria, fecha_creacion)
+
+    def quitar(self, id_publicacion):
+        with self._lock:
+            self._borrar(id_publicacion)
+
+    # --- Lectura ---
+
+    def _slots_en_caja(self, lat_min, lon_min, lat_max, lon_max):
+        fila_min, col_min = self._celda(lat_min, lon_min)
+        fila_max, col_max = self._celda(lat_max, lon_max)
+        cantidad_celdas = (fila_max - fila_min + 1) * (col_max - col_min + 1)
+
+        # Si la caja abarca más celdas que las ocupadas, conviene recorrer las ocupadas
+        if cantidad_celdas > len(self._celdas):
+            for (fila, col), slots in self._celdas.items():
+                if fila_min <= fila <= fila_max and col_min <= col <= col_max:
+                    yield from slots
+            return
+
+        for fila in range(fila_min, fila_max + 1):
+            for col in range(col_min, col_max + 1):
+                slots = self._celdas.get((fila, col))
+                if slots:
+                    yield from slots
+
+    def _coincide(self, slot, id_categoria, fecha_min, fecha_max):
+        if id_categoria is not None and self._categorias[slot] != id_categoria:
+            return False
+        if fecha_min is not None and self._fechas[slot] < fecha_min:
+            return False
+        if fecha_max is not None and self._fechas[slot] > fecha_max:
+            return False
+        return True
+
+    def en_caja(self, lat_min, lon_min, lat_max, lon_max, id_categoria=None, fecha_min=None, fecha_max=None):
+        """Retorna [(id, fecha_ts, lat, lon)] de las publicaciones dentro de la caja."""
+        resultado = []
+        with self._lock:
+            for slot in self._slots_en_caja(lat_min, lon_min, lat_max, lon_max):
+                lat, lon = self._lats[slot], self._lons[slot]
+                if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+                    continue
+                if self._coincide(slot, id_categoria, fecha_min, fecha_max):
+                    resultado.append((self._ids[slot], self._fechas[slot], lat, lon))
+        return resultado
+
+    def en_radio(self, lat, lon, radio_km, id_categoria=None, fecha_min=None, fecha_max=None):
+        """Retorna [(id, fecha_ts, distancia_km)] de las publicaciones dentro del radio."""
+        lat_min, lon_min, lat_max, lon_max = caja_alrededor(lat, lon, radio_km)
+        resultado = []
+        with self._lock:
+            for slot in self._slots_en_caja(lat_min, lon_min, lat_max, lon_max):
+                if not self._coincide(slot, id_categoria, fecha_min, fecha_max):
+                    continue
+                distancia = distancia_km(lat, lon, self._lats[slot], self._lons[slot])
+                if distancia <= radio_km:
+                    resultado.append((self._ids[slot], self._fechas[slot], distancia))
+        return resultado
+
+    def _km_en_longitud(self, lat, delta_lon):
+        """Distancia mínima (km) desde un punto a latitud `lat` hasta el meridiano a `delta_lon` grados."""
+        if delta_lon <= 0.0:
+            return 0.0
+        seno = abs(math.cos(math.radians(lat))) * math.sin(math.radians(min(delta_lon, 90.0)))
+        return RADIO_TIERRA_KM * math.asin(min(1.0, seno))
+
+    def _distancia_minima_a_celda(self, lat, lon, celda):
+        """
+        Cota inferior (km) de la distancia desde (lat, lon) a cualquier punto de la celda:
+        el máximo entre lo que hay que moverse en latitud y la distancia al
+        meridiano más cercano de la celda, las dos exactas sobre la esfera.
+        """
+        fila, col = celda
+        lat_min = fila * self.tamanio_celda
+        lon_min = col * self.tamanio_celda
+        delta_lat = max(lat_min - lat, lat - (lat_min + self.tamanio_celda), 0.0)
+        delta_lon = max(lon_min - lon, lon - (lon_min + self.tamanio_celda), 0.0)
+        return max(RADIO_TIERRA_KM * math.radians(delta_lat), self._km_en_longitud(lat, delta_lon))
+
+    def _distancia_minima_fuera_de(self, lat, lon, fila_min, col_min, fila_max, col_max):
+        """Cota inferior (km) de la distancia desde (lat, lon) a cualquier punto fuera del bloque de celdas."""
+        t = self.tamanio_celda
+        delta_lat = min(lat - fila_min * t, (fila_max + 1) * t - lat)
+        delta_lon = min(lon - col_min * t, (col_max + 1) * t - lon)
+        return min(RADIO_TIERRA_KM * math.radians(delta_lat), self._km_en_longitud(lat, delta_lon))
+
+    def _anillo(self, fila, col, radio):
+        """Celdas ocupadas a exactamente `radio` celdas (distancia Chebyshev) de (fila, col)."""
+        if radio == 0:
+            candidatas = [(fila, col)]
+        else:
+            candidatas = [(fila - radio, c) for c in range(col - radio, col + radio + 1)]
+            candidatas += [(fila + radio, c) for c in range(col - radio, col + radio + 1)]
+            candidatas += [(f, col - radio) for f in range(fila - radio + 1, fila + radio)]
+            candidatas += [(f, col + radio) for f in range(fila - radio + 1, fila + radio)]
+        return [celda for celda in candidatas if celda in self._celdas]
+
+    def mas_cercanas(self, lat, lon, cantidad, radio_km=None, id_categoria=None, fecha_min=None, fecha_max=None):
+        """
+        Retorna [(id, fecha_ts, distancia_km)] de las `cantidad` publicaciones más
+        cercanas, ordenadas por distancia (y por id para desempatar).
+
+        Búsqueda best-first: se abren anillos de celdas alrededor del punto y se
+        visitan las celdas en orden de su distancia mínima. Se corta cuando ninguna
+        celda sin visitar (ni nada fuera de los anillos abiertos) puede mejorar a
+        la peor de las `cantidad` encontradas, así que solo se calcula la
+        distancia a las publicaciones de la zona.
+        """
+        if cantidad <= 0:
+            return []
+
+        fila0, col0 = self._celda(lat, lon)
+        # Heap de máximos (valores negados) con las mejores encontradas hasta ahora
+        mejores = []
+        pendientes = []
+        anillo = -1
+        cota_afuera = 0.0
+
+        with self._lock:
+            while True:
+                limite = radio_km if radio_km is not None else math.inf
+                if len(mejores) == cantidad:
+                    limite = min(limite, -mejores[0][0])
+
+                # Se abren anillos mientras lo de afuera pueda estar más cerca que lo pendiente
+                while cota_afuera < math.inf and cota_afuera <= limite and (
+                        not pendientes or pendientes[0][0] > cota_afuera):
+                    anillo += 1
+                    if (2 * anillo + 1) ** 2 > len(self._celdas):
+                        # Ya se recorrieron más celdas que las ocupadas: conviene encolar de
+                        # una todas las que faltan en vez de seguir abriendo anillos vacíos
+                        celdas = [
+                            celda for celda in self._celdas
+                            if max(abs(celda[0] - fila0), abs(celda[1] - col0)) >= anillo
+                        ]
+                        cota_afuera = math.inf
+                    else:
+                        celdas = self._anillo(fila0, col0, anillo)
+                        cota_afuera = self._distancia_minima_fuera_de(
+                            lat, lon, fila0 - anillo, col0 - anillo, fila0 + anillo, col0 + anillo
+                        )
+                    for celda in celdas:
+                        heapq.heappush(pendientes, (self._distancia_minima_a_celda(lat, lon, celda), celda))
+
+                if not pendientes:
+                    break
+                cota, celda = heapq.heappop(pendientes)
+                if cota > limite:
+                    break
+
+                for slot in self._celdas[celda]:
+                    if not self._coincide(slot, id_categoria, fecha_min, fecha_max):
+                        continue
+                    distancia = distancia_km(lat, lon, self._lats[slot], self._lons[slot])
+                    if radio_km is not None and distancia > radio_km:
+                        continue
+                    candidato = (-distancia, -self._ids[slot], self._fechas[slot])
+                    if len(mejores) < cantidad:
+                        heapq.heappush(mejores, candidato)
+                    elif candidato > mejores[0]:
+                        heapq.heapreplace(mejores, candidato)
+
+        return [
+            (-id_negado, fecha, -distancia_negada)
+            for distancia_negada, id_negado, fecha in sorted(mejores, reverse=True)
+        ]
+
+    def todas(self, id_categoria=None, fecha_min=None, fecha_max=None):
+        """Retorna [(id, fecha_ts, lat, lon)] de todas las publicaciones indexadas."""
+        with self._lock:
+            return [
+                (self._ids[slot], self._fechas[slot], self._lats[slot], self._lons[slot])
+                for slot in self._slot_por_id.values()
+                if self._coincide(slot, id_categoria, fecha_min, fecha_max)
+            ]
+
+    def posicion(self, id_publicacion):
+        """(lat, lon) indexada de una publicación, o None si no está en el índice."""
+        with self._lock:
+            slot = self._slot_por_id.get(id_publicacion)
+            if slot is None:
+                return None
+            return self._lats[slot], self._lons[slot]
+
+    def registro(self, id_publicacion):
+        """(lat, lon, id_categoria, fecha_ts) indexados de una publicación, o None."""
+        with self._lock:
+            slot = self._slot_por_id.get(id_publicacion)
+            if slot is None:
+                return None
+            return self._lats[slot], self._lons[slot], self._categorias[slot], self._fechas[slot]
+
+    def columnas(self):
+        """
+        Copia de los arrays (ids, lats, lons, categorias, fechas) para procesarlos
+        en bloque (por ejemplo con NumPy). Los slots libres tienen id SLOT_LIBRE.
+        """
+        with self._lock:
+            return (
+                array('q', self._ids), array('d', self._lats), array('d', self._lons),
+                array('q', self._categorias), array('d', self._fechas)
+            )
+
+    def estadisticas(self):
+        """Cantidad de publicaciones, celdas, memoria aproximada y tiempo de carga."""
+        with self._lock:
+            bytes_arrays = sum(
+                arr.buffer_info()[1] * arr.itemsize
+                for arr in (self._ids, self._lats, self._lons, self._categorias, self._fechas)
+            )
+            bytes_dicts = sys.getsizeof(self._slot_por_id) + sys.getsizeof(self._celdas)
+            bytes_celdas = sum(
+                sys.getsizeof(celda) + sys.getsizeof(slots) for celda, slots in self._celdas.items()
+            )
+            return {
+                "cargado": self.cargado,
+                "publicaciones": len(self._slot_por_id),
+                "celdas": len(self._celdas),
+                "bytes_aproximados": bytes_arrays + bytes_dicts + bytes_celdas,
+                "segundos_carga": round(self.segundos_carga, 4) if self.segundos_carga is not None else None,
+            }
+
+
+indice_geo = IndiceGeo()
+
+
+def _filas_activas():
+    # Import diferido para no crear un ciclo con core.models al importar el paquete
+    from core.models import db, Publicacion
+
+    return (
+        db.session.query(
+            Publicacion.id, Publicacion.latitud, Publicacion.longitud,
+            Publicacion.id_categoria, Publicacion.fecha_creacion
+        )
+        .filter((Publicacion.estado == 0) | (Publicacion.estado.is_(None)))
+        .filter(Publicacion.latitud.isnot(None), Publicacion.longitud.isnot(None))
+        .yield_per(5000)
+    )
+
+
+def _cargar_indice_geo():
+    indice_geo.cargar(tuple(fila) for fila in _filas_activas())
+    stats = indice_geo.estadisticas()
+    print(
+        f"Índice geográfico cargado: {stats['publicaciones']} publicaciones, "
+        f"{stats['bytes_aproximados'] / 1024:.0f} KiB en {stats['segundos_carga']:.3f} s"
+    )
+
+
+_recarga = IndiceRecargable(indice_geo, _cargar_indice_geo, "el índice geográfico")
+# Carga (o recarga) desde la base; requiere contexto de app
+cargar_indice_geo = _recarga.cargar
+# Si el índice se puede usar para responder (si venció, recarga en segundo plano)
+indice_disponible = _recarga.disponible
+
+
+def sincronizar_publicacion(id_publicacion, pub):
+    """
+    Refleja en el índice el estado actual de una publicación ya commiteada.
+    `pub` es None si la publicación fue eliminada.
+    """
+    if not indice_geo.cargado:
+        return
+    activa = pub is not None and (pub.estado == 0 or pub.estado is None)
+    if activa and pub.latitud is not None and pub.longitud is not None:
+        indice_geo.agregar_o_actualizar(
+            pub.id, pub.latitud, pub.longitud, pub.id_categoria, pub.fecha_creacion
+        )
+    else:
+        indice_geo.quitar(id_publicacion)
+
+
+def fecha_a_timestamp(fecha):
+    """Convierte 'YYYY-MM-DD' (como lo recibe /publicaciones/filtrar) o un datetime a timestamp UTC."""
+    if not fecha:
+        return None
+    if isinstance(fecha, str):
+        fecha = datetime.strptime(fecha, '%Y-%m-%d')
+    return _a_timestamp(fecha)
+
+
+def timestamp_a_fecha(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc)
@@ -0,0 +1,226 @@
+"""
+Mapa de calor: grilla de densidad de publicaciones activas dentro de una caja.
+
+Las coordenadas salen del índice geográfico en memoria como arrays y se agrupan
+en celdas con NumPy (una sola pasada con bincount, sin recorrer fila por fila en
+Python). Si el índice no está cargado se leen solo lat/lon/categoría/fecha de
+la base con el filtro por caja del índice GiST.
+
+Cada grilla se guarda en cache por (caja, resolución, filtros). Cuando cambia una
+publicación no se tira la grilla: se resta de la celda donde estaba y se suma en
+la celda donde quedó (actualizar_mapas_calor).
+"""
+import threading
+
+import numpy as np
+from sqlalchemy import func
+
+from core.cache import CacheMemoria
+from core.models import db, Publicacion
+from components.publicaciones.indice_geo import (
+    indice_geo,
+    indice_disponible,
+    fecha_a_timestamp,
+    SLOT_LIBRE,
+    SIN_CATEGORIA,
+)
+
+RESOLUCION_DEFAULT = 64
+RESOLUCION_MAXIMA = 256
+
+cache_mapas_calor = CacheMemoria("mapas_calor", maxsize=256, ttl=300)
+
+# Protege las grillas cacheadas mientras se actualizan en el lugar o se serializan
+_lock_grillas = threading.Lock()
+
+
+def _columnas(caja):
+    """Arrays NumPy (lats, lons, categorias, fechas) de las publicaciones activas en la caja."""
+    lat_min, lon_min, lat_max, lon_max = caja
+
+    if indice_disponible():
+        ids, lats, lons, categorias, fechas = indice_geo.columnas()
+        # Las copias de array se leen sin volver a copiar
+        ids = np.frombuffer(ids, dtype=np.int64)
+        lats = np.frombuffer(lats, dtype=np.float64)
+        lons = np.frombuffer(lons, dtype=np.float64)
+        categorias = np.frombuffer(categorias, dtype=np.int64)
+        fechas = np.frombuffer(fechas, dtype=np.float64)
+        validos = ids != SLOT_LIBRE
+    else:
+        filas = (
+            db.session.query(
+                Publicacion.latitud, Publicacion.longitud,
+                Publicacion.id_categoria, Publicacion.fecha_creacion
+            )
+            .filter((Publicacion.estado == 0) | (Publicacion.estado.is_(None)))
+            .filter(func.point(Publicacion.longitud, Publicacion.latitud).op('<@')(
+                func.box(func.point(lon_min, lat_min), func.point(lon_max, lat_max))
+            ))
+            .all()
+        )
+        lats = np.fromiter((f.latitud for f in filas), dtype=np.float64, count=len(filas))
+        lons = np.fromiter((f.longitud for f in filas), dtype=np.float64, count=len(filas))
+        categorias = np.fromiter((f.id_categoria or SIN_CATEGORIA for f in filas), dtype=np.int64, count=len(filas))
+        fechas = np.fromiter((fecha_a_timestamp(f.fecha_creacion) or 0.0 for f in filas), dtype=np.float64, count=len(filas))
+        validos = np.ones(len(filas), dtype=bool)
+
+    dentro = validos & (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+    return lats[dentro], lons[dentro], categorias[dentro], fechas[dentro]
+
+
+def _celda(lat, lon, caja, resolucion):
+    """Fila y columna de la grilla para un punto (vale tanto para escalares como para arrays)."""
+    lat_min, lon_min, lat_max, lon_max = caja
+    fila = np.clip(((lat - lat_min) / (lat_max - lat_min) * resolucion).astype(np.int64), 0, resolucion - 1)
+    col = np.clip(((lon - lon_min) / (lon_max - lon_min) * resolucion).astype(np.int64), 0, resolucion - 1)
+    return fila, col
+
+
+def _construir(caja, resolucion, id_categoria, fecha_min, fecha_max, por_categoria):
+    lats, lons, categorias, fechas = _columnas(caja)
+
+    mascara = np.ones(len(lats), dtype=bool)
+    if id_categoria is not None:
+        mascara &= categorias == id_categoria
+    if fecha_min is not None:
+        mascara &= fechas >= fecha_min
+    if fecha_max is not None:
+        mascara &= fechas <= fecha_max
+    lats, lons, categorias = lats[mascara], lons[mascara], categorias[mascara]
+
+    if por_categoria:
+        capas = np.unique(categorias)
+        capa = np.searchsorted(capas, categorias)
+    else:
+        capas = np.array([SIN_CATEGORIA if id_categoria is None else id_categoria], dtype=np.int64)
+        capa = np.zeros(len(lats), dtype=np.int64)
+
+    fila, col = _celda(np.asarray(lats), np.asarray(lons), caja, resolucion)
+    plano = (capa * resolucion + fila) * resolucion + col
+    conteos = np.bincount(plano, minlength=len(capas) * resolucion * resolucion)
+    return {
+        "caja": caja,
+        "resolucion": resolucion,
+        "id_categoria": id_categoria,
+        "fecha_min": fecha_min,
+        "fecha_max": fecha_max,
+        "por_categoria": por_categoria,
+        "capas": capas.tolist(),
+        "conteos": conteos.reshape(len(capas), resolucion, resolucion).astype(np.int64),
+    }
+
+
+def _serializar_capa(conteo, caja, resolucion):
+    lat_min, lon_min, lat_max, lon_max = caja
+    filas, cols = np.nonzero(conteo)
+    alto = (lat_max - lat_min) / resolucion
+    ancho = (lon_max - lon_min) / resolucion
+    lat_centros = np.round(lat_min + (filas + 0.5) * alto, 6)
+    lon_centros = np.round(lon_min + (cols + 0.5) * ancho, 6)
+    cantidades = conteo[filas, cols]
+    return {
+        "total": int(conteo.sum()),
+        "maximo": int(cantidades.max()) if len(cantidades) else 0,
+        # [lat, lon, cantidad] del centro de cada celda con publicaciones
+        "celdas": [list(t) for t in zip(lat_centros.tolist(), lon_centros.tolist(), cantidades.tolist())],
+    }
+
+
+def _serializar(grilla):
+    caja, resolucion = grilla["caja"], grilla["resolucion"]
+    datos = {"caja": list(caja), "resolucion": resolucion}
+    if grilla["por_categoria"]:
+        datos["categorias"] = {
+            ("sin_categoria" if id_cat == SIN_CATEGORIA else str(id_cat)): _serializar_capa(conteo, caja, resolucion)
+            for id_cat, conteo in zip(grilla["capas"], grilla["conteos"])
+        }
+    else:
+        datos.update(_serializar_capa(grilla["conteos"][0], caja, resolucion))
+    return datos
+
+
+def obtener_mapa_calor(caja, resolucion=RESOLUCION_DEFAULT, id_categoria=None,
+                       fecha_min=None, fecha_max=None, por_categoria=False):
+    """
+    Devuelve (datos, desde_cache) con la grilla de densidad de la caja
+    (lat_min, lon_min, lat_max, lon_max). Lanza ValueError si los parámetros no son válidos.
+    """
+    lat_min, lon_min, lat_max, lon_max = (float(v) for v in caja)
+    if not (lat_min < lat_max and lon_min < lon_max):
+        raise ValueError("La caja debe cumplir min_lat < max_lat y min_lon < max_lon")
+    resolucion = int(resolucion)
+    if not 1 <= resolucion <= RESOLUCION_MAXIMA:
+        raise ValueError(f"La resolución debe estar entre 1 y {RESOLUCION_MAXIMA}")
+
+    caja = (lat_min, lon_min, lat_max, lon_max)
+    id_categoria = int(id_categoria) if id_categoria else None
+    fecha_min = fecha_a_timestamp(fecha_min)
+    fecha_max = fecha_a_timestamp(fecha_max)
+    clave = (caja, resolucion, id_categoria, fecha_min, fecha_max, bool(por_categoria))
+
+    grilla = cache_mapas_calor.obtener(clave)
+    desde_cache = grilla is not None
+    if grilla is None:
+        grilla = _construir(caja, resolucion, id_categoria, fecha_min, fecha_max, bool(por_categoria))
+        cache_mapas_calor.guardar(clave, grilla)
+
+    with _lock_grillas:
+        return _serializar(grilla), desde_cache
+
+
+def _aplicar(grilla, registro, delta):
+    """Suma `delta` en la celda del registro (lat, lon, id_categoria, fecha_ts). False si hay que rehacer la grilla."""
+    lat, lon, id_cat, fecha = registro
+    lat_min, lon_min, lat_max, lon_max = grilla["caja"]
+    if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+        return True
+    if grilla["id_categoria"] is not None and id_cat != grilla["id_categoria"]:
+        return True
+    if grilla["fecha_min"] is not None and fecha < grilla["fecha_min"]:
+        return True
+    if grilla["fecha_max"] is not None and fecha > grilla["fecha_max"]:
+        return True
+
+    capa = 0
+    if grilla["por_categoria"]:
+        if id_cat not in grilla["capas"]:
+            return False
+        capa = grilla["capas"].index(id_cat)
+
+    fila, col = _celda(np.float64(lat), np.float64(lon), grilla["caja"], grilla["resolucion"])
+    conteos = grilla["conteos"]
+    if conteos[capa, fila, col] + delta < 0:
+        return False
+    conteos[capa, fila, col] += delta
+    return True
+
+
+def actualizar_mapas_calor(previo, nuevo):
+    """
+    Actualiza en el lugar las grillas cacheadas con el cambio de una publicación.
+    `previo` y `nuevo` son registros del índice (lat, lon, id_categoria, fecha_ts) o None.
+    """
+    if previo == nuevo:
+        return
+    with _lock_grillas:
+        for clave, grilla in cache_mapas_calor.entradas():
+            consistente = True
+            if previo is not None:
+                consistente = _aplicar(grilla, previo, -1)
+            if consistente and nuevo is not None:
+                consistente = _aplicar(grilla, nuevo, +1)
+            if not consistente:
+                cache_mapas_calor.invalidar(clave)
+
+
+def invalidar_mapas_calor(posiciones):
+    """Alternativa sin índice cargado: descarta las grillas cuya caja contiene alguna posición."""
+    posiciones = [(lat, lon) for lat, lon in posiciones if lat is not None and lon is not None]
+
+    def contiene(clave):
+        lat_min, lon_min, lat_max, lon_max = clave[0]
+        return any(lat_min <= lat <= lat_max and lon_min <= lon <= lon_max for lat, lon in posiciones)
+
+    if posiciones:
+        cache_mapas_calor.invalidar_si(contiene)
@@ -1,22 +1,74 @@
+import click
 from auth.services import require_auth
-from flask import Blueprint, request, jsonify, g
+from core.auth_middleware import require_admin
+from flask import Blueprint, request, jsonify, g, current_app
 from components.publicaciones.services import (
     archivar_publicacion,
     desarchivar_publicacion,
     obtener_publicacion_por_id,
     obtener_publicaciones_filtradas,
+    obtener_publicaciones_cercanas,
+    buscar_publicaciones,
+    obtener_facetas,
+    reindexar_busqueda,
+    marcar_duplicados,
     obtener_todas_publicaciones,
     crear_publicacion,
     actualizar_publicacion,
     eliminar_publicacion,
     normalizar_texto,
     obtener_mis_publicaciones,
-    subir_imagen_a_cloudinary,
-    obtener_publicaciones_para_mapa # IMPORTANTE: Nueva función importada
+    obtener_publicaciones_para_mapa, # IMPORTANTE: Nueva función importada
+    decodificar_cursor,
+    version_publicacion,
+    proyectar_tarjetas,
+    obtener_publicaciones_por_ids,
+    obtener_publicacion_completa,
+    obtener_coincidencias,
+    obtener_publicaciones_con_imagenes_similares,
+    LIMITE_IMAGENES_SIMILARES,
+    LIMITE_COINCIDENCIAS,
+    CAMPOS_DETALLE,
+    LIMITE_BATCH
 )
+from components.publicaciones.serializador import leer_campos
+from components.publicaciones.indice_geo import indice_geo
+from components.imagenes.phash import DISTANCIA_SIMILAR, DISTANCIA_MAXIMA
+from components.imagenes.subida import subir_archivos
+from components.imagenes.services import registrar_subidas
+from components.publicaciones.cache_respuestas import (
+    clave_feed,
+    clave_filtrar,
+    obtener_respuesta,
+    guardar_respuesta,
+    generacion_actual,
+)
+from core.cache import caches
+from core.http_cache import etag_de, responder_con_etag, CACHE_CONTENIDO
+from components.publicaciones.teselas import obtener_tesela
+from components.publicaciones.mapa_calor import obtener_mapa_calor, RESOLUCION_DEFAULT
 
 publicaciones_bp = Blueprint("publicaciones", __name__)
 
+
+def _leer_cursor():
+    """
+    Lee el parámetro `cursor` del request.
+    Retorna None si no vino (modo offset para clientes viejos), '' para la primera
+    página en modo cursor, o el cursor recibido. Lanza ValueError si es inválido.
+    """
+    if 'cursor' not in request.args:
+        return None
+    cursor = request.args.get('cursor', '').strip()
+    if cursor:
+        decodificar_cursor(cursor)
+    return cursor
+
+
+def _leer_campos():
+    """Lee ?fields= (campos separados por coma). None si no vino; ValueError si es inválido."""
+    return leer_campos(request.args.get('fields'))
+
 # POST
 @publicaciones_bp.route("/publicaciones", methods=["POST"])
 @require_auth
@@ -29,68 +81,238 @@ def crear():
 # Obtener una publicación por ID
 @publicaciones_bp.route('/publicaciones/<int:id_publicacion>', methods=['GET'])
 def get_publicacion(id_publicacion):
-    publicacion = obtener_publicacion_por_id(id_publicacion)
-    if 'error' in publicacion:
-        return jsonify(publicacion), 404
-    return jsonify(publicacion), 200
+    try:
+        campos = _leer_campos() or CAMPOS_DETALLE
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    # El If-None-Match se resuelve con la versión, sin cargar ni serializar la publicación
+    version = version_publicacion(id_publicacion)
+    if version is None:
+        return jsonify({'error': 'Publicación no encontrada'}), 404
+    return responder_con_etag(
+        etag_de('publicacion', id_publicacion, campos, *version),
+        lambda: obtener_publicacion_por_id(id_publicacion, campos),
+        CACHE_CONTENIDO
+    )
+
+# Pantalla de una publicación en una sola llamada (detalle, autor, comentarios, QR)
+@publicaciones_bp.route('/publicaciones/<int:id_publicacion>/completa', methods=['GET'])
+def get_publicacion_completa(id_publicacion):
+    try:
+        datos = obtener_publicacion_completa(id_publicacion)
+    except Exception as error:
+        print(f"Error publicación completa: {error}")
+        return jsonify({'error': str(error)}), 500
+    if datos is None:
+        return jsonify({'error': 'Publicación no encontrada'}), 404
+    return jsonify(datos), 200
+
+# Posibles contrapartes de una publicación (perdido / encontrado)
+@publicaciones_bp.route('/publicaciones/<int:id_publicacion>/coincidencias', methods=['GET'])
+def get_coincidencias(id_publicacion):
+    try:
+        cantidad = min(int(request.args.get('cantidad', 10)), LIMITE_COINCIDENCIAS)
+    except ValueError:
+        return jsonify({'error': 'cantidad debe ser un entero'}), 400
+    try:
+        coincidencias = obtener_coincidencias(id_publicacion, cantidad)
+    except RuntimeError as error:
+        return jsonify({'error': str(error)}), 503
+    except Exception as error:
+        print(f"Error coincidencias: {error}")
+        return jsonify({'error': str(error)}), 500
+    if coincidencias is None:
+        return jsonify({'error': 'Publicación no encontrada'}), 404
+    return jsonify(coincidencias), 200
+
+# Publicaciones con fotos parecidas (hash perceptual)
+@publicaciones_bp.route('/publicaciones/<int:id_publicacion>/imagenes-similares', methods=['GET'])
+def get_imagenes_similares(id_publicacion):
+    try:
+        distancia = min(int(request.args.get('distancia', DISTANCIA_SIMILAR)), DISTANCIA_MAXIMA)
+        cantidad = min(int(request.args.get('cantidad', 20)), LIMITE_IMAGENES_SIMILARES)
+    except ValueError:
+        return jsonify({'error': 'distancia y cantidad deben ser enteros'}), 400
+    try:
+        publicaciones = obtener_publicaciones_con_imagenes_similares(id_publicacion, distancia, cantidad)
+    except RuntimeError as error:
+        return jsonify({'error': str(error)}), 503
+    except Exception as error:
+        print(f"Error imágenes similares: {error}")
+        return jsonify({'error': str(error)}), 500
+    if publicaciones is None:
+        return jsonify({'error': 'Publicación no encontrada'}), 404
+    return jsonify(publicaciones), 200
+
+# Varias publicaciones por id (notificaciones, solicitudes de contacto)
+@publicaciones_bp.route('/publicaciones/batch', methods=['GET'])
+def get_publicaciones_batch():
+    """
+    GET /publicaciones/batch?ids=1,2,3[&formato=tarjeta|detalle][&fields=...]
+    Devuelve las publicaciones en el orden pedido y los ids que no existen.
+    """
+    try:
+        # Sin repetidos y en el orden pedido
+        ids = list(dict.fromkeys(int(i) for i in request.args.get('ids', '').split(',') if i.strip()))
+    except ValueError:
+        return jsonify({'error': 'ids debe ser una lista de enteros separados por coma'}), 400
+    try:
+        campos = _leer_campos()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    formato = request.args.get('formato', 'tarjeta')
+    if formato not in ('tarjeta', 'detalle'):
+        return jsonify({'error': 'formato debe ser tarjeta o detalle'}), 400
+    if not ids:
+        return jsonify({'error': 'El parámetro ids es obligatorio'}), 400
+    if len(ids) > LIMITE_BATCH:
+        return jsonify({'error': f'Se pueden pedir hasta {LIMITE_BATCH} publicaciones'}), 400
+
+    try:
+        publicaciones, faltantes = obtener_publicaciones_por_ids(ids, formato, campos)
+    except Exception as error:
+        print(f"Error batch: {error}")
+        return jsonify({'error': str(error)}), 500
+    return jsonify({'publicaciones': publicaciones, 'faltantes': faltantes}), 200
 
 # Obtener todas las publicaciones para el home
 @publicaciones_bp.route('/publicaciones', methods=['GET'])
 def get_publicaciones():
+    try:
+        cursor = _leer_cursor()
+        campos = _leer_campos()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     page = int(request.args.get("page", 0))
     limit = int(request.args.get("limit", 12))
     offset = page * limit
-    publicacion = obtener_todas_publicaciones(offset=offset, limit=limit)
-    return jsonify(publicacion), 200
+    return _responder_cacheado(
+        clave_feed(page, limit, cursor), limit,
+        lambda: obtener_todas_publicaciones(offset=offset, limit=limit, cursor=cursor),
+        campos
+    )
+
+
+def _responder_cacheado(clave, limit, calcular, campos=None):
+    """
+    Responde desde la cache de respuestas si `clave` no es None; si no, calcula y guarda.
+    La cache guarda las tarjetas completas; ?fields= se aplica después.
+    """
+    if clave is None:
+        return jsonify(_proyectar(calcular(), campos)), 200
+
+    datos = obtener_respuesta(clave)
+    desde_cache = datos is not None
+    if datos is None:
+        generacion = generacion_actual()
+        datos = calcular()
+        guardar_respuesta(clave, datos, limit, generacion)
+
+    respuesta = jsonify(_proyectar(datos, campos))
+    respuesta.headers['X-Cache'] = 'HIT' if desde_cache else 'MISS'
+    return respuesta, 200
+
+
+def _proyectar(datos, campos):
+    return proyectar_tarjetas(datos, campos) if campos else datos
+
+def _leer_filtros():
+    """Lee del request los filtros comunes de /publicaciones/filtrar y /publicaciones/buscar."""
+    lat = request.args.get('lat')
+    lon = request.args.get('lon')
+    radio = request.args.get('radio')
+
+    etiquetas = request.args.get('etiquetas')
+    etiquetas_lista = []
+    if etiquetas:
+        # El service ya hace la limpieza interna
+        etiquetas_lista = etiquetas.lower().split(",")
+
+    return {
+        "lat": float(lat) if lat else None,
+        "lon": float(lon) if lon else None,
+        "radio_km": float(radio) if radio else None,
+        "id_categoria": request.args.get('id_categoria'),
+        "etiquetas": etiquetas_lista,
+        "fecha_min": request.args.get('fecha_min'),
+        "fecha_max": request.args.get('fecha_max'),
+        "id_usuario": request.args.get('id_usuario'),
+    }
 
 # FILTRAR
 @publicaciones_bp.route('/publicaciones/filtrar', methods=['GET'])
 def get_publicaciones_filtradas():
     """Endpoint optimizado para filtros."""
     try:
-        lat = request.args.get('lat')
-        lon = request.args.get('lon')
-        radio = request.args.get('radio')
-
-        lat = float(lat) if lat else None
-        lon = float(lon) if lon else None
-        radio = float(radio) if radio else None
-
-        id_categoria = request.args.get('id_categoria') 
-        etiquetas = request.args.get('etiquetas')
-        fecha_min = request.args.get('fecha_min')
-        fecha_max = request.args.get('fecha_max')
-        id_usuario = request.args.get('id_usuario')
+        filtros = _leer_filtros()
 
         page = int(request.args.get("page", 0))
         limit = int(request.args.get("limit", 12))
         offset = page * limit
-        
-        etiquetas_lista = []
-        if etiquetas:
-            etiquetas_raw = etiquetas.lower().split(",")
-            # Normalizamos aquí para pasarlo limpio al service
-            etiquetas_lista = etiquetas_raw # El service ya hace la limpieza interna
-
-        publicaciones = obtener_publicaciones_filtradas(
-            lat=lat,
-            lon=lon,
-            radio_km=radio,
-            id_categoria=id_categoria,
-            etiquetas=etiquetas_lista,
-            fecha_min=fecha_min,
-            fecha_max=fecha_max,
-            id_usuario=id_usuario,
-            offset=offset,
-            limit=limit
-        )
+        cursor = _leer_cursor()
+        campos = _leer_campos()
 
-        return jsonify(publicaciones), 200
+        # Modo "más cercanas": ?nearest=N o ?sort=distance (paginado con page/limit)
+        nearest = request.args.get('nearest')
+        if nearest or request.args.get('sort') == 'distance':
+            if filtros['lat'] is None or filtros['lon'] is None:
+                return jsonify({'error': 'lat y lon son obligatorios para ordenar por distancia'}), 400
+            if cursor is not None:
+                return jsonify({'error': 'El orden por distancia no admite cursor, usar page'}), 400
+            publicaciones = obtener_publicaciones_cercanas(
+                cantidad=int(nearest) if nearest else limit,
+                offset=0 if nearest else offset,
+                **filtros
+            )
+            return jsonify(_proyectar(publicaciones, campos)), 200
+
+        return _responder_cacheado(
+            clave_filtrar(filtros, page, limit, cursor), limit,
+            lambda: obtener_publicaciones_filtradas(offset=offset, limit=limit, cursor=cursor, **filtros),
+            campos
+        )
 
     except Exception as error:
         print(f"Error filtrar: {error}")
         return jsonify({'error': str(error)}), 400
 
+# BUSCAR (texto en título y descripción, combinable con los filtros)
+@publicaciones_bp.route('/publicaciones/buscar', methods=['GET'])
+def get_publicaciones_buscadas():
+    try:
+        q = request.args.get('q', '').strip()
+        if not q:
+            return jsonify({'error': 'El parámetro q es obligatorio'}), 400
+
+        filtros = _leer_filtros()
+        campos = _leer_campos()
+        page = int(request.args.get("page", 0))
+        limit = int(request.args.get("limit", 12))
+
+        publicaciones = buscar_publicaciones(q, offset=page * limit, limit=limit, **filtros)
+        return jsonify(_proyectar(publicaciones, campos)), 200
+
+    except Exception as error:
+        print(f"Error buscar: {error}")
+        return jsonify({'error': str(error)}), 400
+
+
+# FACETAS: cantidades por categoría, etiqueta y localidad para los filtros actuales
+@publicaciones_bp.route('/publicaciones/facetas', methods=['GET'])
+def get_facetas():
+    try:
+        datos, desde_cache = obtener_facetas(**_leer_filtros())
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    except Exception as error:
+        print(f"Error facetas: {error}")
+        return jsonify({'error': str(error)}), 500
+
+    respuesta = jsonify(datos)
+    respuesta.headers['X-Cache'] = 'HIT' if desde_cache else 'MISS'
+    return respuesta, 200
+
 
 # PATCH
 @publicaciones_bp.route('/publicaciones/<int:id_publicacion>', methods=['PATCH'])
@@ -112,29 +334,35 @@ def borrar_publicacion(id_publicacion):
         return jsonify({'error': str(error)}), 400
 
 @publicaciones_bp.route('/subir-imagenes', methods=['POST'])
+@require_auth
 def subir_imagenes():
     if 'imagenes' not in request.files:
         return jsonify({"error": "No se encontraron imágenes"}), 400
 
     archivos = request.files.getlist('imagenes')
-    urls = []
+    id_usuario = g.usuario_actual.id
+    resultados, tiempos = subir_archivos(archivos, current_app.config['CLOUDINARY_UPLOAD_PRESET'], id_usuario)
+    registrar_subidas(resultados, id_usuario)
+    urls = [r["url"] for r in resultados if r["url"]]
+    respuesta = {"urls": urls, "resultados": resultados, "tiempos_ms": tiempos}
 
-    for archivo in archivos:
-        url = subir_imagen_a_cloudinary(archivo)
-        if url:
-            urls.append(url)
-        else:
-            return jsonify({"error": "Error al subir una imagen"}), 500
-
-    return jsonify({"urls": urls}), 200
+    if not urls:
+        respuesta["error"] = "Error al subir las imágenes"
+        return jsonify(respuesta), 500
+    # 207: se subieron algunas; "resultados" dice qué pasó con cada archivo
+    return jsonify(respuesta), 200 if len(urls) == len(resultados) else 207
 
 # Obtener mis publicaciones
 @publicaciones_bp.route("/publicaciones/mis-publicaciones", methods=["GET"])
 @require_auth
 def publicaciones_usuario_actual():
+    try:
+        campos = _leer_campos()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     usuario = g.usuario_actual
     publicaciones = obtener_mis_publicaciones(usuario.id)
-    return jsonify(publicaciones), 200
+    return jsonify(_proyectar(publicaciones, campos)), 200
 
 # Mapa interactivo (OPTIMIZADO)
 @publicaciones_bp.route('/publicaciones/mapa', methods=['GET'])
@@ -160,6 +388,59 @@ def get_publicaciones_mapa():
         print(f"Error Mapa: {error}")
         return jsonify({'error': str(error)}), 400
     
+# Mapa por teselas: clusters en zoom bajo, marcadores en zoom alto
+@publicaciones_bp.route('/publicaciones/mapa/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_tesela_mapa(z, x, y):
+    try:
+        datos, desde_cache = obtener_tesela(z, x, y, request.args.get('id_categoria'))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    except Exception as error:
+        print(f"Error Tesela: {error}")
+        return jsonify({'error': str(error)}), 500
+
+    respuesta = jsonify(datos)
+    respuesta.headers['X-Cache'] = 'HIT' if desde_cache else 'MISS'
+    return respuesta, 200
+
+# Mapa de calor (densidad) para una caja
+@publicaciones_bp.route('/publicaciones/heatmap', methods=['GET'])
+def get_mapa_calor():
+    try:
+        caja = [request.args.get(p) for p in ('min_lat', 'min_lon', 'max_lat', 'max_lon')]
+        if not all(caja):
+            return jsonify({'error': 'Faltan min_lat, min_lon, max_lat o max_lon'}), 400
+
+        datos, desde_cache = obtener_mapa_calor(
+            caja,
+            resolucion=request.args.get('resolucion', RESOLUCION_DEFAULT),
+            id_categoria=request.args.get('id_categoria'),
+            fecha_min=request.args.get('fecha_min'),
+            fecha_max=request.args.get('fecha_max'),
+            por_categoria=request.args.get('por_categoria', 'false').lower() == 'true'
+        )
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    except Exception as error:
+        print(f"Error Heatmap: {error}")
+        return jsonify({'error': str(error)}), 500
+
+    respuesta = jsonify(datos)
+    respuesta.headers['X-Cache'] = 'HIT' if desde_cache else 'MISS'
+    return respuesta, 200
+
+# Estado del índice geográfico en memoria de este worker
+@publicaciones_bp.route('/publicaciones/indice-geo', methods=['GET'])
+@require_admin
+def get_estado_indice_geo():
+    return jsonify(indice_geo.estadisticas()), 200
+
+# Hits/misses de las caches en memoria de este worker
+@publicaciones_bp.route('/publicaciones/caches', methods=['GET'])
+@require_admin
+def get_estado_caches():
+    return jsonify({nombre: cache.estadisticas() for nombre, cache in caches.items()}), 200
+
 @publicaciones_bp.route('/publicaciones/<int:id_publicacion>/archivar', methods=['PATCH'])
 def archivar(id_publicacion):
     try:
@@ -172,4 +453,21 @@ def desarchivar(id_publicacion):
     try:
         return desarchivar_publicacion(id_publicacion)
     except Exception as error:
-        return jsonify({'error': str(error)}), 400
\ No newline at end of file
+        return jsonify({'error': str(error)}), 400
+
+# CLI: flask publicaciones reindexar-busqueda
+@publicaciones_bp.cli.command('reindexar-busqueda')
+@click.option('--lote', default=1000, show_default=True, help='Publicaciones por UPDATE/commit.')
+def reindexar_busqueda_cli(lote):
+    """Recalcula el texto y el tsvector de búsqueda de todas las publicaciones."""
+    procesadas = reindexar_busqueda(tamanio_lote=lote)
+    click.echo(f"Índice de búsqueda reconstruido: {procesadas} publicaciones.")
+
+
+# CLI: flask publicaciones marcar-duplicados
+@publicaciones_bp.cli.command('marcar-duplicados')
+@click.option('--lote', default=1000, show_default=True, help='Publicaciones por UPDATE/commit.')
+def marcar_duplicados_cli(lote):
+    """Recalcula la marca de casi duplicado (id_duplicado_de) de todas las publicaciones."""
+    procesadas, marcadas = marcar_duplicados(tamanio_lote=lote)
+    click.echo(f"Duplicados recalculados: {marcadas} de {procesadas} publicaciones marcadas.")
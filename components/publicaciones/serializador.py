@@ -0,0 +1,108 @@
+"""
+Serializador compartido de publicaciones con campos a pedido (?fields=).
+
+Cada campo declara qué columnas de Publicacion y qué relaciones necesita, así
+la query carga solo eso (load_only + selectinload con load_only en la relación)
+y la respuesta trae solo lo que el cliente va a mostrar.
+
+Los campos y sus formatos son los mismos en todos los endpoints; cada endpoint
+define cuáles permite (por ejemplo "usuario", con el email, solo en admin).
+Sin ?fields= los endpoints siguen devolviendo su formato de siempre.
+"""
+import pytz
+from sqlalchemy.orm import load_only, selectinload
+
+from core.models import Publicacion, Imagen, Categoria, Etiqueta, Localidad, Usuario
+from components.imagenes.variantes import variante_de
+
+zona_arg = pytz.timezone("America/Argentina/Buenos_Aires")
+
+
+def _fecha(valor):
+    return valor.astimezone(zona_arg).isoformat() if valor else None
+
+
+# Columnas que hay que cargar de cada relación
+_COLUMNAS_RELACION = {
+    "imagenes": (Imagen.id, Imagen.id_publicacion, Imagen.url, Imagen.url_tarjeta, Imagen.placeholder),
+    "etiquetas": (Etiqueta.id, Etiqueta.nombre),
+    "categoria_obj": (Categoria.id, Categoria.nombre),
+    "localidad": (Localidad.id, Localidad.nombre),
+    "usuario": (Usuario.id, Usuario.nombre, Usuario.email),
+}
+
+
+def _campo(columnas, valor, relaciones=()):
+    return {"columnas": columnas, "relaciones": relaciones, "valor": valor}
+
+
+CAMPOS = {
+    "id": _campo(("id",), lambda p: p.id),
+    "id_usuario": _campo(("id_usuario",), lambda p: p.id_usuario),
+    "id_locacion": _campo(("id_locacion",), lambda p: p.id_locacion),
+    "titulo": _campo(("titulo",), lambda p: p.titulo),
+    "descripcion": _campo(("descripcion",), lambda p: p.descripcion),
+    "fecha_creacion": _campo(("fecha_creacion",), lambda p: _fecha(p.fecha_creacion)),
+    "fecha_modificacion": _campo(("fecha_modificacion",), lambda p: _fecha(p.fecha_modificacion)),
+    "coordenadas": _campo(("coordenadas",), lambda p: p.coordenadas),
+    "estado": _campo(("estado",), lambda p: p.estado),
+    "id_duplicado_de": _campo(("id_duplicado_de",), lambda p: p.id_duplicado_de),
+    "categoria": _campo(
+        ("id_categoria",),
+        lambda p: {"id": p.categoria_obj.id, "nombre": p.categoria_obj.nombre} if p.categoria_obj else None,
+        ("categoria_obj",)
+    ),
+    "localidad": _campo(("id_locacion",), lambda p: p.localidad.nombre if p.localidad else None, ("localidad",)),
+    "etiquetas": _campo((), lambda p: [et.nombre for et in p.etiquetas], ("etiquetas",)),
+    "imagenes": _campo((), lambda p: [img.url for img in p.imagenes], ("imagenes",)),
+    "imagen_principal": _campo(
+        (), lambda p: variante_de(p.imagenes[0], "tarjeta") if p.imagenes else None, ("imagenes",)
+    ),
+    "imagen_placeholder": _campo((), lambda p: p.imagenes[0].placeholder if p.imagenes else None, ("imagenes",)),
+    "usuario": _campo(
+        ("id_usuario",),
+        lambda p: {"id": p.usuario.id, "nombre": p.usuario.nombre, "email": p.usuario.email} if p.usuario else None,
+        ("usuario",)
+    ),
+}
+
+# Campos que puede pedir cualquier cliente (todos menos los datos del autor)
+CAMPOS_PUBLICOS = frozenset(CAMPOS) - {"usuario"}
+CAMPOS_ADMIN = frozenset(CAMPOS)
+
+
+def leer_campos(parametro, permitidos=CAMPOS_PUBLICOS):
+    """
+    Convierte ?fields=a,b,c en una tupla de campos (en el orden pedido).
+    Devuelve None si no vino. Lanza ValueError si hay campos desconocidos.
+    """
+    if parametro is None:
+        return None
+    campos = tuple(dict.fromkeys(c.strip() for c in parametro.split(",") if c.strip()))
+    desconocidos = [c for c in campos if c not in permitidos]
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos en fields: {', '.join(desconocidos)}")
+    if not campos:
+        raise ValueError("fields no puede estar vacío")
+    return campos
+
+
+def opciones_carga(campos):
+    """Opciones de carga de SQLAlchemy para serializar solo `campos`."""
+    columnas = {"id"}
+    relaciones = set()
+    for nombre in campos:
+        columnas.update(CAMPOS[nombre]["columnas"])
+        relaciones.update(CAMPOS[nombre]["relaciones"])
+
+    opciones = [load_only(*(getattr(Publicacion, columna) for columna in sorted(columnas)))]
+    for relacion in sorted(relaciones):
+        opciones.append(
+            selectinload(getattr(Publicacion, relacion)).load_only(*_COLUMNAS_RELACION[relacion])
+        )
+    return opciones
+
+
+def serializar(pub, campos):
+    """Dict con solo los `campos` pedidos de la publicación."""
+    return {nombre: CAMPOS[nombre]["valor"](pub) for nombre in campos}
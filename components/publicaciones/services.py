@@ -1,27 +1,72 @@
 import traceback
+import base64
+import json
 from flask import jsonify
-from components.comentarios.services import eliminar_comentario
-from components.imagenes.services import eliminar_imagen
+from components.comentarios.services import eliminar_comentario, serializar_comentario
+from components.notificaciones.services import notificar_zona, registrar_evento_zona, zona_por_lectura
+from components.imagenes.services import (
+    eliminar_imagen,
+    encolar_hash_imagenes,
+    imagenes_para_publicacion,
+    reemplazar_imagenes_publicacion,
+)
+from components.imagenes.phash import indice_phash, indice_phash_disponible, DISTANCIA_SIMILAR
+from components.imagenes.variantes import variante_de
+from components.imagenes.miniaturas import url_thumb
+from components.qr.services import generar_qr
+from components.publicaciones.indice_geo import (
+    indice_geo,
+    indice_disponible,
+    caja_alrededor,
+    sincronizar_publicacion,
+    fecha_a_timestamp,
+    timestamp_a_fecha,
+    SIN_CATEGORIA,
+)
+from components.publicaciones.coincidencias import (
+    indice_coincidencias,
+    indice_coincidencias_disponible,
+    sincronizar_coincidencias,
+    registro_de,
+    categorias_candidatas,
+)
+from components.publicaciones.duplicados import (
+    IndiceDuplicados,
+    indice_duplicados,
+    indice_duplicados_disponible,
+    sincronizar_duplicados,
+    firma_minhash,
+    original_de,
+)
+from components.publicaciones.teselas import invalidar_teselas
+from components.publicaciones.mapa_calor import actualizar_mapas_calor, invalidar_mapas_calor
+from components.publicaciones.tarjetas import leer_tarjetas, guardar_tarjetas, version_tarjeta
+from components.publicaciones.cache_respuestas import invalidar_respuestas
+from components.publicaciones.serializador import CAMPOS, opciones_carga, serializar
+from core.cache import CacheMemoria
+from core.tareas import encolar
+from core.http_cache import huella
 from core.models import Comentario, db, Publicacion, Imagen, Etiqueta, Usuario, Notificacion
+from core.models import Categoria, Localidad, PublicacionEtiqueta, Departamento
+from core.models import CONFIG_BUSQUEDA, normalizar_texto, texto_busqueda, tsvector_busqueda
 from datetime import datetime, timezone
 # Nuevos imports necesarios para la optimización SQL
-from sqlalchemy import func, cast, Float, desc
-from sqlalchemy.orm import joinedload
-import unicodedata
+from sqlalchemy import func, cast, Float, Text, desc, tuple_, literal, bindparam, distinct, select
+from sqlalchemy.dialects.postgresql import REGCONFIG, aggregate_order_by
+from sqlalchemy.orm import joinedload, selectinload
+import heapq
+from functools import lru_cache
 import requests
 
-from flask import current_app
-import cloudinary
-import cloudinary.uploader
-
 import pytz
 zona_arg = pytz.timezone("America/Argentina/Buenos_Aires")
 
 # --- NUEVO HELPER DE SERIALIZACIÓN ---
 def serializar_publicacion_lista(pub):
     """Convierte una publicación a dict optimizado para listas (Home/Filtros)."""
-    # Solo tomamos la primera imagen para la vista de lista
-    img_principal = pub.imagenes[0].url if pub.imagenes else None
+    # Solo tomamos la primera imagen para la vista de lista, en su variante de tarjeta
+    principal = pub.imagenes[0] if pub.imagenes else None
+    img_principal = variante_de(principal, "tarjeta") if principal else None
     
     cat_obj = None
     if pub.categoria_obj:
@@ -34,6 +79,7 @@ def serializar_publicacion_lista(pub):
         "categoria": cat_obj,
         "imagenes": [img_principal] if img_principal else [], # Mantenemos formato lista
         "imagen_principal": img_principal, # Extra útil
+        "imagen_placeholder": principal.placeholder if principal else None,
         "etiquetas": [et.nombre for et in pub.etiquetas],
         "fecha_creacion": pub.fecha_creacion.astimezone(zona_arg).isoformat() if pub.fecha_creacion else None,
         "coordenadas": pub.coordenadas,
@@ -41,138 +87,708 @@ def serializar_publicacion_lista(pub):
         # No enviamos descripción completa para ahorrar datos en listas
     }
 
+# Campos que trae la tarjeta de los listados (?fields= los proyecta sin ir a la base)
+CAMPOS_TARJETA = frozenset((
+    "id", "titulo", "localidad", "categoria", "imagenes", "imagen_principal",
+    "imagen_placeholder", "etiquetas", "fecha_creacion", "coordenadas", "estado",
+))
+
+# Campos del detalle cuando no se pide ?fields=
+CAMPOS_DETALLE = (
+    "id", "id_usuario", "id_locacion", "titulo", "descripcion", "categoria",
+    "etiquetas", "fecha_creacion", "fecha_modificacion", "coordenadas", "imagenes",
+)
+
+
+def proyectar_tarjetas(datos, campos):
+    """
+    Deja en cada tarjeta de un listado (lista o {"publicaciones", "next_cursor"})
+    solo los `campos` pedidos. Los que no están en la tarjeta (descripcion,
+    fecha_modificacion, ...) se cargan en una sola query con solo esas columnas.
+    Lo calculado para el request (distancia_km) se mantiene siempre.
+    """
+    if isinstance(datos, dict):
+        return dict(datos, publicaciones=proyectar_tarjetas(datos["publicaciones"], campos))
+
+    extras = [campo for campo in campos if campo not in CAMPOS_TARJETA]
+    completos = {}
+    if extras and datos:
+        publicaciones = (
+            db.session.query(Publicacion)
+            .options(*opciones_carga(extras))
+            .filter(Publicacion.id.in_([tarjeta["id"] for tarjeta in datos]))
+            .all()
+        )
+        completos = {pub.id: serializar(pub, extras) for pub in publicaciones}
+
+    proyectadas = []
+    for tarjeta in datos:
+        fila = {campo: tarjeta[campo] for campo in campos if campo in tarjeta}
+        fila.update(completos.get(tarjeta["id"], {}))
+        fila.update({clave: valor for clave, valor in tarjeta.items() if clave not in CAMPOS})
+        proyectadas.append(fila)
+    return proyectadas
+
+# --- PAGINACIÓN POR CURSOR (KEYSET) ---
+
+def codificar_cursor(fecha_creacion, id_publicacion):
+    """Genera un cursor opaco a partir de la última publicación de una página."""
+    crudo = json.dumps([fecha_creacion.isoformat(), id_publicacion])
+    return base64.urlsafe_b64encode(crudo.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha_creacion, id) a partir de un cursor. Lanza ValueError si es inválido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha_txt, id_publicacion = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(fecha_txt), int(id_publicacion)
+    except Exception as error:
+        raise ValueError("Cursor inválido") from error
+
+
+def _paginar_publicaciones(query, offset=0, limit=12, cursor=None):
+    """
+    Ordena y pagina una query de IDs de publicaciones (fase 1 del listado).
+
+    La query debe seleccionar solo (Publicacion.id, Publicacion.fecha_creacion):
+    así Postgres resuelve la página desde el índice, sin JOINs a colecciones.
+
+    - cursor=None: paginación clásica por offset (clientes viejos).
+    - cursor='' o un cursor válido: paginación keyset sobre (fecha_creacion, id),
+      que usa el índice ix_publicaciones_fecha_creacion_id y cuesta O(limit)
+      sin importar la profundidad.
+
+    Retorna (ids, next_cursor). next_cursor es None si no hay más páginas
+    o si se usó offset.
+    """
+    orden = (Publicacion.fecha_creacion.desc(), Publicacion.id.desc())
+
+    if cursor is None:
+        filas = query.order_by(*orden).offset(offset).limit(limit).all()
+        return [fila.id for fila in filas], None
+
+    # Las publicaciones sin fecha no pueden ubicarse en el cursor
+    query = query.filter(Publicacion.fecha_creacion.isnot(None))
+    if cursor:
+        fecha, id_publicacion = decodificar_cursor(cursor)
+        query = query.filter(
+            tuple_(Publicacion.fecha_creacion, Publicacion.id) < tuple_(fecha, id_publicacion)
+        )
+
+    # Pedimos una de más para saber si existe una página siguiente
+    filas = query.order_by(*orden).limit(limit + 1).all()
+    next_cursor = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        ultima = filas[-1]
+        next_cursor = codificar_cursor(ultima.fecha_creacion, ultima.id)
+    return [fila.id for fila in filas], next_cursor
+
+
+def _paginar_en_memoria(candidatos, offset=0, limit=12, cursor=None):
+    """
+    Igual que _paginar_publicaciones pero sobre candidatos ya resueltos en
+    memoria por el índice geográfico: tuplas (id, fecha_ts, ...).
+    Mismo orden (fecha_creacion desc, id desc) y mismo formato de cursor.
+    """
+    def clave(candidato):
+        return candidato[1], candidato[0]
+
+    if cursor is None:
+        pagina = heapq.nlargest(offset + limit, candidatos, key=clave)[offset:]
+        return [c[0] for c in pagina], None
+
+    if cursor:
+        fecha, id_publicacion = decodificar_cursor(cursor)
+        limite = (fecha_a_timestamp(fecha), id_publicacion)
+        candidatos = [c for c in candidatos if clave(c) < limite]
+
+    pagina = heapq.nlargest(limit + 1, candidatos, key=clave)
+    next_cursor = None
+    if len(pagina) > limit:
+        pagina = pagina[:limit]
+        ultima = pagina[-1]
+        next_cursor = codificar_cursor(timestamp_a_fecha(ultima[1]), ultima[0])
+    return [c[0] for c in pagina], next_cursor
+
+
+def _hidratar_publicaciones(ids):
+    """
+    Fase 2 del listado: carga las publicaciones de la página y sus relaciones.
+
+    Cada relación (imágenes, etiquetas, categoría, localidad) se trae con un
+    SELECT ... WHERE ... IN (ids) aparte y SQLAlchemy las une en Python, así las
+    filas transferidas crecen con la cantidad de publicaciones y no con
+    publicaciones × imágenes × etiquetas como pasaba con joinedload.
+    Respeta el orden de `ids`.
+    """
+    if not ids:
+        return []
+
+    publicaciones = (
+        db.session.query(Publicacion)
+        .options(
+            selectinload(Publicacion.imagenes),
+            selectinload(Publicacion.etiquetas),
+            selectinload(Publicacion.categoria_obj),
+            selectinload(Publicacion.localidad)
+        )
+        .filter(Publicacion.id.in_(ids))
+        .all()
+    )
+    por_id = {pub.id: pub for pub in publicaciones}
+    return [por_id[id_pub] for id_pub in ids if id_pub in por_id]
+
+
+def _tarjetas(ids):
+    """
+    Fase 2 del listado con tarjetas pre-renderizadas: lee de tarjetas_publicacion
+    las de la página y solo hidrata y serializa las que falten (que quedan
+    guardadas para la próxima). Respeta el orden de `ids`.
+    """
+    tarjetas = leer_tarjetas(ids)
+    faltantes = [id_pub for id_pub in ids if id_pub not in tarjetas]
+    if faltantes:
+        publicaciones = _hidratar_publicaciones(faltantes)
+        nuevas = {pub.id: serializar_publicacion_lista(pub) for pub in publicaciones}
+        tarjetas.update(nuevas)
+        try:
+            guardar_tarjetas(nuevas, {pub.id: version_tarjeta(pub) for pub in publicaciones})
+            db.session.commit()
+        except Exception as error:
+            # Sin tarjeta guardada igual se responde; se vuelve a intentar en la próxima lectura
+            db.session.rollback()
+            print(f"Error guardando tarjetas: {error}")
+    return [tarjetas[id_pub] for id_pub in ids if id_pub in tarjetas]
+
+
+# Publicaciones por upsert cuando se reconstruyen tarjetas en bloque
+LOTE_TARJETAS = 500
+
+
+def _reconstruir_tarjetas(ids):
+    """Vuelve a armar y guarda las tarjetas de esas publicaciones (después de escribirlas)."""
+    publicaciones = _hidratar_publicaciones(ids)
+    guardar_tarjetas(
+        {pub.id: serializar_publicacion_lista(pub) for pub in publicaciones},
+        {pub.id: version_tarjeta(pub) for pub in publicaciones}
+    )
+    db.session.commit()
+
+
+def _respuesta_paginada(tarjetas, next_cursor, cursor):
+    """Mantiene el formato lista para offset y agrega next_cursor en modo cursor."""
+    if cursor is None:
+        return tarjetas
+    return {"publicaciones": tarjetas, "next_cursor": next_cursor}
+
+
+def _query_ids_activas():
+    """Query base de la fase 1: solo id y fecha de las publicaciones activas."""
+    return db.session.query(Publicacion.id, Publicacion.fecha_creacion).filter(
+        (Publicacion.estado == 0) | (Publicacion.estado.is_(None))
+    )
+
+
+def _aplicar_filtros(
+        query, lat=None, lon=None, radio_km=None,
+        id_categoria=None, etiquetas=None,
+        fecha_min=None, fecha_max=None, id_usuario=None
+    ):
+    """Aplica los filtros de /publicaciones/filtrar a una query sobre Publicacion."""
+    # Filtros básicos
+    if id_categoria:
+        query = query.filter(Publicacion.id_categoria == id_categoria)
+    if id_usuario:
+        query = query.filter(Publicacion.id_usuario == id_usuario)
+    if fecha_min:
+        dt = datetime.strptime(fecha_min, '%Y-%m-%d')
+        query = query.filter(Publicacion.fecha_creacion >= dt)
+    if fecha_max:
+        dt = datetime.strptime(fecha_max, '%Y-%m-%d')
+        query = query.filter(Publicacion.fecha_creacion <= dt)
+
+    # Filtro Etiquetas
+    # Usamos EXISTS en lugar de JOIN para no duplicar filas cuando coinciden
+    # varias etiquetas (rompería el LIMIT y el cursor).
+    if etiquetas:
+        etiquetas_norm = [normalizar_texto(e) for e in etiquetas if e.strip()]
+        if etiquetas_norm:
+            query = query.filter(Publicacion.etiquetas.any(
+                func.lower(Etiqueta.nombre).in_(etiquetas_norm)
+            ))
+
+    # Filtro geoespacial
+    if lat is not None and lon is not None and radio_km is not None:
+        query = _filtrar_por_radio(query, lat, lon, radio_km)
+
+    return query
+
+# --- FILTRO GEOESPACIAL ---
+
+RADIO_TIERRA_KM = 6371
+
+
+def _distancia_km_sql(lat, lon):
+    """Expresión SQL con la distancia (km, círculo máximo) desde (lat, lon) a cada publicación."""
+    return RADIO_TIERRA_KM * func.acos(
+        func.least(1.0, func.greatest(-1.0,
+            func.sin(func.radians(lat)) * func.sin(func.radians(Publicacion.latitud)) +
+            func.cos(func.radians(lat)) * func.cos(func.radians(Publicacion.latitud)) *
+            func.cos(func.radians(Publicacion.longitud) - func.radians(lon))
+        ))
+    )
+
+
+def _filtrar_por_radio(query, lat, lon, radio_km):
+    """
+    Filtra por radio en dos pasos: primero la caja que contiene el círculo
+    (resuelta por el índice GiST ix_publicaciones_punto) y después la distancia
+    exacta, que solo se calcula sobre las filas que quedaron dentro de la caja.
+    """
+    lat_min, lon_min, lat_max, lon_max = caja_alrededor(lat, lon, radio_km)
+    punto = func.point(Publicacion.longitud, Publicacion.latitud)
+    caja = func.box(func.point(lon_min, lat_min), func.point(lon_max, lat_max))
+    return query.filter(punto.op('<@')(caja)).filter(_distancia_km_sql(lat, lon) <= radio_km)
+
 # --- FUNCIONES OPTIMIZADAS (LECTURA) ---
 
+# Más candidatos del índice que esto no se pasan a la base como IN (...): con
+# etiquetas o autor se usa directamente el filtro por caja sobre el índice GiST
+MAXIMO_CANDIDATOS_IN = 2000
+
+
 def obtener_publicaciones_filtradas(
         lat=None, lon=None, radio_km=None,
         id_categoria=None, etiquetas=None,
         fecha_min=None, fecha_max=None,
-        id_usuario=None, offset=0, limit=12
+        id_usuario=None, offset=0, limit=12, cursor=None
     ):
     """Obtiene publicaciones filtradas aplicando lógica en Base de Datos."""
     try:
-        query = db.session.query(Publicacion).filter(
-            (Publicacion.estado == 0) | (Publicacion.estado.is_(None))
-        )
+        hay_radio = lat is not None and lon is not None and radio_km is not None
 
-        # Filtros básicos
-        if id_categoria:
-            query = query.filter(Publicacion.id_categoria == id_categoria)
-        if id_usuario:
-            query = query.filter(Publicacion.id_usuario == id_usuario)
-        if fecha_min:
-            dt = datetime.strptime(fecha_min, '%Y-%m-%d')
-            query = query.filter(Publicacion.fecha_creacion >= dt)
-        if fecha_max:
-            dt = datetime.strptime(fecha_max, '%Y-%m-%d')
-            query = query.filter(Publicacion.fecha_creacion <= dt)
-
-        # Filtro Etiquetas
-        if etiquetas:
-            etiquetas_norm = [normalizar_texto(e) for e in etiquetas if e.strip()]
-            if etiquetas_norm:
-                query = query.join(Publicacion.etiquetas).filter(
-                    func.lower(Etiqueta.nombre).in_(etiquetas_norm)
-                )
+        candidatos = None
+        if hay_radio and indice_disponible():
+            # El índice en memoria resuelve radio, categoría y fechas sin tocar la base
+            candidatos = indice_geo.en_radio(
+                lat, lon, radio_km,
+                id_categoria=int(id_categoria) if id_categoria else None,
+                fecha_min=fecha_a_timestamp(fecha_min),
+                fecha_max=fecha_a_timestamp(fecha_max)
+            )
+            if (etiquetas or id_usuario) and len(candidatos) > MAXIMO_CANDIDATOS_IN:
+                candidatos = None
 
-        # --- CORRECCIÓN FILTRO GEOESPACIAL (ARRAY) ---
-        if lat is not None and lon is not None and radio_km is not None:
-            # Acceso directo al ARRAY(Float). Indices SQL empiezan en 1.
-            pub_lat = Publicacion.coordenadas[1]
-            pub_lon = Publicacion.coordenadas[2]
-
-            distancia = 6371 * func.acos(
-                func.least(1.0, func.greatest(-1.0, 
-                    func.sin(func.radians(lat)) * func.sin(func.radians(pub_lat)) +
-                    func.cos(func.radians(lat)) * func.cos(func.radians(pub_lat)) * func.cos(func.radians(pub_lon) - func.radians(lon))
-                ))
+        if candidatos is not None and not (etiquetas or id_usuario):
+            ids, next_cursor = _paginar_en_memoria(candidatos, offset, limit, cursor)
+        elif candidatos is not None:
+            # Etiquetas y autor solo están en la base: filtramos ahí entre los candidatos
+            query = _aplicar_filtros(
+                _query_ids_activas(), etiquetas=etiquetas, id_usuario=id_usuario
+            ).filter(Publicacion.id.in_([c[0] for c in candidatos]))
+            ids, next_cursor = _paginar_publicaciones(query, offset, limit, cursor)
+        else:
+            query = _aplicar_filtros(
+                _query_ids_activas(),
+                lat=lat, lon=lon, radio_km=radio_km,
+                id_categoria=id_categoria, etiquetas=etiquetas,
+                fecha_min=fecha_min, fecha_max=fecha_max, id_usuario=id_usuario
             )
-            query = query.filter(distancia <= radio_km)
-        # ---------------------------------------------
+            ids, next_cursor = _paginar_publicaciones(query, offset, limit, cursor)
 
-        query = query.options(
-            joinedload(Publicacion.imagenes),
-            joinedload(Publicacion.localidad),
-            joinedload(Publicacion.categoria_obj),
-            joinedload(Publicacion.etiquetas)
-        )
+        return _respuesta_paginada(_tarjetas(ids), next_cursor, cursor)
 
-        query = query.order_by(Publicacion.fecha_creacion.desc())
-        query = query.offset(offset).limit(limit)
-        
-        publicaciones = query.all()
+    except Exception as e:
+        print(f"Error filtro: {e}")
+        traceback.print_exc()
+        return [] if cursor is None else {"publicaciones": [], "next_cursor": None}
+
+
+# --- MÁS CERCANAS (KNN) ---
+
+LIMITE_CERCANAS = 100
+# Hasta dónde se puede paginar: cada página ordena las offset + cantidad más cercanas
+OFFSET_MAXIMO_CERCANAS = 900
+
+
+def _cercanas_en_base(lat, lon, cantidad, radio_km=None, **filtros):
+    """
+    [(id, distancia_km)] de las `cantidad` publicaciones más cercanas usando la base.
+
+    1. El operador <-> sobre el índice GiST ix_publicaciones_punto devuelve las
+       `cantidad` más cercanas en grados (KNN del índice, sin ordenar toda la tabla).
+    2. La distancia real en km a la más lejana de esas acota el radio: seguro hay
+       `cantidad` publicaciones dentro, así que las verdaderas más cercanas también
+       lo están. Se filtra por ese radio (caja + GiST) y se ordena por distancia exacta.
+    """
+    punto = func.point(Publicacion.longitud, Publicacion.latitud)
+    base = _aplicar_filtros(
+        db.session.query(Publicacion.id),
+        lat=lat, lon=lon, radio_km=radio_km, **filtros
+    ).filter(
+        (Publicacion.estado == 0) | (Publicacion.estado.is_(None)),
+        Publicacion.latitud.isnot(None)
+    )
+
+    distancia = _distancia_km_sql(lat, lon)
+    vecinos = (
+        base.add_columns(distancia.label('distancia'))
+        .order_by(punto.op('<->')(func.point(lon, lat)))
+        .limit(cantidad)
+        .all()
+    )
+    if len(vecinos) < cantidad:
+        # No hay más que estas: alcanza con ordenarlas
+        return sorted(((f.id, f.distancia) for f in vecinos), key=lambda c: (c[1], c[0]))
+
+    radio_cota = max(f.distancia for f in vecinos)
+    filas = (
+        _filtrar_por_radio(base, lat, lon, radio_cota)
+        .add_columns(distancia.label('distancia'))
+        .order_by(distancia, Publicacion.id)
+        .limit(cantidad)
+        .all()
+    )
+    return [(f.id, f.distancia) for f in filas]
 
-        return [serializar_publicacion_lista(pub) for pub in publicaciones]
+
+def obtener_publicaciones_cercanas(
+        lat, lon, cantidad=12, offset=0, radio_km=None,
+        id_categoria=None, etiquetas=None,
+        fecha_min=None, fecha_max=None, id_usuario=None
+    ):
+    """
+    Publicaciones activas más cercanas a (lat, lon), ordenadas por distancia y
+    con `distancia_km` en cada una. Combina con los mismos filtros que
+    obtener_publicaciones_filtradas; `radio_km` es opcional y acota la distancia.
+    """
+    try:
+        cantidad = max(0, min(int(cantidad), LIMITE_CERCANAS))
+        offset = max(0, min(int(offset), OFFSET_MAXIMO_CERCANAS))
+        # La página pedida sale de las offset + cantidad más cercanas
+        total = offset + cantidad
+
+        if not etiquetas and not id_usuario and indice_disponible():
+            cercanas = [
+                (c[0], c[2]) for c in indice_geo.mas_cercanas(
+                    lat, lon, total, radio_km=radio_km,
+                    id_categoria=int(id_categoria) if id_categoria else None,
+                    fecha_min=fecha_a_timestamp(fecha_min),
+                    fecha_max=fecha_a_timestamp(fecha_max)
+                )
+            ]
+        else:
+            cercanas = _cercanas_en_base(
+                lat, lon, total, radio_km=radio_km,
+                id_categoria=id_categoria, etiquetas=etiquetas,
+                fecha_min=fecha_min, fecha_max=fecha_max, id_usuario=id_usuario
+            )
+
+        pagina = cercanas[offset:]
+        distancias = dict(pagina)
+        return [
+            dict(tarjeta, distancia_km=round(distancias[tarjeta["id"]], 3))
+            for tarjeta in _tarjetas([id_pub for id_pub, _ in pagina])
+        ]
 
     except Exception as e:
-        print(f"Error filtro: {e}")
+        print(f"Error cercanas: {e}")
         traceback.print_exc()
         return []
-    
-    
-def obtener_todas_publicaciones(offset=0, limit=12):
-    """Obtiene todas las publicaciones para el home (Optimizado)."""
+
+
+# --- BÚSQUEDA DE TEXTO ---
+
+# Cada cuántos días de antigüedad la relevancia de un resultado baja a la mitad
+DIAS_VIDA_MEDIA_BUSQUEDA = 30
+TAMANIO_LOTE_REINDEXADO = 1000
+
+
+def _factor_recencia():
+    """1 para lo recién publicado, 1/2 a los DIAS_VIDA_MEDIA_BUSQUEDA días, 1/4 al doble..."""
+    edad_segundos = cast(func.extract('epoch', func.now() - Publicacion.fecha_creacion), Float)
+    # Sin fecha (o con fecha futura) cuenta como recién publicada
+    edad_dias = func.greatest(func.coalesce(edad_segundos, 0.0), 0.0) / 86400.0
+    return func.power(0.5, edad_dias / float(DIAS_VIDA_MEDIA_BUSQUEDA))
+
+
+def buscar_publicaciones(
+        q, lat=None, lon=None, radio_km=None,
+        id_categoria=None, etiquetas=None,
+        fecha_min=None, fecha_max=None,
+        id_usuario=None, offset=0, limit=12
+    ):
+    """
+    Busca `q` en título y descripción, combinada con los filtros de
+    obtener_publicaciones_filtradas. Ordena por relevancia ponderada por recencia.
+
+    Usa el tsvector en español (índice GIN ix_publicaciones_busqueda). Si el texto
+    no aparece en ninguna publicación (por ejemplo por un error de tipeo) busca por
+    similitud de trigramas sobre texto_busqueda (ix_publicaciones_texto_busqueda_trgm).
+    """
     try:
-        publicaciones = (
-            db.session.query(Publicacion)
-            .options(
-                joinedload(Publicacion.imagenes),
-                joinedload(Publicacion.localidad),
-                joinedload(Publicacion.categoria_obj),
-                joinedload(Publicacion.etiquetas)
+        texto = normalizar_texto(q)
+        if not texto:
+            return []
+
+        base = _aplicar_filtros(
+            _query_ids_activas(),
+            lat=lat, lon=lon, radio_km=radio_km,
+            id_categoria=id_categoria, etiquetas=etiquetas,
+            fecha_min=fecha_min, fecha_max=fecha_max, id_usuario=id_usuario
+        )
+
+        consulta = func.websearch_to_tsquery(cast(CONFIG_BUSQUEDA, REGCONFIG), texto)
+        coincide = Publicacion.busqueda.op('@@')(consulta)
+        if db.session.query(base.filter(coincide).exists()).scalar():
+            query = base.filter(coincide)
+            relevancia = func.ts_rank_cd(Publicacion.busqueda, consulta)
+        else:
+            # word_similarity: qué tanto se parece `texto` a algún tramo del texto indexado
+            query = base.filter(literal(texto).op('<%')(Publicacion.texto_busqueda))
+            relevancia = func.word_similarity(texto, Publicacion.texto_busqueda)
+
+        filas = (
+            query.order_by(
+                desc(relevancia * _factor_recencia()),
+                Publicacion.fecha_creacion.desc(),
+                Publicacion.id.desc()
             )
-            .filter((Publicacion.estado == 0) | (Publicacion.estado.is_(None)))
-            .order_by(Publicacion.fecha_creacion.desc())
             .offset(offset)
             .limit(limit)
             .all()
         )
-        return [serializar_publicacion_lista(pub) for pub in publicaciones]
+        return _tarjetas([fila.id for fila in filas])
+
+    except Exception as e:
+        print(f"Error búsqueda: {e}")
+        traceback.print_exc()
+        return []
+
+
+def reindexar_busqueda(tamanio_lote=TAMANIO_LOTE_REINDEXADO):
+    """
+    Recalcula texto_busqueda y busqueda de todas las publicaciones, por lotes de
+    `tamanio_lote` (un UPDATE ejecutado en bloque y un commit por lote).
+    Devuelve la cantidad de publicaciones procesadas.
+    """
+    tabla = Publicacion.__table__
+    sentencia = (
+        tabla.update()
+        .where(tabla.c.id == bindparam('b_id'))
+        .values(
+            texto_busqueda=bindparam('b_texto'),
+            busqueda=tsvector_busqueda(bindparam('b_titulo'), bindparam('b_descripcion'))
+        )
+    )
+
+    procesadas = 0
+    ultimo_id = 0
+    while True:
+        filas = (
+            db.session.query(Publicacion.id, Publicacion.titulo, Publicacion.descripcion)
+            .filter(Publicacion.id > ultimo_id)
+            .order_by(Publicacion.id)
+            .limit(tamanio_lote)
+            .all()
+        )
+        if not filas:
+            break
+
+        parametros = []
+        for fila in filas:
+            parametros.append({
+                "b_id": fila.id,
+                "b_texto": texto_busqueda(fila.titulo, fila.descripcion),
+                "b_titulo": normalizar_texto(fila.titulo),
+                "b_descripcion": normalizar_texto(fila.descripcion),
+            })
+        db.session.execute(sentencia, parametros)
+        db.session.commit()
+
+        procesadas += len(filas)
+        ultimo_id = filas[-1].id
+
+    return procesadas
+
+
+# --- FACETAS ---
+
+# Cualquier escritura de publicaciones vacía esta cache (_propagar_cambio),
+# el TTL cubre lo que escriban los otros workers
+cache_facetas = CacheMemoria("facetas", maxsize=512, ttl=120)
+
+# Valor de GROUPING(id_categoria, id_etiqueta, id_locacion) para cada conjunto
+_GRUPO_CATEGORIA = 0b011
+_GRUPO_ETIQUETA = 0b101
+_GRUPO_LOCALIDAD = 0b110
+_GRUPO_TOTAL = 0b111
+
+
+def _clave_facetas(lat, lon, radio_km, id_categoria, etiquetas, fecha_min, fecha_max, id_usuario):
+    etiquetas_norm = tuple(sorted({normalizar_texto(e) for e in etiquetas or [] if e.strip()}))
+    return (
+        lat, lon, radio_km,
+        str(id_categoria) if id_categoria else None,
+        etiquetas_norm,
+        fecha_min or None, fecha_max or None,
+        str(id_usuario) if id_usuario else None,
+    )
+
+
+def _contar_facetas(**filtros):
+    """
+    Cuenta por categoría, etiqueta y localidad las publicaciones que cumplen los
+    filtros, en una sola consulta con GROUPING SETS sobre el conjunto filtrado.
+    """
+    filtradas = _aplicar_filtros(
+        db.session.query(Publicacion.id, Publicacion.id_categoria, Publicacion.id_locacion).filter(
+            (Publicacion.estado == 0) | (Publicacion.estado.is_(None))
+        ),
+        **filtros
+    ).subquery()
+
+    id_etiqueta = PublicacionEtiqueta.id_etiqueta
+    columnas = (filtradas.c.id_categoria, id_etiqueta, filtradas.c.id_locacion)
+    filas = (
+        db.session.query(
+            func.grouping(*columnas).label('grupo'),
+            *columnas,
+            # El join con etiquetas repite publicaciones: se cuentan ids distintos
+            func.count(distinct(filtradas.c.id)).label('cantidad')
+        )
+        .select_from(filtradas)
+        .outerjoin(PublicacionEtiqueta, PublicacionEtiqueta.id_publicacion == filtradas.c.id)
+        .group_by(func.grouping_sets(*columnas, tuple_()))
+        .all()
+    )
+
+    total = 0
+    conteos = {"categorias": {}, "etiquetas": {}, "localidades": {}}
+    for fila in filas:
+        if fila.grupo == _GRUPO_TOTAL:
+            total = fila.cantidad
+        elif fila.grupo == _GRUPO_CATEGORIA and fila.id_categoria is not None:
+            conteos["categorias"][fila.id_categoria] = fila.cantidad
+        elif fila.grupo == _GRUPO_ETIQUETA and fila.id_etiqueta is not None:
+            conteos["etiquetas"][fila.id_etiqueta] = fila.cantidad
+        elif fila.grupo == _GRUPO_LOCALIDAD and fila.id_locacion is not None:
+            conteos["localidades"][fila.id_locacion] = fila.cantidad
+    return total, conteos
+
+
+def _nombres(modelo, ids):
+    if not ids:
+        return {}
+    return dict(db.session.query(modelo.id, modelo.nombre).filter(modelo.id.in_(ids)).all())
+
+
+def obtener_facetas(
+        lat=None, lon=None, radio_km=None,
+        id_categoria=None, etiquetas=None,
+        fecha_min=None, fecha_max=None, id_usuario=None
+    ):
+    """
+    Devuelve (datos, desde_cache) con cuántas publicaciones hay por categoría,
+    etiqueta y localidad para los mismos filtros de obtener_publicaciones_filtradas.
+    """
+    filtros = dict(
+        lat=lat, lon=lon, radio_km=radio_km,
+        id_categoria=id_categoria, etiquetas=etiquetas,
+        fecha_min=fecha_min, fecha_max=fecha_max, id_usuario=id_usuario
+    )
+    clave = _clave_facetas(**filtros)
+    guardado = cache_facetas.obtener(clave)
+    if guardado is not None:
+        return guardado, True
+
+    total, conteos = _contar_facetas(**filtros)
+    nombres = {
+        "categorias": _nombres(Categoria, list(conteos["categorias"])),
+        "etiquetas": _nombres(Etiqueta, list(conteos["etiquetas"])),
+        "localidades": _nombres(Localidad, list(conteos["localidades"])),
+    }
+
+    datos = {"total": total}
+    for faceta, por_id in conteos.items():
+        datos[faceta] = [
+            {"id": id_valor, "nombre": nombres[faceta].get(id_valor), "cantidad": cantidad}
+            for id_valor, cantidad in sorted(por_id.items(), key=lambda item: (-item[1], item[0]))
+        ]
+
+    cache_facetas.guardar(clave, datos)
+    return datos, False
+
+
+def obtener_todas_publicaciones(offset=0, limit=12, cursor=None):
+    """Obtiene todas las publicaciones para el home (Optimizado)."""
+    try:
+        ids, next_cursor = _paginar_publicaciones(_query_ids_activas(), offset, limit, cursor)
+        return _respuesta_paginada(_tarjetas(ids), next_cursor, cursor)
     finally:
         # En Flask-SQLAlchemy la sesión suele manejarse sola, 
         # pero si prefieres cerrar explícitamente:
         pass 
 
+LIMITE_MAPA = 200
+
+
 def obtener_publicaciones_para_mapa(filtros):
     """Query optimizada para el mapa (versión Array corregida)."""
     try:
-        query = db.session.query(Publicacion).filter(
-            (Publicacion.estado == 0) | (Publicacion.estado.is_(None))
-        )
-
-        if filtros.get('id_categoria'):
-            query = query.filter(Publicacion.id_categoria == filtros['id_categoria'])
-        if filtros.get('id_usuario'):
-            query = query.filter(Publicacion.id_usuario == filtros['id_usuario'])
-
-        # --- CORRECCIÓN FILTRO GEOESPACIAL (ARRAY) ---
         lat = filtros.get('lat')
         lon = filtros.get('lon')
         radio = filtros.get('radio')
+        id_categoria = filtros.get('id_categoria')
 
-        if lat and lon and radio:
-            pub_lat = Publicacion.coordenadas[1]
-            pub_lon = Publicacion.coordenadas[2]
+        if not filtros.get('id_usuario') and indice_disponible():
+            # Candidatos desde el índice en memoria: la base solo hidrata los elegidos
+            id_cat = int(id_categoria) if id_categoria else None
+            if lat and lon and radio:
+                candidatos = indice_geo.en_radio(lat, lon, radio, id_categoria=id_cat)
+            else:
+                candidatos = indice_geo.todas(id_categoria=id_cat)
+            ids = [c[0] for c in heapq.nlargest(LIMITE_MAPA, candidatos, key=lambda c: (c[1], c[0]))]
 
-            distancia = 6371 * func.acos(
-                func.least(1.0, func.greatest(-1.0, 
-                    func.sin(func.radians(lat)) * func.sin(func.radians(pub_lat)) +
-                    func.cos(func.radians(lat)) * func.cos(func.radians(pub_lat)) * func.cos(func.radians(pub_lon) - func.radians(lon))
-                ))
+            por_id = {
+                pub.id: pub for pub in
+                db.session.query(Publicacion)
+                .options(
+                    selectinload(Publicacion.categoria_obj),
+                    selectinload(Publicacion.imagenes)
+                )
+                .filter(Publicacion.id.in_(ids))
+                .all()
+            } if ids else {}
+            resultados = [por_id[id_pub] for id_pub in ids if id_pub in por_id]
+        else:
+            query = db.session.query(Publicacion).filter(
+                (Publicacion.estado == 0) | (Publicacion.estado.is_(None))
             )
-            query = query.filter(distancia <= radio)
-        # ---------------------------------------------
 
-        query = query.options(
-            joinedload(Publicacion.categoria_obj),
-            joinedload(Publicacion.imagenes) 
-        )
-        
-        resultados = query.limit(200).all()
+            if id_categoria:
+                query = query.filter(Publicacion.id_categoria == id_categoria)
+            if filtros.get('id_usuario'):
+                query = query.filter(Publicacion.id_usuario == filtros['id_usuario'])
+
+            # Filtro geoespacial
+            if lat and lon and radio:
+                query = _filtrar_por_radio(query, lat, lon, radio)
+
+            query = query.options(
+                joinedload(Publicacion.categoria_obj),
+                joinedload(Publicacion.imagenes) 
+            )
+            
+            resultados = query.limit(LIMITE_MAPA).all()
 
         mapa_data = []
         for pub in resultados:
-            img_principal = pub.imagenes[0].url if pub.imagenes else None
+            # Los marcadores muestran la miniatura
+            principal = pub.imagenes[0] if pub.imagenes else None
+            img_principal = variante_de(principal, "miniatura") if principal else None
             cat_obj = {"id": pub.categoria_obj.id, "nombre": pub.categoria_obj.nombre} if pub.categoria_obj else None
 
             mapa_data.append({
@@ -180,7 +796,11 @@ def obtener_publicaciones_para_mapa(filtros):
                 "titulo": pub.titulo,
                 "categoria": cat_obj,
                 "coordenadas": pub.coordenadas,
-                "imagen_principal": img_principal
+                "imagen_principal": img_principal,
+                "imagen_placeholder": principal.placeholder if principal else None,
+                # Miniatura servida y cacheada por la app (/imagenes/<id>/thumb)
+                "id_imagen_principal": principal.id if principal else None,
+                "url_thumb": url_thumb(principal)
             })
             
         return mapa_data
@@ -191,6 +811,270 @@ def obtener_publicaciones_para_mapa(filtros):
         return []
 
 
+def _propagar_cambio(id_publicacion, posiciones_previas=()):
+    """
+    Propaga una escritura ya commiteada a los índices y caches en memoria de este
+    worker y a su tarjeta pre-renderizada. `posiciones_previas` son las (lat, lon)
+    que tenía la publicación antes del cambio, para invalidar también las teselas
+    de donde se movió o se borró.
+    """
+    try:
+        posiciones = list(posiciones_previas)
+        previo = indice_geo.registro(id_publicacion)
+        if previo:
+            posiciones.append(previo[:2])
+
+        pub = db.session.get(Publicacion, id_publicacion)
+        if pub is not None:
+            posiciones.append((pub.latitud, pub.longitud))
+
+        sincronizar_publicacion(id_publicacion, pub)
+        sincronizar_coincidencias(id_publicacion, pub)
+        sincronizar_duplicados(id_publicacion, pub)
+        invalidar_teselas(posiciones)
+        cache_facetas.limpiar()
+
+        # Para ubicar la publicación en las páginas cacheadas del home y filtrar
+        fecha_ts = previo[3] if previo else (fecha_a_timestamp(pub.fecha_creacion) if pub else None)
+        categorias = None
+        if previo:
+            categorias = {previo[2], (pub.id_categoria or SIN_CATEGORIA) if pub else previo[2]}
+        invalidar_respuestas(id_publicacion, fecha_ts, categorias)
+
+        if indice_geo.cargado:
+            actualizar_mapas_calor(previo, indice_geo.registro(id_publicacion))
+        else:
+            invalidar_mapas_calor(posiciones)
+
+        # Si se borró, la tarjeta ya se fue con el ON DELETE CASCADE
+        if pub is not None:
+            _reconstruir_tarjetas([id_publicacion])
+    except Exception as error:
+        db.session.rollback()
+        print(f"Error propagando cambios de la publicación {id_publicacion}: {error}")
+
+
+def sincronizar_archivadas(filas):
+    """
+    Propaga el archivado masivo de la tarea nocturna.
+    `filas` trae id, latitud, longitud, id_categoria y fecha_creacion.
+    """
+    posiciones = [(fila.latitud, fila.longitud) for fila in filas]
+    for fila in filas:
+        previo = indice_geo.registro(fila.id)
+        indice_geo.quitar(fila.id)
+        indice_coincidencias.quitar(fila.id)
+        indice_duplicados.quitar(fila.id)
+        if previo:
+            actualizar_mapas_calor(previo, None)
+        invalidar_respuestas(
+            fila.id, fecha_a_timestamp(fila.fecha_creacion), {fila.id_categoria or SIN_CATEGORIA}
+        )
+    invalidar_teselas(posiciones)
+    cache_facetas.limpiar()
+    if not indice_geo.cargado:
+        invalidar_mapas_calor(posiciones)
+
+    ids = [fila.id for fila in filas]
+    try:
+        for inicio in range(0, len(ids), LOTE_TARJETAS):
+            _reconstruir_tarjetas(ids[inicio:inicio + LOTE_TARJETAS])
+    except Exception as error:
+        db.session.rollback()
+        print(f"Error reconstruyendo tarjetas de archivadas: {error}")
+
+
+# --- COINCIDENCIAS (PERDIDO / ENCONTRADO) ---
+
+LIMITE_COINCIDENCIAS = 50
+# Por debajo de este puntaje (0 a 1) no se muestra como coincidencia
+PUNTAJE_MINIMO_COINCIDENCIA = 0.3
+# Al crear una publicación se avisa a los autores de las que superan este puntaje
+PUNTAJE_NOTIFICACION = 0.7
+MAXIMO_NOTIFICACIONES_COINCIDENCIA = 3
+
+
+def _buscar_coincidencias(id_publicacion, cantidad, puntaje_minimo):
+    """[(id, puntaje, señales)] de las coincidencias, o None si la publicación no existe."""
+    if not indice_coincidencias_disponible():
+        raise RuntimeError("El índice de coincidencias no está disponible")
+
+    registro = indice_coincidencias.registro(id_publicacion)
+    if registro is None:
+        # Archivada (o todavía no indexada en este worker): se arma desde la base
+        pub = (
+            db.session.query(Publicacion)
+            .options(selectinload(Publicacion.etiquetas))
+            .filter(Publicacion.id == id_publicacion)
+            .first()
+        )
+        if pub is None:
+            return None
+        registro = registro_de(pub)
+
+    return indice_coincidencias.buscar(
+        registro, cantidad, categorias_candidatas(registro["categoria"]), puntaje_minimo
+    )
+
+
+def obtener_coincidencias(id_publicacion, cantidad=10):
+    """
+    Publicaciones que podrían ser la contraparte de esta (tarjetas con el puntaje
+    y cada señal en "coincidencia"), de mayor a menor puntaje. None si no existe.
+    """
+    coincidencias = _buscar_coincidencias(id_publicacion, cantidad, PUNTAJE_MINIMO_COINCIDENCIA)
+    if coincidencias is None:
+        return None
+
+    por_id = {id_pub: dict(senales, puntaje=puntaje) for id_pub, puntaje, senales in coincidencias}
+    return [
+        dict(tarjeta, coincidencia=por_id[tarjeta["id"]])
+        for tarjeta in _tarjetas([id_pub for id_pub, _, _ in coincidencias])
+    ]
+
+
+def notificar_coincidencias(id_publicacion):
+    """
+    Después de crear una publicación, avisa a su autor y a los de las mejores
+    coincidencias (si hay alguna con puntaje alto). Corre en segundo plano
+    (core.tareas): un error acá no afecta la creación.
+    """
+    try:
+        coincidencias = _buscar_coincidencias(
+            id_publicacion, MAXIMO_NOTIFICACIONES_COINCIDENCIA, PUNTAJE_NOTIFICACION
+        )
+        if not coincidencias:
+            return
+
+        ahora = datetime.now(timezone.utc)
+        ids = [id_pub for id_pub, _, _ in coincidencias]
+        autores = dict(
+            db.session.query(Publicacion.id, Publicacion.id_usuario).filter(Publicacion.id.in_(ids)).all()
+        )
+        pub = db.session.get(Publicacion, id_publicacion)
+
+        db.session.add(Notificacion(
+            id_usuario=pub.id_usuario,
+            id_publicacion=id_publicacion,
+            titulo="Posibles coincidencias",
+            descripcion=f"Encontramos {len(ids)} publicación(es) que podrían coincidir con '{pub.titulo}'.",
+            tipo="coincidencia",
+            fecha_creacion=ahora,
+            leido=False
+        ))
+        for id_pub in ids:
+            if id_pub not in autores:
+                continue
+            db.session.add(Notificacion(
+                id_usuario=autores[id_pub],
+                id_publicacion=id_publicacion,
+                id_referencia=id_pub,
+                titulo="Posible coincidencia",
+                descripcion=f"Una nueva publicación podría coincidir con la tuya: '{pub.titulo}'.",
+                tipo="coincidencia",
+                fecha_creacion=ahora,
+                leido=False
+            ))
+        db.session.commit()
+    except Exception as error:
+        db.session.rollback()
+        print(f"Error notificando coincidencias de la publicación {id_publicacion}: {error}")
+
+
+# --- DUPLICADOS ---
+
+# Campos de cada publicación en los grupos de duplicados para moderación
+CAMPOS_DUPLICADOS = ("id", "titulo", "id_usuario", "localidad", "fecha_creacion", "estado")
+
+
+def _original_duplicado(titulo, descripcion, id_usuario, id_locacion):
+    """Id de la publicación activa de la que esta sería casi un duplicado, o None."""
+    if not indice_duplicados_disponible():
+        return None
+    firma = firma_minhash(texto_busqueda(titulo, descripcion))
+    return original_de(indice_duplicados.similares(firma, id_usuario=id_usuario, id_locacion=id_locacion))
+
+
+def marcar_duplicados(tamanio_lote=TAMANIO_LOTE_REINDEXADO):
+    """
+    Recalcula id_duplicado_de de todas las publicaciones (también las archivadas)
+    en orden de creación: cada una se compara con las anteriores, como si se
+    hubieran creado de nuevo. Devuelve (procesadas, marcadas).
+    """
+    tabla = Publicacion.__table__
+    sentencia = tabla.update().where(tabla.c.id == bindparam('b_id')).values(id_duplicado_de=bindparam('b_original'))
+    indice = IndiceDuplicados()
+
+    procesadas = marcadas = 0
+    ultimo_id = 0
+    while True:
+        filas = (
+            db.session.query(Publicacion.id, Publicacion.titulo, Publicacion.descripcion,
+                             Publicacion.id_usuario, Publicacion.id_locacion)
+            .filter(Publicacion.id > ultimo_id)
+            .order_by(Publicacion.id)
+            .limit(tamanio_lote)
+            .all()
+        )
+        if not filas:
+            break
+
+        parametros = []
+        for fila in filas:
+            firma = firma_minhash(texto_busqueda(fila.titulo, fila.descripcion))
+            original = original_de(indice.similares(firma, id_usuario=fila.id_usuario, id_locacion=fila.id_locacion))
+            indice.agregar_o_actualizar(fila.id, firma, fila.id_usuario, fila.id_locacion, original)
+            parametros.append({"b_id": fila.id, "b_original": original})
+            marcadas += original is not None
+        db.session.execute(sentencia, parametros)
+        db.session.commit()
+
+        procesadas += len(filas)
+        ultimo_id = filas[-1].id
+
+    return procesadas, marcadas
+
+
+def obtener_grupos_duplicados(page=1, limit=20):
+    """
+    Grupos de casi duplicados para moderación: cada original con sus duplicados,
+    los grupos más grandes primero. Retorna (grupos, total_grupos).
+    """
+    cantidad = func.count(Publicacion.id)
+    base = db.session.query(Publicacion.id_duplicado_de).filter(Publicacion.id_duplicado_de.isnot(None))
+    total = base.distinct().count()
+    originales = [
+        fila.id_duplicado_de for fila in
+        base.add_columns(cantidad)
+        .group_by(Publicacion.id_duplicado_de)
+        .order_by(cantidad.desc(), Publicacion.id_duplicado_de.desc())
+        .offset((page - 1) * limit)
+        .limit(limit)
+        .all()
+    ]
+    if not originales:
+        return [], total
+
+    publicaciones = (
+        db.session.query(Publicacion)
+        .options(*opciones_carga(CAMPOS_DUPLICADOS + ("id_duplicado_de",)))
+        .filter((Publicacion.id.in_(originales)) | (Publicacion.id_duplicado_de.in_(originales)))
+        .order_by(Publicacion.id)
+        .all()
+    )
+    grupos = {id_original: {"original": None, "duplicados": []} for id_original in originales}
+    for pub in publicaciones:
+        datos = serializar(pub, CAMPOS_DUPLICADOS)
+        if pub.id in grupos:
+            grupos[pub.id]["original"] = datos
+        if pub.id_duplicado_de in grupos:
+            grupos[pub.id_duplicado_de]["duplicados"].append(datos)
+
+    return [
+        dict(grupos[id_original], id_original=id_original, cantidad=len(grupos[id_original]["duplicados"]))
+        for id_original in originales
+    ], total
+
 
 def crear_publicacion(data, usuario):
     try:
@@ -215,9 +1099,7 @@ def crear_publicacion(data, usuario):
         db.session.add(nueva_publicacion)
         db.session.flush()
 
-        for url in imagenes:
-            nueva_imagen = Imagen(id_publicacion=nueva_publicacion.id, url=url)
-            db.session.add(nueva_imagen)
+        nuevas_imagenes = imagenes_para_publicacion(nueva_publicacion.id, imagenes, usuario.id)
 
         etiquetas = data.get('etiquetas', [])
         for etiqueta_id in etiquetas:
@@ -226,68 +1108,239 @@ def crear_publicacion(data, usuario):
                 nueva_publicacion.etiquetas.append(etiqueta)
 
         id_loc = data.get('id_locacion')
-        if id_loc:
-            usuarios_destino = Usuario.query.filter(
-                Usuario.id_localidad == id_loc,
-                Usuario.id != usuario.id 
-            ).all()
-            
-            titulo_notif = "Nueva Publicación"
-            mensaje_notif = f"Se publicó algo nuevo en tu zona: '{nueva_publicacion.titulo}'."
-            for u in usuarios_destino:
-                notificacion = Notificacion(
-                    id_usuario=u.id,
-                    id_publicacion=nueva_publicacion.id,
-                    titulo=titulo_notif,
-                    descripcion=mensaje_notif,
-                    fecha_creacion=datetime.now(timezone.utc),
-                    leido=False
-                )
-                db.session.add(notificacion)
-
+        nueva_publicacion.id_duplicado_de = _original_duplicado(
+            nueva_publicacion.titulo, nueva_publicacion.descripcion, usuario.id, id_loc
+        )
+        # Un re-posteo del mismo texto no vuelve a notificar a toda la zona
+        avisar_zona = bool(id_loc) and nueva_publicacion.id_duplicado_de is None
+        evento_zona = avisar_zona and zona_por_lectura()
+        if evento_zona:
+            registrar_evento_zona(
+                nueva_publicacion.id, id_loc, usuario.id,
+                nueva_publicacion.titulo, nueva_publicacion.fecha_creacion
+            )
         db.session.commit()
-        return {"mensaje": "Publicación creada exitosamente", "id_publicacion": nueva_publicacion.id}, 201
+        _propagar_cambio(nueva_publicacion.id)
+        if avisar_zona and not evento_zona:
+            encolar(
+                notificar_zona, nueva_publicacion.id, id_loc, usuario.id,
+                nueva_publicacion.titulo, nueva_publicacion.fecha_creacion
+            )
+        # Buscar coincidencias y escribir los avisos no demora la respuesta
+        encolar(notificar_coincidencias, nueva_publicacion.id)
+        encolar_hash_imagenes([img.id for img in nuevas_imagenes])
+        return {
+            "mensaje": "Publicación creada exitosamente",
+            "id_publicacion": nueva_publicacion.id,
+            "id_duplicado_de": nueva_publicacion.id_duplicado_de,
+        }, 201
 
     except Exception as error:
             traceback.print_exc()
             db.session.rollback()
             return {"error": str(error)}, 400
 
-def obtener_publicacion_por_id(id_publicacion):
-    pub = Publicacion.query.get(id_publicacion)
+def version_publicacion(id_publicacion):
+    """
+    Versión del detalle de una publicación para el ETag, en una sola consulta y sin
+    cargar la publicación: fechas, categoría, ids de imágenes y etiquetas (con su
+    nombre). None si la publicación no existe.
+    """
+    imagenes = (
+        select(func.string_agg(cast(Imagen.id, Text), aggregate_order_by(literal(','), Imagen.id)))
+        .where(Imagen.id_publicacion == Publicacion.id)
+        .scalar_subquery()
+    )
+    etiquetas = (
+        select(huella(Etiqueta.id, Etiqueta.id, Etiqueta.nombre))
+        .select_from(PublicacionEtiqueta)
+        .join(Etiqueta, Etiqueta.id == PublicacionEtiqueta.id_etiqueta)
+        .where(PublicacionEtiqueta.id_publicacion == Publicacion.id)
+        .scalar_subquery()
+    )
+    fila = (
+        db.session.query(
+            Publicacion.fecha_creacion, Publicacion.fecha_modificacion,
+            Publicacion.id_categoria, Categoria.nombre, imagenes, etiquetas
+        )
+        .outerjoin(Categoria, Categoria.id == Publicacion.id_categoria)
+        .filter(Publicacion.id == id_publicacion)
+        .first()
+    )
+    return tuple(fila) if fila is not None else None
+
+
+def obtener_publicacion_por_id(id_publicacion, campos=CAMPOS_DETALLE):
+    """Detalle de una publicación; solo carga las columnas y relaciones de `campos`."""
+    pub = (
+        db.session.query(Publicacion)
+        .options(*opciones_carga(campos))
+        .filter(Publicacion.id == id_publicacion)
+        .first()
+    )
     if not pub:
         return {'error': 'Publicación no encontrada'}
 
-    imagenes = Imagen.query.filter_by(id_publicacion=pub.id).all()
-    urls_imagenes = [img.url for img in imagenes]
-    etiquetas = [et.nombre for et in pub.etiquetas]
+    return serializar(pub, campos)
 
-    categoria_data = None
-    if pub.categoria_obj:
-        categoria_data = {
-            "id": pub.categoria_obj.id,
-            "nombre": pub.categoria_obj.nombre
+# Máximo de ids por pedido a /publicaciones/batch
+LIMITE_BATCH = 100
+
+
+def obtener_publicaciones_por_ids(ids, formato="tarjeta", campos=None):
+    """
+    Resuelve varias publicaciones de una vez, con una cantidad fija de queries
+    sin importar cuántos ids vengan. Respeta el orden de `ids`.
+
+    formato "tarjeta" devuelve la tarjeta de los listados y "detalle" lo mismo
+    que GET /publicaciones/<id>; `campos` (?fields=) reemplaza a los del formato.
+    Retorna (publicaciones, ids_faltantes).
+    """
+    if formato == "tarjeta":
+        publicaciones = _tarjetas(ids)
+        encontrados = {tarjeta["id"] for tarjeta in publicaciones}
+        if campos:
+            publicaciones = proyectar_tarjetas(publicaciones, campos)
+    else:
+        campos = campos or CAMPOS_DETALLE
+        por_id = {
+            pub.id: serializar(pub, campos)
+            for pub in db.session.query(Publicacion)
+            .options(*opciones_carga(campos))
+            .filter(Publicacion.id.in_(ids))
+            .all()
         }
+        encontrados = set(por_id)
+        publicaciones = [por_id[id_pub] for id_pub in ids if id_pub in por_id]
+
+    return publicaciones, [id_pub for id_pub in ids if id_pub not in encontrados]
+
+# Comentarios que trae /publicaciones/<id>/completa (el resto, por /comentarios/publicacion/<id>)
+COMENTARIOS_POR_PAGINA = 20
+
+# El QR solo depende del id y de FRONTEND_URL: no hace falta volver a dibujarlo
+_qr_publicacion = lru_cache(maxsize=1024)(generar_qr)
+
+
+def _id_nombre(obj):
+    return {"id": obj.id, "nombre": obj.nombre} if obj else None
+
+
+def obtener_publicacion_completa(id_publicacion):
+    """
+    Todo lo que necesita la pantalla de una publicación en una respuesta: el
+    detalle, imágenes, etiquetas, categoría, localidad con departamento y
+    provincia, autor (datos públicos), la primera página de comentarios con el
+    nombre de quien comenta, cantidades y el QR.
+
+    Son siempre 4 queries: la publicación con sus relaciones a uno (joinedload),
+    imágenes y etiquetas (selectinload) y los comentarios con su total (count over()).
+    Retorna None si la publicación no existe.
+    """
+    pub = (
+        db.session.query(Publicacion)
+        .options(
+            joinedload(Publicacion.categoria_obj),
+            joinedload(Publicacion.usuario),
+            joinedload(Publicacion.localidad)
+            .joinedload(Localidad.departamento)
+            .joinedload(Departamento.provincia),
+            selectinload(Publicacion.imagenes),
+            selectinload(Publicacion.etiquetas),
+        )
+        .filter(Publicacion.id == id_publicacion)
+        .first()
+    )
+    if not pub:
+        return None
+
+    filas = (
+        db.session.query(
+            Comentario, Usuario.nombre, Usuario.foto_perfil_url, func.count().over().label("total")
+        )
+        .outerjoin(Usuario, Usuario.id == Comentario.id_usuario)
+        .filter(Comentario.id_publicacion == id_publicacion)
+        .order_by(Comentario.fecha_creacion, Comentario.id)
+        .limit(COMENTARIOS_POR_PAGINA)
+        .all()
+    )
+    comentarios = [
+        dict(serializar_comentario(c), usuario={"id": c.id_usuario, "nombre": nombre, "foto_perfil_url": foto})
+        for c, nombre, foto, _ in filas
+    ]
+    total_comentarios = filas[0].total if filas else 0
+
+    localidad = pub.localidad
+    departamento = localidad.departamento if localidad else None
+    autor = pub.usuario
 
     return {
-        'id': pub.id,
-        'id_usuario': pub.id_usuario,
-        'id_locacion': pub.id_locacion,
-        'titulo': pub.titulo,
-        'descripcion': pub.descripcion,
-        'categoria': categoria_data,
-        'etiquetas': etiquetas,
-        'fecha_creacion': pub.fecha_creacion.astimezone(zona_arg).isoformat() if pub.fecha_creacion else None,
-        'fecha_modificacion': pub.fecha_modificacion.astimezone(zona_arg).isoformat() if pub.fecha_modificacion else None,
-        'coordenadas': pub.coordenadas,
-        'imagenes': urls_imagenes
+        "publicacion": serializar(pub, CAMPOS_DETALLE + ("estado",)),
+        "imagenes": [
+            {"id": img.id, "id_publicacion": img.id_publicacion, "url": img.url} for img in pub.imagenes
+        ],
+        "ubicacion": {
+            "localidad": _id_nombre(localidad),
+            "departamento": _id_nombre(departamento),
+            "provincia": _id_nombre(departamento.provincia if departamento else None),
+        },
+        "autor": {
+            "id": autor.id,
+            "nombre": autor.nombre,
+            "slug": autor.slug,
+            "foto_perfil_url": autor.foto_perfil_url,
+        } if autor else None,
+        "comentarios": comentarios,
+        "cantidades": {
+            "comentarios": total_comentarios,
+            "imagenes": len(pub.imagenes),
+            "etiquetas": len(pub.etiquetas),
+        },
+        "hay_mas_comentarios": total_comentarios > len(comentarios),
+        "qr": _qr_publicacion(id_publicacion),
     }
 
+# --- IMÁGENES PARECIDAS ---
+
+LIMITE_IMAGENES_SIMILARES = 50
+
+
+def obtener_publicaciones_con_imagenes_similares(id_publicacion, distancia_maxima=DISTANCIA_SIMILAR, cantidad=20):
+    """
+    Publicaciones con alguna foto parecida a las de esta (pHash a distancia de
+    Hamming <= distancia_maxima), de la más parecida a la menos. Cada tarjeta trae
+    en "imagen_similar" la distancia y qué imagen de cada lado coincidió.
+    None si la publicación no existe.
+    """
+    if not indice_phash_disponible():
+        raise RuntimeError("El índice de imágenes no está disponible")
+
+    propias = db.session.query(Imagen.id, Imagen.phash).filter(Imagen.id_publicacion == id_publicacion).all()
+    if not propias and db.session.get(Publicacion, id_publicacion) is None:
+        return None
+
+    # Por publicación, el par de imágenes más parecido
+    mejores = {}
+    for id_imagen, phash in propias:
+        if phash is None:
+            continue
+        for id_similar, id_pub, distancia in indice_phash.similares(phash, distancia_maxima):
+            if id_pub == id_publicacion or id_pub is None:
+                continue
+            if id_pub not in mejores or distancia < mejores[id_pub]["distancia"]:
+                mejores[id_pub] = {"distancia": distancia, "id_imagen": id_imagen, "id_imagen_similar": id_similar}
+
+    ids = sorted(mejores, key=lambda id_pub: (mejores[id_pub]["distancia"], -id_pub))[:cantidad]
+    return [dict(tarjeta, imagen_similar=mejores[tarjeta["id"]]) for tarjeta in _tarjetas(ids)]
+
+
 def actualizar_publicacion(id_publicacion, data):
     publicacion = Publicacion.query.get(id_publicacion)
     if not publicacion:
         raise Exception("Publicación no encontrada")
 
+    posicion_previa = (publicacion.latitud, publicacion.longitud)
+
     publicacion.titulo = data.get('titulo', publicacion.titulo)
     publicacion.descripcion = data.get('descripcion', publicacion.descripcion)
     publicacion.id_categoria = data.get('id_categoria', publicacion.id_categoria)
@@ -296,13 +1349,13 @@ def actualizar_publicacion(id_publicacion, data):
     publicacion.fecha_modificacion = datetime.now(timezone.utc)
 
     nuevas_imagenes = data.get('imagenes')
+    imagenes_borradas, imagenes_creadas = [], []
     if nuevas_imagenes is not None:
         if len(nuevas_imagenes) > 5:
             raise Exception("No puedes tener más de 5 imágenes por publicación")
-        Imagen.query.filter_by(id_publicacion=publicacion.id).delete()
-        for url in nuevas_imagenes:
-            nueva_imagen = Imagen(id_publicacion=publicacion.id, url=url)
-            db.session.add(nueva_imagen)
+        imagenes_borradas, imagenes_creadas = reemplazar_imagenes_publicacion(
+            publicacion.id, nuevas_imagenes, publicacion.id_usuario
+        )
 
     nuevas_etiquetas_ids = data.get('etiquetas', [])
     if nuevas_etiquetas_ids is not None:
@@ -310,17 +1363,22 @@ def actualizar_publicacion(id_publicacion, data):
         publicacion.etiquetas = etiquetas
 
     db.session.commit()
+    _propagar_cambio(id_publicacion, [posicion_previa])
+    indice_phash.quitar(imagenes_borradas)
+    encolar_hash_imagenes([img.id for img in imagenes_creadas])
 
 def eliminar_publicacion(id_publicacion):
     publicacion = Publicacion.query.get(id_publicacion)
     if not publicacion:
         raise Exception("Publicación no encontrada")
+    posicion_previa = (publicacion.latitud, publicacion.longitud)
     for comentario in Comentario.query.filter_by(id_publicacion=publicacion.id).all():
         eliminar_comentario(comentario.id)
     for img in Imagen.query.filter_by(id_publicacion=publicacion.id).all():
         eliminar_imagen(img.id)
     db.session.delete(publicacion)
     db.session.commit()
+    _propagar_cambio(id_publicacion, [posicion_previa])
     return {"mensaje": "Publicación eliminada correctamente"}
 
 def obtener_info_principal_publicacion(id_publicacion):
@@ -328,18 +1386,15 @@ def obtener_info_principal_publicacion(id_publicacion):
     return obtener_publicacion_por_id(id_publicacion)
 
 def obtener_mis_publicaciones(id_usuario):
-    publicaciones = (
-        db.session.query(Publicacion)
-        .options(
-            joinedload(Publicacion.imagenes),
-            joinedload(Publicacion.categoria_obj)
-        )
+    ids = [
+        fila.id for fila in
+        db.session.query(Publicacion.id)
         .filter(Publicacion.id_usuario == id_usuario)
-        .order_by(Publicacion.fecha_creacion.desc())
+        .order_by(Publicacion.fecha_creacion.desc(), Publicacion.id.desc())
         .all()
-    )
-    # Reutilizamos el serializador ligero
-    return [serializar_publicacion_lista(pub) for pub in publicaciones]
+    ]
+    # Reutilizamos las tarjetas del listado
+    return _tarjetas(ids)
 
 def obtener_publicaciones_por_usuario(id_usuario):
     return obtener_mis_publicaciones(id_usuario)
@@ -350,6 +1405,7 @@ def archivar_publicacion(id_publicacion):
     pub.estado = 1
     pub.fecha_modificacion = datetime.now(timezone.utc)
     db.session.commit()
+    _propagar_cambio(id_publicacion)
     return jsonify({"mensaje": "Archivada"}), 200
 
 def desarchivar_publicacion(id_publicacion):
@@ -358,24 +1414,5 @@ def desarchivar_publicacion(id_publicacion):
     pub.estado = 0
     pub.fecha_modificacion = datetime.now(timezone.utc)
     db.session.commit()
+    _propagar_cambio(id_publicacion)
     return jsonify({"mensaje": "Desarchivada"}), 200
-
-# Helpers
-def normalizar_texto(texto):
-    if not texto: return ''
-    texto = unicodedata.normalize('NFD', texto)
-    texto = texto.encode('ascii', 'ignore').decode('utf-8')
-    return texto.lower().strip()
-
-def subir_imagen_a_cloudinary(file):
-    try:
-        cloudinary.config(
-            cloud_name=current_app.config['CLOUDINARY_CLOUD_NAME'],
-            api_key=current_app.config['CLOUDINARY_API_KEY'],
-            api_secret=current_app.config['CLOUDINARY_API_SECRET']
-        )
-        result = cloudinary.uploader.upload(file, upload_preset=current_app.config['CLOUDINARY_UPLOAD_PRESET'])
-        return result.get("secure_url")
-    except Exception as e:
-        print("Error Cloudinary:", str(e))
-        return None
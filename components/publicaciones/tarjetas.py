@@ -0,0 +1,92 @@
+"""
+Tarjetas pre-renderizadas de publicaciones (tabla tarjetas_publicacion).
+
+Cada fila guarda el JSON que devuelven los listados para una publicación, así
+una página se arma con un solo SELECT ... WHERE id_publicacion IN (...) en vez
+de cargar imágenes, etiquetas, categoría y localidad y serializar cada vez.
+
+Acá solo está el acceso a la tabla; las tarjetas se arman en
+components.publicaciones.services. Los módulos que cambian algo que se ve en la
+tarjeta (imágenes, nombres de etiquetas) llaman a invalidar_tarjetas* antes de
+su commit y la tarjeta se vuelve a armar en la próxima lectura.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+
+from core.models import db, Publicacion, TarjetaPublicacion, PublicacionEtiqueta
+
+
+def leer_tarjetas(ids):
+    """Devuelve {id_publicacion: datos} de las tarjetas guardadas."""
+    if not ids:
+        return {}
+    return dict(
+        db.session.query(TarjetaPublicacion.id_publicacion, TarjetaPublicacion.datos)
+        .filter(TarjetaPublicacion.id_publicacion.in_(ids))
+        .all()
+    )
+
+
+def version_tarjeta(publicacion):
+    """Versión de la publicación con la que se arma la tarjeta."""
+    return publicacion.fecha_modificacion or publicacion.fecha_creacion
+
+
+def guardar_tarjetas(tarjetas, versiones):
+    """
+    Inserta o reemplaza tarjetas {id_publicacion: datos}, armadas con las
+    `versiones` {id_publicacion: version_tarjeta}. Una tarjeta guardada con una
+    versión más nueva no se reemplaza (un listado que leyó la publicación antes
+    de una edición y guarda después). No hace commit.
+    """
+    if not tarjetas:
+        return
+    ahora = datetime.now(timezone.utc)
+    sentencia = insert(TarjetaPublicacion).values([
+        {
+            "id_publicacion": id_publicacion, "datos": datos,
+            "fecha_actualizacion": ahora, "version": versiones.get(id_publicacion),
+        }
+        for id_publicacion, datos in tarjetas.items()
+    ])
+    db.session.execute(sentencia.on_conflict_do_update(
+        index_elements=[TarjetaPublicacion.id_publicacion],
+        set_={
+            "datos": sentencia.excluded.datos,
+            "fecha_actualizacion": sentencia.excluded.fecha_actualizacion,
+            "version": sentencia.excluded.version,
+        },
+        where=or_(
+            TarjetaPublicacion.version.is_(None),
+            sentencia.excluded.version >= TarjetaPublicacion.version,
+        )
+    ))
+
+
+def invalidar_tarjetas(ids):
+    """Borra las tarjetas de esas publicaciones. No hace commit."""
+    ids = [id_publicacion for id_publicacion in ids if id_publicacion is not None]
+    if ids:
+        db.session.query(TarjetaPublicacion).filter(
+            TarjetaPublicacion.id_publicacion.in_(ids)
+        ).delete(synchronize_session=False)
+
+
+def invalidar_tarjetas_de_etiqueta(id_etiqueta):
+    """Borra las tarjetas de las publicaciones que tienen la etiqueta. No hace commit."""
+    con_etiqueta = db.session.query(PublicacionEtiqueta.id_publicacion).filter(
+        PublicacionEtiqueta.id_etiqueta == id_etiqueta
+    )
+    db.session.query(TarjetaPublicacion).filter(
+        TarjetaPublicacion.id_publicacion.in_(con_etiqueta.scalar_subquery())
+    ).delete(synchronize_session=False)
+
+
+def invalidar_tarjetas_de_localidad(id_localidad):
+    """Borra las tarjetas de las publicaciones ubicadas en la localidad. No hace commit."""
+    en_localidad = db.session.query(Publicacion.id).filter(Publicacion.id_locacion == id_localidad)
+    db.session.query(TarjetaPublicacion).filter(
+        TarjetaPublicacion.id_publicacion.in_(en_localidad.scalar_subquery())
+    ).delete(synchronize_session=False)
@@ -0,0 +1,176 @@
+"""
+Mapa por teselas (tiles z/x/y, el mismo esquema que usa Leaflet/OSM).
+
+En zoom bajo cada tesela devuelve clusters (cantidad y centro) agrupando las
+publicaciones en una grilla de CELDAS_POR_LADO x CELDAS_POR_LADO; desde
+ZOOM_MARCADORES devuelve todos los marcadores individuales. Así el mapa no
+pierde publicaciones en ciudades densas y cada tesela pesa lo mismo sin importar
+cuántas publicaciones haya.
+
+Cada respuesta se guarda en cache y solo se invalida cuando cambia una
+publicación ubicada dentro de esa tesela (invalidar_teselas).
+"""
+import math
+
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from core.cache import CacheMemoria
+from core.models import db, Publicacion
+from components.publicaciones.indice_geo import indice_geo, indice_disponible, fecha_a_timestamp
+from components.imagenes.variantes import variante_de
+from components.imagenes.miniaturas import url_thumb
+
+ZOOM_MAXIMO = 22
+ZOOM_MARCADORES = 14
+CELDAS_POR_LADO = 8
+LAT_MAXIMA_MERCATOR = 85.05112878
+
+# La invalidación es local a cada worker: el TTL acota cuánto puede tardar
+# un worker en ver lo que cambió otro (igual que la recarga del índice)
+cache_teselas = CacheMemoria("teselas", maxsize=4096, ttl=300)
+
+
+def caja_de_tesela(z, x, y):
+    """Devuelve (lat_min, lon_min, lat_max, lon_max) de la tesela z/x/y."""
+    n = 2 ** z
+    lon_min = x / n * 360.0 - 180.0
+    lon_max = (x + 1) / n * 360.0 - 180.0
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lat_min, lon_min, lat_max, lon_max
+
+
+def _posicion_en_teselas(lat, lon, z):
+    """Coordenadas fraccionarias (x, y) del punto en la grilla de teselas del zoom z."""
+    n = 2 ** z
+    lat = max(-LAT_MAXIMA_MERCATOR, min(LAT_MAXIMA_MERCATOR, lat))
+    lat_rad = math.radians(lat)
+    fx = (lon + 180.0) / 360.0 * n
+    fy = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+    return min(max(fx, 0.0), n - 1e-9), min(max(fy, 0.0), n - 1e-9)
+
+
+def tesela_de_punto(lat, lon, z):
+    fx, fy = _posicion_en_teselas(lat, lon, z)
+    return int(fx), int(fy)
+
+
+def _puntos_en_tesela(z, x, y, id_categoria):
+    """[(id, fecha_ts, lat, lon)] de las publicaciones activas cuya tesela es z/x/y."""
+    lat_min, lon_min, lat_max, lon_max = caja_de_tesela(z, x, y)
+
+    if indice_disponible():
+        puntos = indice_geo.en_caja(lat_min, lon_min, lat_max, lon_max, id_categoria=id_categoria)
+    else:
+        query = (
+            db.session.query(Publicacion.id, Publicacion.fecha_creacion, Publicacion.latitud, Publicacion.longitud)
+            .filter((Publicacion.estado == 0) | (Publicacion.estado.is_(None)))
+            .filter(func.point(Publicacion.longitud, Publicacion.latitud).op('<@')(
+                func.box(func.point(lon_min, lat_min), func.point(lon_max, lat_max))
+            ))
+        )
+        if id_categoria:
+            query = query.filter(Publicacion.id_categoria == id_categoria)
+        puntos = [(f.id, fecha_a_timestamp(f.fecha_creacion) or 0.0, f.latitud, f.longitud) for f in query.all()]
+
+    # Los puntos justo sobre el borde entran en las dos cajas: se quedan en una sola tesela
+    return [p for p in puntos if tesela_de_punto(p[2], p[3], z) == (x, y)]
+
+
+def _agrupar(puntos, z, x, y):
+    celdas = {}
+    for id_publicacion, _, lat, lon in puntos:
+        fx, fy = _posicion_en_teselas(lat, lon, z)
+        celda = (
+            min(int((fx - x) * CELDAS_POR_LADO), CELDAS_POR_LADO - 1),
+            min(int((fy - y) * CELDAS_POR_LADO), CELDAS_POR_LADO - 1),
+        )
+        grupo = celdas.setdefault(celda, {"cantidad": 0, "suma_lat": 0.0, "suma_lon": 0.0, "id": id_publicacion})
+        grupo["cantidad"] += 1
+        grupo["suma_lat"] += lat
+        grupo["suma_lon"] += lon
+
+    clusters = []
+    for grupo in celdas.values():
+        cantidad = grupo["cantidad"]
+        cluster = {
+            "cantidad": cantidad,
+            "lat": grupo["suma_lat"] / cantidad,
+            "lon": grupo["suma_lon"] / cantidad,
+        }
+        if cantidad == 1:
+            cluster["id"] = grupo["id"]
+        clusters.append(cluster)
+    return clusters
+
+
+def _marcadores(puntos):
+    ids = [p[0] for p in sorted(puntos, key=lambda p: (p[1], p[0]), reverse=True)]
+    if not ids:
+        return []
+
+    publicaciones = (
+        db.session.query(Publicacion)
+        .options(selectinload(Publicacion.categoria_obj), selectinload(Publicacion.imagenes))
+        .filter(Publicacion.id.in_(ids))
+        .all()
+    )
+    por_id = {pub.id: pub for pub in publicaciones}
+
+    marcadores = []
+    for id_publicacion in ids:
+        pub = por_id.get(id_publicacion)
+        if not pub:
+            continue
+        principal = pub.imagenes[0] if pub.imagenes else None
+        marcadores.append({
+            "id": pub.id,
+            "titulo": pub.titulo,
+            "categoria": {"id": pub.categoria_obj.id, "nombre": pub.categoria_obj.nombre} if pub.categoria_obj else None,
+            "coordenadas": pub.coordenadas,
+            "imagen_principal": variante_de(principal, "miniatura") if principal else None,
+            "imagen_placeholder": principal.placeholder if principal else None,
+            "id_imagen_principal": principal.id if principal else None,
+            "url_thumb": url_thumb(principal)
+        })
+    return marcadores
+
+
+def obtener_tesela(z, x, y, id_categoria=None):
+    """
+    Devuelve (datos, desde_cache) para la tesela z/x/y.
+    Lanza ValueError si la tesela no existe.
+    """
+    if not 0 <= z <= ZOOM_MAXIMO or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise ValueError("Tesela fuera de rango")
+
+    id_categoria = int(id_categoria) if id_categoria else None
+    clave = (z, x, y, id_categoria)
+    guardado = cache_teselas.obtener(clave)
+    if guardado is not None:
+        return guardado, True
+
+    puntos = _puntos_en_tesela(z, x, y, id_categoria)
+    datos = {"z": z, "x": x, "y": y, "total": len(puntos)}
+    if z >= ZOOM_MARCADORES:
+        datos["tipo"] = "marcadores"
+        datos["marcadores"] = _marcadores(puntos)
+    else:
+        datos["tipo"] = "clusters"
+        datos["clusters"] = _agrupar(puntos, z, x, y)
+
+    cache_teselas.guardar(clave, datos)
+    return datos, False
+
+
+def invalidar_teselas(posiciones):
+    """Borra de la cache las teselas (de todos los zooms) que contienen alguna de las posiciones (lat, lon)."""
+    teselas = set()
+    for lat, lon in posiciones:
+        if lat is None or lon is None:
+            continue
+        for z in range(ZOOM_MAXIMO + 1):
+            teselas.add((z, *tesela_de_punto(lat, lon, z)))
+    if teselas:
+        cache_teselas.invalidar_si(lambda clave: clave[:3] in teselas)
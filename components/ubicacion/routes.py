@@ -1,14 +1,23 @@
 from flask import Blueprint, jsonify, request
 from sqlalchemy.orm import joinedload
 from core.models import db, Provincia, Departamento, Localidad
+from core.http_cache import etag_de, huella, responder_con_etag, CACHE_CATALOGO
+from components.publicaciones.tarjetas import invalidar_tarjetas_de_localidad
+from components.publicaciones.cache_respuestas import invalidar_respuestas
+from components.publicaciones.services import cache_facetas
 
 ubicacion_bp = Blueprint('ubicacion', __name__, url_prefix='/api/ubicacion')
 
 @ubicacion_bp.route('/provincias', methods=['GET'])
 def obtener_provincias():
     '''Obtiene todas las provincias.'''
-    provincias = Provincia.query.order_by(Provincia.nombre).all()
-    return jsonify([{'id': p.id, 'nombre': p.nombre} for p in provincias])
+    version = db.session.query(huella(Provincia.id, Provincia.id, Provincia.nombre)).scalar()
+
+    def construir():
+        provincias = Provincia.query.order_by(Provincia.nombre).all()
+        return [{'id': p.id, 'nombre': p.nombre} for p in provincias]
+
+    return responder_con_etag(etag_de('provincias', version), construir, CACHE_CATALOGO)
 
 
 @ubicacion_bp.route('/departamentos', methods=['GET'])
@@ -18,11 +27,19 @@ def obtener_departamentos():
     
     if not provincia_id:
         return jsonify({"error": "Falta el parámetro provincia_id"}), 400
-    departamentos = (
-        Departamento.query.filter_by(id_provincia=provincia_id)
-        .order_by(Departamento.nombre).all()
-    )
-    return jsonify([{'id': d.id, 'nombre': d.nombre} for d in departamentos])
+
+    version = db.session.query(huella(Departamento.id, Departamento.id, Departamento.nombre))\
+        .filter(Departamento.id_provincia == provincia_id)\
+        .scalar()
+
+    def construir():
+        departamentos = (
+            Departamento.query.filter_by(id_provincia=provincia_id)
+            .order_by(Departamento.nombre).all()
+        )
+        return [{'id': d.id, 'nombre': d.nombre} for d in departamentos]
+
+    return responder_con_etag(etag_de('departamentos', provincia_id, version), construir, CACHE_CATALOGO)
 
 
 @ubicacion_bp.route('/localidades', methods=['GET'])
@@ -33,19 +50,25 @@ def obtener_localidades():
     if not departamento_id:
         return jsonify({"error": "Falta el parámetro departamento_id"}), 400
 
-    localidades = (
-        Localidad.query.filter_by(id_departamento=departamento_id)
-        .order_by(Localidad.nombre).all()
-    )
-    
-    return jsonify([
-        {
-            'id': l.id,
-            'nombre': l.nombre,
-            'latitud': float(l.latitud) if l.latitud is not None else None,
-            'longitud': float(l.longitud) if l.longitud is not None else None
-        } for l in localidades
-    ])
+    version = db.session.query(
+        huella(Localidad.id, Localidad.id, Localidad.nombre, Localidad.latitud, Localidad.longitud)
+    ).filter(Localidad.id_departamento == departamento_id).scalar()
+
+    def construir():
+        localidades = (
+            Localidad.query.filter_by(id_departamento=departamento_id)
+            .order_by(Localidad.nombre).all()
+        )
+        return [
+            {
+                'id': l.id,
+                'nombre': l.nombre,
+                'latitud': float(l.latitud) if l.latitud is not None else None,
+                'longitud': float(l.longitud) if l.longitud is not None else None
+            } for l in localidades
+        ]
+
+    return responder_con_etag(etag_de('localidades', departamento_id, version), construir, CACHE_CATALOGO)
 
 
 @ubicacion_bp.route('/localidades/<int:id_localidad>', methods=['GET'])
@@ -65,14 +88,16 @@ def obtener_localidad(id_localidad):
     dept = localidad.departamento
     provincia_id = dept.id_provincia if dept else None
 
-    return jsonify({
+    # Una sola fila chica: el ETag sale de los mismos datos y el 304 ahorra la transferencia
+    datos = {
         'id': localidad.id,
         'nombre': localidad.nombre,
         'id_departamento': localidad.id_departamento,
         'id_provincia': provincia_id,
         'latitud': float(localidad.latitud) if localidad.latitud is not None else None,
         'longitud': float(localidad.longitud) if localidad.longitud is not None else None
-    })
+    }
+    return responder_con_etag(etag_de('localidad', *datos.values()), lambda: datos, CACHE_CATALOGO)
 
 
 @ubicacion_bp.route('/localidades/nombre/<int:id_localidad>', methods=['GET'])
@@ -84,10 +109,11 @@ def obtener_nombre_localidad(id_localidad):
     if not resultado:
         return jsonify({'error': 'Localidad no encontrada'}), 404
 
-    return jsonify({
+    datos = {
         'id': resultado.id,
         'nombre': resultado.nombre,
-    })
+    }
+    return responder_con_etag(etag_de('localidad_nombre', *datos.values()), lambda: datos, CACHE_CATALOGO)
 
 # --- ENDPOINTS POST, PUT, DELETE (Se mantienen igual) ---
 # ... (tu código de crear/borrar estaba bien, no requiere optimización de lectura)
@@ -135,7 +161,11 @@ def actualizar_localidad(id_localidad):
     localidad.longitud = data.get('longitud', localidad.longitud)
     localidad.id_departamento = data.get('id_departamento', localidad.id_departamento)
 
+    # El nombre de la localidad se ve en las tarjetas, los listados cacheados y las facetas
+    invalidar_tarjetas_de_localidad(id_localidad)
     db.session.commit()
+    invalidar_respuestas()
+    cache_facetas.limpiar()
 
     return jsonify({
         "id": localidad.id,
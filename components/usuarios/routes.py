@@ -7,6 +7,7 @@ from components.usuarios.services import (
     obtener_usuario_por_uid,
     obtener_usuario_por_slug,
 )
+from components.publicaciones.serializador import leer_campos, opciones_carga, serializar
 from firebase_admin import auth
 from core.auth_middleware import require_auth
 import psycopg2
@@ -115,18 +116,24 @@ def get_usuarios():
 
 # --- SECCIÓN DE SOCKETS ELIMINADA (connect, disconnect, userconnected) ---
 
+def _responder_publicaciones(query):
+    '''Lista las publicaciones de la query; con ?fields= solo carga y devuelve esos campos.'''
+    campos = leer_campos(request.args.get('fields'))
+    query = query.order_by(Publicacion.id.desc())
+    if campos is None:
+        return jsonify([pub.to_dict() for pub in query.all()]), 200
+    publicaciones = query.options(*opciones_carga(campos)).all()
+    return jsonify([serializar(pub, campos) for pub in publicaciones]), 200
+
 # Endpoint para obtener publicaciones de un usuario por su id
 @usuarios_bp.route('/usuarios/<int:idUsuario>/publicaciones', methods=['GET'])
 def obtener_publicaciones_usuario(idUsuario):
     '''Obtiene todas las publicaciones de un usuario específico por su ID.'''
     try:
-        publicaciones = (
-            Publicacion.query.filter_by(id_usuario=idUsuario)
-            .order_by(Publicacion.id.desc())
-            .all()
-        )
-
-        return jsonify([pub.to_dict() for pub in publicaciones]), 200
+        query = Publicacion.query.filter_by(id_usuario=idUsuario)
+        return _responder_publicaciones(query)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     except Exception as error:
         return jsonify({'error': str(error)}), 400
 
@@ -134,14 +141,10 @@ def obtener_publicaciones_usuario(idUsuario):
 def obtener_publicaciones_usuario_filtrado(idUsuario):
     '''Obtiene todas las publicaciones de un usuario específico por su ID, no trae las archivadas.'''
     try:
-        publicaciones = (
-            Publicacion.query.filter_by(id_usuario=idUsuario)
-            .filter_by(estado=0)
-            .order_by(Publicacion.id.desc())
-            .all()
-        )
-
-        return jsonify([pub.to_dict() for pub in publicaciones]), 200
+        query = Publicacion.query.filter_by(id_usuario=idUsuario).filter_by(estado=0)
+        return _responder_publicaciones(query)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     except Exception as error:
         return jsonify({'error': str(error)}), 400
 
@@ -0,0 +1,75 @@
+"""
+Cache en memoria por worker, con TTL y contadores de aciertos.
+
+Envuelve cachetools.TTLCache con un lock (los workers de gunicorn pueden usar
+threads) y lleva la cuenta de hits/misses/invalidaciones para poder ver si la
+cache está sirviendo. Cada cache se registra por nombre en `caches`.
+"""
+import threading
+
+from cachetools import TTLCache
+
+caches = {}
+
+
+class CacheMemoria:
+    def __init__(self, nombre, maxsize=1024, ttl=300):
+        self.nombre = nombre
+        self._datos = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+        caches[nombre] = self
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado o None si no está (o venció)."""
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+
+    def invalidar(self, clave):
+        with self._lock:
+            if self._datos.pop(clave, None) is not None:
+                self.invalidaciones += 1
+
+    def invalidar_si(self, predicado):
+        """Borra todas las entradas cuya clave cumple `predicado(clave)`."""
+        with self._lock:
+            claves = [clave for clave in list(self._datos.keys()) if predicado(clave)]
+            for clave in claves:
+                self._datos.pop(clave, None)
+            self.invalidaciones += len(claves)
+
+    def claves(self):
+        with self._lock:
+            return list(self._datos.keys())
+
+    def entradas(self):
+        """Lista de (clave, valor) vigentes, sin contar como hits (para actualizar en el lugar)."""
+        with self._lock:
+            return list(self._datos.items())
+
+    def limpiar(self):
+        with self._lock:
+            self.invalidaciones += len(self._datos)
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._datos),
+                "hits": self.hits,
+                "misses": self.misses,
+                "tasa_hit": round(self.hits / consultas, 4) if consultas else None,
+                "invalidaciones": self.invalidaciones,
+            }
@@ -0,0 +1,45 @@
+"""
+ETags y GET condicional para los endpoints de lectura.
+
+El ETag sale de una "versión" barata de lo que se va a devolver (fechas de
+modificación, ids, o una huella calculada en Postgres) y no del JSON final, así
+un If-None-Match que coincide se contesta con 304 sin cargar ni serializar nada.
+"""
+import hashlib
+
+from flask import request, jsonify, current_app
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+# Cache-Control por tipo de endpoint
+CACHE_CATALOGO = "public, max-age=3600"   # provincias, departamentos, localidades, categorías
+CACHE_LISTA = "public, max-age=60"        # etiquetas (las editan los usuarios)
+CACHE_CONTENIDO = "no-cache"              # publicaciones y comentarios: siempre revalidar
+
+
+def etag_de(*partes):
+    """ETag fuerte (sin comillas) a partir de los valores que identifican la versión."""
+    return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+
+
+def huella(columna_orden, *columnas):
+    """
+    Expresión SQL con el md5 de las columnas de todas las filas (ordenadas por
+    `columna_orden`). Sirve como versión de listas chicas que se pueden editar.
+    """
+    fila = func.concat_ws('|', *columnas)
+    return func.md5(func.string_agg(fila, aggregate_order_by(literal(','), columna_orden)))
+
+
+def responder_con_etag(etag, construir, cache_control=CACHE_CONTENIDO):
+    """
+    Responde 304 si el If-None-Match del request coincide con `etag`; si no,
+    llama a construir() y devuelve su resultado como JSON con ETag y Cache-Control.
+    """
+    if request.if_none_match.contains(etag):
+        respuesta = current_app.response_class(status=304)
+    else:
+        respuesta = jsonify(construir())
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = cache_control
+    return respuesta
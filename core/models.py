@@ -1,7 +1,9 @@
 from datetime import datetime, timezone
+import unicodedata
 import uuid
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Numeric, event
+from sqlalchemy import Numeric, event, func, cast, inspect
+from sqlalchemy.dialects.postgresql import TSVECTOR, REGCONFIG, JSONB
 from sqlalchemy.orm import Session
 from slugify import slugify
 
@@ -85,11 +87,16 @@ class Usuario(db.Model):
     estado = db.Column(db.String(10), nullable=False, default="activo")
     
     # Relación opcional con la tabla 'localidades'
-    id_localidad = db.Column(db.BigInteger, db.ForeignKey('localidades.id'), nullable=True)
+    # Indexada: el aviso "nueva publicación en tu zona" busca usuarios por localidad
+    id_localidad = db.Column(db.BigInteger, db.ForeignKey('localidades.id'), nullable=True, index=True)
     
     # Propiedad para acceder al objeto localidad directamente (usuario.localidad.nombre)
     localidad_obj = db.relationship('Localidad', backref='usuarios')
 
+    # Marca de lectura de los avisos de zona guardados como eventos (eventos_zona):
+    # los de id <= a este valor cuentan como leídos
+    id_evento_zona_leido = db.Column(db.Integer, nullable=True)
+
     # Cascada para publicaciones y comentarios
     publicaciones = db.relationship(
         'Publicacion',
@@ -235,6 +242,16 @@ class PublicacionEtiqueta(db.Model):
 
 class Publicacion(db.Model):
     __tablename__ = 'publicaciones'
+    __table_args__ = (
+        # Soporta la paginación por cursor (keyset) del home y los filtros
+        db.Index('ix_publicaciones_fecha_creacion_id', 'fecha_creacion', 'id'),
+        # Búsqueda de texto (/publicaciones/buscar)
+        db.Index('ix_publicaciones_busqueda', 'busqueda', postgresql_using='gin'),
+        db.Index(
+            'ix_publicaciones_texto_busqueda_trgm', 'texto_busqueda',
+            postgresql_using='gin', postgresql_ops={'texto_busqueda': 'gin_trgm_ops'}
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
     id_usuario = db.Column(
         db.Integer,
@@ -254,6 +271,15 @@ class Publicacion(db.Model):
     fecha_creacion = db.Column(db.DateTime(timezone=True))
     fecha_modificacion = db.Column(db.DateTime(timezone=True))
     coordenadas = db.Column(db.ARRAY(db.Float))
+    # Copia de coordenadas en columnas reales para poder indexarlas.
+    # Se sincronizan solas con el listener de más abajo.
+    latitud = db.Column(db.Float)
+    longitud = db.Column(db.Float)
+    # Título y descripción sin acentos y en minúsculas (trigramas) y su tsvector
+    # en español (título con peso A, descripción con peso B). Los mantiene el
+    # listener de más abajo; `flask publicaciones reindexar-busqueda` los rehace.
+    texto_busqueda = db.Column(db.Text)
+    busqueda = db.Column(TSVECTOR)
 
     etiquetas = db.relationship('Etiqueta', secondary='publicacion_etiqueta', back_populates='publicaciones')
     imagenes = db.relationship('Imagen', backref='publicacion', lazy='select')
@@ -261,6 +287,11 @@ class Publicacion(db.Model):
     reportes = db.relationship('Reporte', backref='publicacion', cascade="all, delete-orphan", passive_deletes=True)
     
     estado = db.Column(db.Integer, default=0)
+    # Publicación original de la que esta es casi un duplicado (mismo autor o
+    # misma localidad). La marca crear_publicacion; ver components.publicaciones.duplicados
+    id_duplicado_de = db.Column(
+        db.Integer, db.ForeignKey('publicaciones.id', ondelete='SET NULL'), nullable=True, index=True
+    )
   
     def to_dict(self):
         """Convierte la publicación a un diccionario serializable."""
@@ -284,6 +315,90 @@ class Publicacion(db.Model):
             "localidad": self.localidad.nombre if self.localidad else None
         }
 
+# Índice espacial (GiST sobre point(lon, lat)) para el filtro por radio
+db.Index(
+    'ix_publicaciones_punto',
+    func.point(Publicacion.longitud, Publicacion.latitud),
+    postgresql_using='gist'
+)
+
+
+def coordenadas_a_lat_lon(coordenadas):
+    """Devuelve (lat, lon) desde el array coordenadas ([lat, lon]) o (None, None)."""
+    if isinstance(coordenadas, dict):
+        coordenadas = [coordenadas.get('lat'), coordenadas.get('lng', coordenadas.get('lon'))]
+    if not coordenadas or len(coordenadas) < 2:
+        return None, None
+    try:
+        return float(coordenadas[0]), float(coordenadas[1])
+    except (TypeError, ValueError):
+        return None, None
+
+
+@event.listens_for(Publicacion, 'before_insert')
+@event.listens_for(Publicacion, 'before_update')
+def sincronizar_lat_lon(mapper, connection, target):
+    """Mantiene latitud/longitud alineadas con coordenadas al crear y actualizar."""
+    target.latitud, target.longitud = coordenadas_a_lat_lon(target.coordenadas)
+
+
+CONFIG_BUSQUEDA = 'spanish'
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin acentos: etiquetas, texto de búsqueda y consultas."""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFD', texto)
+    texto = texto.encode('ascii', 'ignore').decode('utf-8')
+    return texto.lower().strip()
+
+
+def texto_busqueda(titulo, descripcion):
+    """Valor de texto_busqueda: título y descripción normalizados (ver normalizar_texto)."""
+    return f"{normalizar_texto(titulo)} {normalizar_texto(descripcion)}".strip()
+
+
+def tsvector_busqueda(titulo, descripcion):
+    """Expresión SQL con el tsvector de búsqueda a partir de título y descripción ya normalizados."""
+    config = cast(CONFIG_BUSQUEDA, REGCONFIG)
+    return func.setweight(func.to_tsvector(config, titulo), 'A').op('||')(
+        func.setweight(func.to_tsvector(config, descripcion), 'B')
+    )
+
+
+@event.listens_for(Publicacion, 'before_insert')
+@event.listens_for(Publicacion, 'before_update')
+def sincronizar_busqueda(mapper, connection, target):
+    """Recalcula texto_busqueda/busqueda cuando cambian el título o la descripción."""
+    estado = inspect(target)
+    if estado.persistent and not (
+        estado.attrs.titulo.history.has_changes() or estado.attrs.descripcion.history.has_changes()
+    ):
+        return
+    target.texto_busqueda = texto_busqueda(target.titulo, target.descripcion)
+    target.busqueda = tsvector_busqueda(normalizar_texto(target.titulo), normalizar_texto(target.descripcion))
+
+
+class TarjetaPublicacion(db.Model):
+    """
+    Tarjeta ya serializada de una publicación (el JSON de serializar_publicacion_lista)
+    para armar los listados sin volver a cargar relaciones ni serializar.
+    Se reconstruye cuando se escribe la publicación.
+    """
+    __tablename__ = 'tarjetas_publicacion'
+    id_publicacion = db.Column(
+        db.Integer,
+        db.ForeignKey('publicaciones.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    datos = db.Column(JSONB, nullable=False)
+    fecha_actualizacion = db.Column(db.DateTime(timezone=True), nullable=False)
+    # fecha_modificacion de la publicación con la que se armó: una tarjeta
+    # armada con una lectura vieja no pisa a una más nueva
+    version = db.Column(db.DateTime(timezone=True))
+
+
 class Comentario(db.Model):
     __tablename__ = 'comentarios'
     id = db.Column(db.Integer, primary_key=True)
@@ -301,6 +416,41 @@ class Imagen(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     id_publicacion = db.Column(db.Integer, db.ForeignKey('publicaciones.id', ondelete='CASCADE'))
     url = db.Column(db.Text)
+    # Hash perceptual de 64 bits (ver components.imagenes.phash); NULL hasta que se calcula
+    phash = db.Column(db.BigInteger)
+    # SHA-256 de la imagen normalizada al subirla (ver components.imagenes.contenido)
+    hash_contenido = db.Column(db.String(64), index=True)
+
+    # Variantes y metadatos para los listados (ver components.imagenes.variantes);
+    # NULL hasta que se generan al subir o con `flask imagenes generar-variantes`
+    url_miniatura = db.Column(db.Text)
+    url_tarjeta = db.Column(db.Text)
+    url_completa = db.Column(db.Text)
+    ancho = db.Column(db.Integer)
+    alto = db.Column(db.Integer)
+    tamanio_bytes = db.Column(db.Integer)
+    color_dominante = db.Column(db.String(7))
+    placeholder = db.Column(db.Text)
+
+    # Quién subió la imagen y cuándo: una imagen suelta (sin publicación) solo la
+    # adopta una publicación de su dueño, y las que nunca se asocian se purgan
+    id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='SET NULL'))
+    fecha_creacion = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "id_publicacion": self.id_publicacion,
+            "url": self.url,
+            "url_miniatura": self.url_miniatura or self.url,
+            "url_tarjeta": self.url_tarjeta or self.url,
+            "url_completa": self.url_completa or self.url,
+            "ancho": self.ancho,
+            "alto": self.alto,
+            "tamanio_bytes": self.tamanio_bytes,
+            "color_dominante": self.color_dominante,
+            "placeholder": self.placeholder,
+        }
 
 
 class Notificacion(db.Model):
@@ -331,6 +481,27 @@ class Notificacion(db.Model):
             "leido": self.leido
         }
 
+class EventoZona(db.Model):
+    """
+    Aviso "nueva publicación en tu zona" guardado una sola vez por publicación.
+    Se suma a las notificaciones de cada vecino al leerlas, en lugar de copiarse
+    como una fila de notificaciones por usuario de la localidad.
+    """
+    __tablename__ = 'eventos_zona'
+    id = db.Column(db.Integer, primary_key=True)
+    id_localidad = db.Column(db.BigInteger, db.ForeignKey('localidades.id'), nullable=False)
+    id_publicacion = db.Column(
+        db.Integer, db.ForeignKey('publicaciones.id', ondelete='CASCADE'), nullable=False, index=True
+    )
+    id_autor = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False, index=True)
+    titulo = db.Column(db.Text)
+    descripcion = db.Column(db.Text)
+    fecha_creacion = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    # Los últimos eventos de una localidad salen de un recorrido de este índice
+    __table_args__ = (db.Index('ix_eventos_zona_localidad_id', 'id_localidad', 'id'),)
+
+
 class Reporte(db.Model):
     __tablename__ = 'reportes'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,70 @@
+"""
+Recarga de los índices en memoria de cada worker.
+
+Los índices (geográfico, coincidencias, phash, duplicados, contenido de
+imágenes) se arman desde la base al iniciar y se mantienen al día con lo que
+escribe el propio worker; cada SEGUNDOS_RECARGA se recargan completos para
+incorporar lo que escribieron los otros. IndiceRecargable junta esa parte
+común: la carga con manejo de errores, el vencimiento y la recarga en segundo
+plano. El índice solo tiene que exponer `cargado` y `cargado_en`.
+"""
+import threading
+import time
+
+from flask import current_app
+
+from core.models import db
+
+SEGUNDOS_RECARGA = 300
+
+
+class IndiceRecargable:
+    """Carga `indice` con la función `cargar` y lo recarga en segundo plano cuando vence."""
+
+    def __init__(self, indice, cargar, descripcion, segundos_recarga=SEGUNDOS_RECARGA):
+        self.indice = indice
+        self._cargar = cargar
+        self.descripcion = descripcion
+        self.segundos_recarga = segundos_recarga
+        self._recarga_en_curso = threading.Lock()
+
+    def vencido(self):
+        cargado_en = self.indice.cargado_en
+        return cargado_en is None or time.monotonic() - cargado_en > self.segundos_recarga
+
+    def cargar(self):
+        """
+        Carga (o recarga) el índice desde la base. Requiere contexto de app.
+        Cada carga corre en un contexto propio (y por lo tanto con su propia
+        sesión), así una consulta que falla no deja la transacción abortada
+        para la carga de otro índice ni para quien la llamó.
+        """
+        with current_app.app_context():
+            try:
+                self._cargar()
+            except Exception as error:
+                db.session.rollback()
+                # Se reintenta cuando vuelva a vencer, sin insistir en cada request
+                self.indice.cargado_en = time.monotonic()
+                print(f"No se pudo cargar {self.descripcion}: {error}")
+
+    def _recargar_en_segundo_plano(self, app):
+        try:
+            with app.app_context():
+                self.cargar()
+        finally:
+            self._recarga_en_curso.release()
+
+    def disponible(self):
+        """
+        Indica si el índice se puede usar para responder. Si la copia está vencida
+        (o nunca se pudo cargar) dispara una recarga en segundo plano y mientras
+        tanto sigue respondiendo con lo que tiene.
+        """
+        if self.vencido() and self._recarga_en_curso.acquire(blocking=False):
+            threading.Thread(
+                target=self._recargar_en_segundo_plano,
+                args=(current_app._get_current_object(),),
+                daemon=True
+            ).start()
+        return self.indice.cargado
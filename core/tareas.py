@@ -0,0 +1,28 @@
+"""
+Tareas en segundo plano dentro del proceso (pool de threads compartido).
+
+Para trabajo que no tiene que demorar la respuesta, como descargar y hashear
+imágenes. Cada tarea corre en su propio app context (y por lo tanto con su
+propia sesión de base); los errores se imprimen y no se propagan.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+TAREAS_WORKERS = int(os.getenv("TAREAS_WORKERS", "2"))
+
+_pool = ThreadPoolExecutor(max_workers=TAREAS_WORKERS, thread_name_prefix="tareas")
+
+
+def _ejecutar(app, funcion, args):
+    with app.app_context():
+        try:
+            funcion(*args)
+        except Exception as error:
+            print(f"Error en la tarea {funcion.__name__}: {error}")
+
+
+def encolar(funcion, *args):
+    """Ejecuta funcion(*args) en el pool con la app actual. Requiere contexto de app."""
+    return _pool.submit(_ejecutar, current_app._get_current_object(), funcion, args)
@@ -0,0 +1,26 @@
+"""Indice (fecha_creacion, id) en publicaciones para paginación por cursor
+
+Revision ID: 3c9b1f7d2a40
+Revises: 12e9a185667c
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9b1f7d2a40'
+down_revision = '12e9a185667c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.create_index('ix_publicaciones_fecha_creacion_id', ['fecha_creacion', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.drop_index('ix_publicaciones_fecha_creacion_id')
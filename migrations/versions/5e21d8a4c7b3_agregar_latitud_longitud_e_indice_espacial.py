@@ -0,0 +1,62 @@
+"""Agregar latitud/longitud e índice espacial a publicaciones
+
+Revision ID: 5e21d8a4c7b3
+Revises: 3c9b1f7d2a40
+Create Date: 2026-10-18 11:03:47.918220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e21d8a4c7b3'
+down_revision = '3c9b1f7d2a40'
+branch_labels = None
+depends_on = None
+
+# Cantidad de filas que se copian por UPDATE durante el backfill
+TAMANIO_LOTE = 5000
+
+
+def upgrade():
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitud', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitud', sa.Float(), nullable=True))
+
+    # Backfill por lotes desde el array coordenadas ([lat, lon]). Cada lote se
+    # confirma por separado: los locks de cada UPDATE se liberan al terminar el
+    # lote y no al final de toda la migración
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        while True:
+            resultado = conn.execute(sa.text("""
+                UPDATE publicaciones
+                SET latitud = coordenadas[1], longitud = coordenadas[2]
+                WHERE id IN (
+                    SELECT id FROM publicaciones
+                    WHERE latitud IS NULL
+                    AND coordenadas[1] IS NOT NULL
+                    AND coordenadas[2] IS NOT NULL
+                    ORDER BY id
+                    LIMIT :lote
+                )
+            """), {"lote": TAMANIO_LOTE})
+            if resultado.rowcount == 0:
+                break
+
+    # El índice se crea después del backfill para no mantenerlo fila por fila
+    op.create_index(
+        'ix_publicaciones_punto',
+        'publicaciones',
+        [sa.text('point(longitud, latitud)')],
+        unique=False,
+        postgresql_using='gist'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_publicaciones_punto', table_name='publicaciones', postgresql_using='gist')
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.drop_column('longitud')
+        batch_op.drop_column('latitud')
@@ -0,0 +1,98 @@
+"""Agregar búsqueda de texto (tsvector y trigramas) a publicaciones
+
+Revision ID: 8b4f2c6d1e93
+Revises: 5e21d8a4c7b3
+Create Date: 2026-10-18 15:42:10.331874
+
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4f2c6d1e93'
+down_revision = '5e21d8a4c7b3'
+branch_labels = None
+depends_on = None
+
+# Cantidad de filas que se procesan por lote durante el backfill
+TAMANIO_LOTE = 1000
+
+
+def _normalizar(texto):
+    # Misma normalización que core.models.normalizar_busqueda (copiada para que
+    # la migración no dependa del código de la app)
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFD', texto)
+    texto = texto.encode('ascii', 'ignore').decode('utf-8')
+    return texto.lower().strip()
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('texto_busqueda', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('busqueda', postgresql.TSVECTOR(), nullable=True))
+
+    # Backfill por lotes (keyset por id)
+    conn = op.get_bind()
+    actualizar = sa.text("""
+        UPDATE publicaciones
+        SET texto_busqueda = :texto,
+            busqueda = setweight(to_tsvector('spanish', :titulo), 'A')
+                    || setweight(to_tsvector('spanish', :descripcion), 'B')
+        WHERE id = :id
+    """)
+    ultimo_id = 0
+    while True:
+        filas = conn.execute(sa.text("""
+            SELECT id, titulo, descripcion FROM publicaciones
+            WHERE id > :ultimo_id
+            ORDER BY id
+            LIMIT :lote
+        """), {"ultimo_id": ultimo_id, "lote": TAMANIO_LOTE}).fetchall()
+        if not filas:
+            break
+
+        parametros = []
+        for fila in filas:
+            titulo = _normalizar(fila.titulo)
+            descripcion = _normalizar(fila.descripcion)
+            parametros.append({
+                "id": fila.id,
+                "texto": f"{titulo} {descripcion}".strip(),
+                "titulo": titulo,
+                "descripcion": descripcion,
+            })
+        conn.execute(actualizar, parametros)
+        ultimo_id = filas[-1].id
+
+    # Los índices se crean después del backfill para no mantenerlos fila por fila
+    op.create_index(
+        'ix_publicaciones_busqueda',
+        'publicaciones',
+        ['busqueda'],
+        unique=False,
+        postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_publicaciones_texto_busqueda_trgm',
+        'publicaciones',
+        ['texto_busqueda'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'texto_busqueda': 'gin_trgm_ops'}
+    )
+
+
+def downgrade():
+    op.drop_index('ix_publicaciones_texto_busqueda_trgm', table_name='publicaciones', postgresql_using='gin')
+    op.drop_index('ix_publicaciones_busqueda', table_name='publicaciones', postgresql_using='gin')
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.drop_column('busqueda')
+        batch_op.drop_column('texto_busqueda')
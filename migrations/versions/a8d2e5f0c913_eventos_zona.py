@@ -0,0 +1,52 @@
+"""Eventos de zona (avisos por localidad leídos al consultar) y marca de lectura por usuario
+
+Revision ID: a8d2e5f0c913
+Revises: f3c9d6b1a742
+Create Date: 2026-10-18 21:02:11.563208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d2e5f0c913'
+down_revision = 'f3c9d6b1a742'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'eventos_zona',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_localidad', sa.BigInteger(), nullable=False),
+        sa.Column('id_publicacion', sa.Integer(), nullable=False),
+        sa.Column('id_autor', sa.Integer(), nullable=False),
+        sa.Column('titulo', sa.Text(), nullable=True),
+        sa.Column('descripcion', sa.Text(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['id_localidad'], ['localidades.id'], ),
+        sa.ForeignKeyConstraint(['id_publicacion'], ['publicaciones.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['id_autor'], ['usuarios.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('eventos_zona', schema=None) as batch_op:
+        batch_op.create_index('ix_eventos_zona_localidad_id', ['id_localidad', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_eventos_zona_id_publicacion'), ['id_publicacion'], unique=False)
+        batch_op.create_index(batch_op.f('ix_eventos_zona_id_autor'), ['id_autor'], unique=False)
+
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('id_evento_zona_leido', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_column('id_evento_zona_leido')
+
+    with op.batch_alter_table('eventos_zona', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_eventos_zona_id_autor'))
+        batch_op.drop_index(batch_op.f('ix_eventos_zona_id_publicacion'))
+        batch_op.drop_index('ix_eventos_zona_localidad_id')
+
+    op.drop_table('eventos_zona')
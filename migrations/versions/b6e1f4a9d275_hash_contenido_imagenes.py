@@ -0,0 +1,28 @@
+"""Hash de contenido (SHA-256) en imagenes para no volver a subir la misma foto
+
+Revision ID: b6e1f4a9d275
+Revises: a8d2e5f0c913
+Create Date: 2026-10-18 21:48:05.917342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1f4a9d275'
+down_revision = 'a8d2e5f0c913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hash_contenido', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_imagenes_hash_contenido'), ['hash_contenido'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_imagenes_hash_contenido'))
+        batch_op.drop_column('hash_contenido')
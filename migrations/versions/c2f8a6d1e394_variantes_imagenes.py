@@ -0,0 +1,40 @@
+"""Variantes (miniatura, tarjeta, completa) y metadatos de las imágenes
+
+Revision ID: c2f8a6d1e394
+Revises: b6e1f4a9d275
+Create Date: 2026-10-18 22:31:44.108527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f8a6d1e394'
+down_revision = 'b6e1f4a9d275'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('url_miniatura', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('url_tarjeta', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('url_completa', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('ancho', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('alto', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('tamanio_bytes', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('color_dominante', sa.String(length=7), nullable=True))
+        batch_op.add_column(sa.Column('placeholder', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.drop_column('placeholder')
+        batch_op.drop_column('color_dominante')
+        batch_op.drop_column('tamanio_bytes')
+        batch_op.drop_column('alto')
+        batch_op.drop_column('ancho')
+        batch_op.drop_column('url_completa')
+        batch_op.drop_column('url_tarjeta')
+        batch_op.drop_column('url_miniatura')
@@ -0,0 +1,33 @@
+"""Agregar tabla tarjetas_publicacion (listados pre-renderizados)
+
+Revision ID: c7e1a9d34b52
+Revises: 8b4f2c6d1e93
+Create Date: 2026-10-18 17:20:05.114302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e1a9d34b52'
+down_revision = '8b4f2c6d1e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sin backfill: cada tarjeta se arma y se guarda la primera vez que se lista
+    op.create_table(
+        'tarjetas_publicacion',
+        sa.Column('id_publicacion', sa.Integer(), nullable=False),
+        sa.Column('datos', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('fecha_actualizacion', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['id_publicacion'], ['publicaciones.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id_publicacion')
+    )
+
+
+def downgrade():
+    op.drop_table('tarjetas_publicacion')
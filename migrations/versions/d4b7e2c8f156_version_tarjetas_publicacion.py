@@ -0,0 +1,26 @@
+"""Versión (fecha_modificacion de la publicación) en tarjetas_publicacion
+
+Revision ID: d4b7e2c8f156
+Revises: c2f8a6d1e394
+Create Date: 2026-10-19 10:12:37.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b7e2c8f156'
+down_revision = 'c2f8a6d1e394'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tarjetas_publicacion', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tarjetas_publicacion', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,27 @@
+"""Agregar phash (hash perceptual) a imagenes
+
+Revision ID: d5a8f1c3e027
+Revises: c7e1a9d34b52
+Create Date: 2026-10-18 19:02:41.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8f1c3e027'
+down_revision = 'c7e1a9d34b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sin backfill acá (hay que descargar cada imagen): `flask imagenes calcular-phash`
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phash', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.drop_column('phash')
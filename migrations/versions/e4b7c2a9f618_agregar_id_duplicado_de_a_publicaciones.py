@@ -0,0 +1,33 @@
+"""Agregar id_duplicado_de a publicaciones
+
+Revision ID: e4b7c2a9f618
+Revises: d5a8f1c3e027
+Create Date: 2026-10-18 19:48:12.906537
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c2a9f618'
+down_revision = 'd5a8f1c3e027'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las publicaciones existentes se marcan con `flask publicaciones marcar-duplicados`
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('id_duplicado_de', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'publicaciones_id_duplicado_de_fkey', 'publicaciones', ['id_duplicado_de'], ['id'], ondelete='SET NULL'
+        )
+        batch_op.create_index(batch_op.f('ix_publicaciones_id_duplicado_de'), ['id_duplicado_de'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('publicaciones', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_publicaciones_id_duplicado_de'))
+        batch_op.drop_constraint('publicaciones_id_duplicado_de_fkey', type_='foreignkey')
+        batch_op.drop_column('id_duplicado_de')
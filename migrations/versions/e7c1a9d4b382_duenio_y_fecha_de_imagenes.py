@@ -0,0 +1,34 @@
+"""Dueño (id_usuario) y fecha de creación de las imágenes
+
+Revision ID: e7c1a9d4b382
+Revises: d4b7e2c8f156
+Create Date: 2026-10-19 11:03:52.617204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c1a9d4b382'
+down_revision = 'd4b7e2c8f156'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('id_usuario', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column(
+            'fecha_creacion', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True
+        ))
+        batch_op.create_foreign_key(
+            'imagenes_id_usuario_fkey', 'usuarios', ['id_usuario'], ['id'], ondelete='SET NULL'
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('imagenes', schema=None) as batch_op:
+        batch_op.drop_constraint('imagenes_id_usuario_fkey', type_='foreignkey')
+        batch_op.drop_column('fecha_creacion')
+        batch_op.drop_column('id_usuario')
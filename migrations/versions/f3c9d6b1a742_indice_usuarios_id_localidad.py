@@ -0,0 +1,26 @@
+"""Índice en usuarios.id_localidad (fan-out de notificaciones por zona)
+
+Revision ID: f3c9d6b1a742
+Revises: e4b7c2a9f618
+Create Date: 2026-10-18 20:15:37.284519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9d6b1a742'
+down_revision = 'e4b7c2a9f618'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_usuarios_id_localidad'), ['id_localidad'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_usuarios_id_localidad'))
@@ -0,0 +1,113 @@
+"""
+Cache de respuestas del home y de filtrar (components/publicaciones/cache_respuestas.py).
+
+Tarjetas sintéticas, sin base de datos: se verifica qué páginas invalida cada
+escritura según la posición de la publicación en el orden (fecha_creacion
+desc, id desc) y que una respuesta calculada durante una escritura no se guarde.
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from components.publicaciones.cache_respuestas import (
+    cache_respuestas,
+    clave_feed,
+    clave_filtrar,
+    generacion_actual,
+    guardar_respuesta,
+    invalidar_respuestas,
+    obtener_respuesta,
+)
+from components.publicaciones.indice_geo import fecha_a_timestamp
+
+INICIO = datetime(2026, 1, 1, tzinfo=timezone.utc)
+LIMIT = 4
+
+
+def _fecha(id_publicacion):
+    # Ids más altos son más nuevos, como en el feed real
+    return INICIO + timedelta(hours=id_publicacion)
+
+
+def _tarjeta(id_publicacion):
+    return {"id": id_publicacion, "fecha_creacion": _fecha(id_publicacion).isoformat()}
+
+
+def _ts(id_publicacion):
+    return fecha_a_timestamp(_fecha(id_publicacion))
+
+
+class TestCacheRespuestas(unittest.TestCase):
+    def setUp(self):
+        cache_respuestas.limpiar()
+        # Feed de 11 publicaciones (ids 11..1): páginas [11..8], [7..4], [3..1] (incompleta)
+        self.paginas = {}
+        ids = list(range(11, 0, -1))
+        for page in range(3):
+            clave = clave_feed(page, LIMIT, None)
+            tarjetas = [_tarjeta(i) for i in ids[page * LIMIT:(page + 1) * LIMIT]]
+            guardar_respuesta(clave, tarjetas, LIMIT, generacion_actual())
+            self.paginas[page] = clave
+
+    def _vigentes(self):
+        return {page for page, clave in self.paginas.items() if obtener_respuesta(clave) is not None}
+
+    def test_editar_invalida_su_pagina_y_las_siguientes(self):
+        invalidar_respuestas(6, _ts(6))
+        self.assertEqual(self._vigentes(), {0})
+
+    def test_alta_mas_nueva_invalida_todo(self):
+        invalidar_respuestas(12, _ts(12))
+        self.assertEqual(self._vigentes(), set())
+
+    def test_alta_vieja_solo_invalida_la_pagina_incompleta(self):
+        # Cae detrás de las páginas completas; la última (incompleta) crece
+        invalidar_respuestas(100, fecha_a_timestamp(INICIO - timedelta(days=1)))
+        self.assertEqual(self._vigentes(), {0, 1})
+
+    def test_sin_fecha_invalida_de_mas(self):
+        invalidar_respuestas(6)
+        self.assertEqual(self._vigentes(), set())
+
+    def test_sin_publicacion_invalida_todo(self):
+        invalidar_respuestas()
+        self.assertEqual(self._vigentes(), set())
+
+    def test_filtrar_por_otra_categoria_no_se_invalida(self):
+        filtros = {"id_categoria": "2"}
+        clave = clave_filtrar(filtros, 0, LIMIT, None)
+        guardar_respuesta(clave, [_tarjeta(i) for i in (10, 7, 5, 2)], LIMIT, generacion_actual())
+
+        invalidar_respuestas(9, _ts(9), categorias={1, 3})
+        self.assertIsNotNone(obtener_respuesta(clave))
+        # Pasó de la categoría 1 a la 2: ahora entra en la página
+        invalidar_respuestas(9, _ts(9), categorias={1, 2})
+        self.assertIsNone(obtener_respuesta(clave))
+
+    def test_respuesta_calculada_durante_una_escritura_no_se_guarda(self):
+        clave = clave_feed(0, 20, None)
+        generacion = generacion_actual()
+        invalidar_respuestas(3, _ts(3))
+        guardar_respuesta(clave, [_tarjeta(3)], 20, generacion)
+        self.assertIsNone(obtener_respuesta(clave))
+
+        guardar_respuesta(clave, [_tarjeta(3)], 20, generacion_actual())
+        self.assertEqual(obtener_respuesta(clave), [_tarjeta(3)])
+
+    def test_claves_no_cacheadas(self):
+        self.assertIsNone(clave_feed(3, LIMIT, None))
+        self.assertIsNone(clave_feed(0, 100, None))
+        self.assertIsNone(clave_feed(0, LIMIT, "cursor"))
+        self.assertIsNone(clave_filtrar({"lat": -34.6, "lon": -58.4}, 0, LIMIT, None))
+        self.assertIsNone(clave_filtrar({"id_usuario": "7"}, 0, LIMIT, None))
+        self.assertEqual(
+            clave_filtrar({"etiquetas": ["perro", " gato", "perro"]}, 0, LIMIT, None),
+            clave_filtrar({"etiquetas": ["gato", "perro"]}, 0, LIMIT, None)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
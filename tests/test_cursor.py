@@ -0,0 +1,137 @@
+"""
+Paginación por cursor del listado (components/publicaciones/services.py).
+
+Los dos caminos de la fase 1 tienen que dar las mismas páginas y cursores
+intercambiables: _paginar_en_memoria (candidatos del índice geográfico) y
+_paginar_publicaciones (keyset en la base). La base es SQLite en memoria con
+solo las columnas que lee la fase 1; alcanza para el orden y la comparación
+de tuplas (fecha_creacion, id).
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+from sqlalchemy import text
+
+from core.models import db
+from components.publicaciones.indice_geo import fecha_a_timestamp
+from components.publicaciones.services import (
+    _paginar_en_memoria,
+    _paginar_publicaciones,
+    _query_ids_activas,
+    codificar_cursor,
+    decodificar_cursor,
+)
+
+INICIO = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _publicaciones(rng, cantidad=57):
+    """[(id, fecha_creacion)] con fechas repetidas para ejercitar el desempate por id."""
+    return [(id_pub, INICIO + timedelta(hours=rng.randrange(20))) for id_pub in range(1, cantidad + 1)]
+
+
+def _esperado(publicaciones):
+    return [id_pub for id_pub, _ in sorted(publicaciones, key=lambda p: (p[1], p[0]), reverse=True)]
+
+
+def _posicion(cursor):
+    """(timestamp, id) de un cursor: SQLite devuelve fechas sin zona y Postgres con zona."""
+    fecha, id_publicacion = decodificar_cursor(cursor)
+    return fecha_a_timestamp(fecha), id_publicacion
+
+
+def _normalizar(pagina):
+    ids, cursor = pagina
+    return ids, cursor and _posicion(cursor)
+
+
+def _recorrer(paginar, limit):
+    """Todas las páginas siguiendo next_cursor: (ids en orden, cursores)."""
+    ids, cursores, cursor = [], [], ""
+    # Un cursor que no avanza repetiría la misma página para siempre
+    for _ in range(1000):
+        pagina, cursor = paginar(cursor, limit)
+        ids.extend(pagina)
+        if cursor is None:
+            return ids, cursores
+        cursores.append(cursor)
+    raise AssertionError("La paginación no termina")
+
+
+class TestCursor(unittest.TestCase):
+    def test_codificar_y_decodificar(self):
+        fecha = datetime(2026, 3, 4, 5, 6, 7, 890000, tzinfo=timezone.utc)
+        cursor = codificar_cursor(fecha, 123)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decodificar_cursor(cursor), (fecha, 123))
+
+    def test_cursor_invalido(self):
+        for cursor in ("no-es-base64!", codificar_cursor(INICIO, 1)[:-3], "W10"):
+            with self.assertRaises(ValueError):
+                decodificar_cursor(cursor)
+
+
+class TestPaginacion(unittest.TestCase):
+    def setUp(self):
+        self.publicaciones = _publicaciones(random.Random(20261018))
+        self.candidatos = [(id_pub, fecha_a_timestamp(fecha)) for id_pub, fecha in self.publicaciones]
+
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.contexto = self.app.app_context()
+        self.contexto.push()
+        db.session.execute(text(
+            "CREATE TABLE publicaciones (id INTEGER PRIMARY KEY, fecha_creacion DATETIME, estado INTEGER)"
+        ))
+        db.session.execute(
+            text("INSERT INTO publicaciones (id, fecha_creacion, estado) VALUES (:id, :fecha, 0)"),
+            [{"id": id_pub, "fecha": fecha.strftime("%Y-%m-%d %H:%M:%S.%f")} for id_pub, fecha in self.publicaciones]
+        )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        self.contexto.pop()
+
+    def _en_memoria(self, cursor, limit):
+        return _paginar_en_memoria(self.candidatos, limit=limit, cursor=cursor)
+
+    def _en_base(self, cursor, limit):
+        return _paginar_publicaciones(_query_ids_activas(), limit=limit, cursor=cursor)
+
+    def test_ambos_caminos_recorren_todo_en_orden(self):
+        esperado = _esperado(self.publicaciones)
+        for limit in (1, 5, 12, len(esperado), len(esperado) + 1):
+            ids_memoria, cursores_memoria = _recorrer(self._en_memoria, limit)
+            ids_base, cursores_base = _recorrer(self._en_base, limit)
+            self.assertEqual(ids_memoria, esperado)
+            self.assertEqual(ids_base, esperado)
+            self.assertEqual(
+                [_posicion(c) for c in cursores_memoria], [_posicion(c) for c in cursores_base]
+            )
+
+    def test_cursores_intercambiables(self):
+        # Un cliente puede pasar de un camino al otro (el índice se vuelve disponible o no) entre páginas
+        cursor_memoria = self._en_memoria("", 10)[1]
+        cursor_base = self._en_base("", 10)[1]
+        self.assertEqual(_posicion(cursor_memoria), _posicion(cursor_base))
+        for cursor in (cursor_memoria, cursor_base):
+            self.assertEqual(
+                _normalizar(self._en_base(cursor, 10)), _normalizar(self._en_memoria(cursor, 10))
+            )
+
+    def test_offset_sin_cursor(self):
+        esperado = _esperado(self.publicaciones)
+        self.assertEqual(_paginar_en_memoria(self.candidatos, offset=20, limit=7), (esperado[20:27], None))
+        self.assertEqual(_paginar_publicaciones(_query_ids_activas(), offset=20, limit=7), (esperado[20:27], None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Detección de casi duplicados (components/publicaciones/duplicados.py).
+
+Textos sintéticos ya normalizados: la similitud MinHash estima la de Jaccard
+de los shingles y el LSH deja pasar lo que está por encima de UMBRAL_DUPLICADO
+y descarta lo que está claramente por debajo.
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import random
+import unittest
+
+import numpy as np
+
+from components.publicaciones.duplicados import (
+    NUM_PERMUTACIONES,
+    UMBRAL_DUPLICADO,
+    IndiceDuplicados,
+    _shingles,
+    firma_minhash,
+    original_de,
+)
+
+VOCABULARIO = [f"palabra{i}" for i in range(5000)]
+
+
+def _jaccard(a, b):
+    sa, sb = _shingles(a), _shingles(b)
+    return len(sa & sb) / len(sa | sb)
+
+
+def _estimada(a, b):
+    return float(np.count_nonzero(firma_minhash(a) == firma_minhash(b))) / NUM_PERMUTACIONES
+
+
+class TestDuplicados(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(20261018)
+
+    def _texto(self, palabras=60):
+        return " ".join(self.rng.sample(VOCABULARIO, palabras))
+
+    def _variante(self, texto, cambios):
+        """El mismo texto con `cambios` palabras reemplazadas."""
+        palabras = texto.split()
+        for posicion in self.rng.sample(range(len(palabras)), cambios):
+            palabras[posicion] = self.rng.choice(VOCABULARIO)
+        return " ".join(palabras)
+
+    def test_firma_vacia_y_determinista(self):
+        self.assertIsNone(firma_minhash(""))
+        self.assertIsNone(firma_minhash(None))
+        texto = self._texto()
+        self.assertTrue(np.array_equal(firma_minhash(texto), firma_minhash(texto)))
+
+    def test_similitud_estima_jaccard(self):
+        base = self._texto(80)
+        for cambios in (0, 1, 3, 6, 12, 25, 50):
+            otro = self._variante(base, cambios)
+            # Error estándar de MinHash con 128 permutaciones: ~0.044
+            self.assertAlmostEqual(_estimada(base, otro), _jaccard(base, otro), delta=0.15)
+
+    def test_umbral_del_lsh(self):
+        indice = IndiceDuplicados()
+        filas, casi_iguales, distintas = [], [], []
+        for id_publicacion in range(1, 201):
+            base = self._texto()
+            filas.append((id_publicacion, firma_minhash(base), 1, 1, None))
+            # Una palabra cambiada en 60: Jaccard ~0.9
+            casi_iguales.append((id_publicacion, self._variante(base, 1)))
+            # Un tercio de las palabras cambiadas: Jaccard bien por debajo del umbral
+            distintas.append((id_publicacion, self._variante(base, 20)))
+        indice.cargar(filas)
+
+        encontradas = sum(
+            any(id_similar == id_publicacion for id_similar, _, _ in indice.similares(firma_minhash(texto)))
+            for id_publicacion, texto in casi_iguales
+        )
+        self.assertGreaterEqual(encontradas, 195)
+
+        for id_publicacion, texto in distintas:
+            similares = indice.similares(firma_minhash(texto))
+            self.assertNotIn(id_publicacion, [id_similar for id_similar, _, _ in similares])
+            self.assertTrue(all(similitud >= UMBRAL_DUPLICADO for _, similitud, _ in similares))
+
+    def test_filtro_por_usuario_o_localidad(self):
+        texto = self._texto()
+        indice = IndiceDuplicados()
+        indice.cargar([
+            (1, firma_minhash(texto), 10, 100, None),
+            (2, firma_minhash(texto), 20, 200, None),
+        ])
+        firma = firma_minhash(texto)
+        self.assertEqual({r[0] for r in indice.similares(firma)}, {1, 2})
+        self.assertEqual({r[0] for r in indice.similares(firma, id_usuario=10)}, {1})
+        self.assertEqual({r[0] for r in indice.similares(firma, id_locacion=200)}, {2})
+        self.assertEqual({r[0] for r in indice.similares(firma, id_usuario=10, id_locacion=200)}, {1, 2})
+        self.assertEqual(indice.similares(firma, id_usuario=30, id_locacion=300), [])
+        self.assertEqual({r[0] for r in indice.similares(firma, excluir=1)}, {2})
+
+    def test_actualizar_quitar_y_original(self):
+        texto, otro = self._texto(), self._texto()
+        indice = IndiceDuplicados()
+        indice.cargar([])
+        indice.agregar_o_actualizar(1, firma_minhash(texto), 10, 100)
+        indice.agregar_o_actualizar(5, firma_minhash(texto), 10, 100, id_original=1)
+        # La original es la más vieja, siguiendo su marca si era un duplicado
+        self.assertEqual(original_de(indice.similares(firma_minhash(texto))), 1)
+
+        indice.agregar_o_actualizar(1, firma_minhash(otro), 10, 100)
+        self.assertEqual(original_de(indice.similares(firma_minhash(texto))), 1)
+        indice.quitar(5)
+        self.assertIsNone(original_de(indice.similares(firma_minhash(texto))))
+        self.assertEqual(indice.estadisticas()["publicaciones"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Índice geográfico en memoria (components/publicaciones/indice_geo.py).
+
+Puntos sintéticos, sin base de datos. La búsqueda de las más cercanas por
+anillos de celdas (mas_cercanas) y la de radio se comparan contra una
+búsqueda por fuerza bruta con la misma distancia haversine.
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import random
+import unittest
+
+from components.publicaciones.indice_geo import IndiceGeo, distancia_km
+
+CATEGORIAS = (None, 1, 2, 3)
+
+
+def _puntos(rng, cantidad):
+    """
+    [(id, lat, lon, id_categoria, fecha_ts)]: la mayoría agrupados en unas pocas
+    ciudades (muchos por celda), otros dispersos por el país y algunos lejos.
+    """
+    ciudades = [(-34.60, -58.38), (-31.42, -64.18), (-32.95, -60.66), (-24.78, -65.41)]
+    puntos = []
+    for id_pub in range(1, cantidad + 1):
+        tipo = rng.random()
+        if tipo < 0.7:
+            lat0, lon0 = rng.choice(ciudades)
+            lat, lon = lat0 + rng.gauss(0, 0.08), lon0 + rng.gauss(0, 0.08)
+        elif tipo < 0.95:
+            lat, lon = rng.uniform(-55, -22), rng.uniform(-73, -54)
+        else:
+            lat, lon = rng.uniform(-80, 80), rng.uniform(-170, 170)
+        puntos.append((id_pub, lat, lon, rng.choice(CATEGORIAS), float(rng.randrange(1_000_000))))
+    return puntos
+
+
+def _fuerza_bruta(puntos, lat, lon, cantidad, radio_km=None, id_categoria=None, fecha_min=None):
+    candidatos = []
+    for id_pub, plat, plon, categoria, fecha in puntos:
+        if id_categoria is not None and (categoria or 0) != id_categoria:
+            continue
+        if fecha_min is not None and fecha < fecha_min:
+            continue
+        distancia = distancia_km(lat, lon, plat, plon)
+        if radio_km is None or distancia <= radio_km:
+            candidatos.append((distancia, id_pub))
+    return [(id_pub, distancia) for distancia, id_pub in sorted(candidatos)[:cantidad]]
+
+
+def _ids_y_distancias(resultado):
+    return [(id_pub, distancia) for id_pub, _, distancia in resultado]
+
+
+class TestIndiceGeo(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(20261018)
+        self.puntos = _puntos(self.rng, 3000)
+        self.indice = IndiceGeo()
+        self.indice.cargar(self.puntos)
+
+    def _consultas(self, cantidad):
+        for _ in range(cantidad):
+            if self.rng.random() < 0.5:
+                _, lat, lon, _, _ = self.rng.choice(self.puntos)
+                yield lat + self.rng.gauss(0, 0.05), lon + self.rng.gauss(0, 0.05)
+            else:
+                yield self.rng.uniform(-56, -20), self.rng.uniform(-75, -50)
+
+    def test_mas_cercanas_igual_a_fuerza_bruta(self):
+        for lat, lon in self._consultas(60):
+            for cantidad in (1, 7, 50, 400):
+                self.assertEqual(
+                    _ids_y_distancias(self.indice.mas_cercanas(lat, lon, cantidad)),
+                    _fuerza_bruta(self.puntos, lat, lon, cantidad),
+                    (lat, lon, cantidad)
+                )
+
+    def test_mas_cercanas_con_radio_y_filtros(self):
+        for lat, lon in self._consultas(40):
+            for radio_km, id_categoria, fecha_min in ((5, None, None), (30, 2, None), (200, None, 500_000.0),
+                                                      (None, 3, 250_000.0)):
+                self.assertEqual(
+                    _ids_y_distancias(self.indice.mas_cercanas(
+                        lat, lon, 25, radio_km=radio_km, id_categoria=id_categoria, fecha_min=fecha_min
+                    )),
+                    _fuerza_bruta(self.puntos, lat, lon, 25, radio_km, id_categoria, fecha_min),
+                    (lat, lon, radio_km, id_categoria, fecha_min)
+                )
+
+    def test_pide_mas_de_las_que_hay(self):
+        lat, lon = -34.6, -58.4
+        self.assertEqual(
+            _ids_y_distancias(self.indice.mas_cercanas(lat, lon, len(self.puntos) + 10)),
+            _fuerza_bruta(self.puntos, lat, lon, len(self.puntos) + 10)
+        )
+        self.assertEqual(self.indice.mas_cercanas(lat, lon, 0), [])
+
+    def test_empates_por_id(self):
+        indice = IndiceGeo()
+        indice.cargar([(id_pub, -34.6, -58.4, None, 0.0) for id_pub in (9, 3, 7, 1)])
+        self.assertEqual([r[0] for r in indice.mas_cercanas(-34.61, -58.41, 3)], [1, 3, 7])
+
+    def test_en_radio_igual_a_fuerza_bruta(self):
+        for lat, lon in self._consultas(40):
+            for radio_km in (1, 10, 80):
+                self.assertEqual(
+                    sorted((id_pub, d) for id_pub, _, d in self.indice.en_radio(lat, lon, radio_km)),
+                    sorted(_fuerza_bruta(self.puntos, lat, lon, len(self.puntos), radio_km))
+                )
+
+    def test_actualizaciones_incrementales(self):
+        vigentes = {p[0]: p for p in self.puntos}
+        for _ in range(500):
+            id_pub = self.rng.choice(list(vigentes))
+            if self.rng.random() < 0.4:
+                self.indice.quitar(id_pub)
+                del vigentes[id_pub]
+            else:
+                _, lat, lon, categoria, fecha = vigentes[id_pub]
+                movido = (id_pub, lat + self.rng.gauss(0, 0.3), lon + self.rng.gauss(0, 0.3), categoria, fecha)
+                self.indice.agregar_o_actualizar(*movido)
+                vigentes[id_pub] = movido
+
+        puntos = list(vigentes.values())
+        self.assertEqual(self.indice.estadisticas()["publicaciones"], len(puntos))
+        for lat, lon in self._consultas(30):
+            self.assertEqual(
+                _ids_y_distancias(self.indice.mas_cercanas(lat, lon, 30)),
+                _fuerza_bruta(puntos, lat, lon, 30)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
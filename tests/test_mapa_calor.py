@@ -0,0 +1,133 @@
+"""
+Mapa de calor (components/publicaciones/mapa_calor.py).
+
+Usa el índice geográfico en memoria con puntos sintéticos, sin base de datos.
+Después de cada alta, movimiento o baja, las grillas cacheadas y corregidas
+en el lugar (actualizar_mapas_calor) tienen que ser iguales a las que se
+arman de cero.
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import random
+import unittest
+from datetime import datetime, timezone
+
+from components.publicaciones.indice_geo import fecha_a_timestamp, indice_geo
+from components.publicaciones.mapa_calor import (
+    _construir,
+    _serializar,
+    actualizar_mapas_calor,
+    cache_mapas_calor,
+    obtener_mapa_calor,
+)
+
+INICIO_TS = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+DIA = 86400
+
+CAJA = ("-35.0", "-59.0", "-34.0", "-58.0")
+# (resolucion, id_categoria, fecha_min, fecha_max, por_categoria)
+CONSULTAS = [
+    (64, None, None, None, False),
+    (16, None, None, None, True),
+    (32, 2, None, None, False),
+    (8, None, "2026-01-10", "2026-01-20", False),
+    (5, None, "2026-01-05", None, True),
+]
+
+
+def _aleatorio(rng, id_publicacion):
+    return (
+        id_publicacion,
+        rng.uniform(-35.2, -33.8), rng.uniform(-59.2, -57.8),
+        rng.choice((None, 1, 2, 3)),
+        INICIO_TS + rng.randrange(30 * DIA),
+    )
+
+
+class TestMapaCalor(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(20261018)
+        self.puntos = {id_pub: _aleatorio(self.rng, id_pub) for id_pub in range(1, 1201)}
+        indice_geo.cargar(list(self.puntos.values()))
+        cache_mapas_calor.limpiar()
+
+    def tearDown(self):
+        indice_geo.cargar([])
+        cache_mapas_calor.limpiar()
+
+    def _pedir(self, consulta):
+        resolucion, id_categoria, fecha_min, fecha_max, por_categoria = consulta
+        return obtener_mapa_calor(CAJA, resolucion, id_categoria, fecha_min, fecha_max, por_categoria)
+
+    def _de_cero(self, consulta):
+        # Los mismos parámetros ya normalizados que arma obtener_mapa_calor
+        resolucion, id_categoria, fecha_min, fecha_max, por_categoria = consulta
+        caja = tuple(float(v) for v in CAJA)
+        return _serializar(_construir(
+            caja, resolucion, id_categoria, fecha_a_timestamp(fecha_min), fecha_a_timestamp(fecha_max), por_categoria
+        ))
+
+    def _cambiar(self, id_publicacion, nuevo):
+        """Aplica el cambio al índice y a las grillas, como sincronizar_publicacion + _propagar_cambio."""
+        previo = indice_geo.registro(id_publicacion)
+        if nuevo is None:
+            indice_geo.quitar(id_publicacion)
+            self.puntos.pop(id_publicacion, None)
+        else:
+            indice_geo.agregar_o_actualizar(*nuevo)
+            self.puntos[id_publicacion] = nuevo
+        actualizar_mapas_calor(previo, indice_geo.registro(id_publicacion))
+
+    def test_primera_consulta_y_cache(self):
+        for consulta in CONSULTAS:
+            datos, desde_cache = self._pedir(consulta)
+            self.assertFalse(desde_cache)
+            self.assertEqual(datos, self._de_cero(consulta))
+            self.assertEqual(self._pedir(consulta), (datos, True))
+
+    def test_total_coincide_con_los_puntos(self):
+        datos, _ = self._pedir(CONSULTAS[0])
+        dentro = sum(1 for _, lat, lon, _, _ in self.puntos.values() if -35 <= lat <= -34 and -59 <= lon <= -58)
+        self.assertEqual(datos["total"], dentro)
+        self.assertEqual(sum(c[2] for c in datos["celdas"]), dentro)
+
+    def test_cambios_incrementales_igual_a_rehacer(self):
+        for consulta in CONSULTAS:
+            self._pedir(consulta)
+
+        siguiente_id = max(self.puntos) + 1
+        for _ in range(300):
+            tipo = self.rng.random()
+            if tipo < 0.3:
+                self._cambiar(siguiente_id, _aleatorio(self.rng, siguiente_id))
+                siguiente_id += 1
+            elif tipo < 0.5:
+                self._cambiar(self.rng.choice(list(self.puntos)), None)
+            else:
+                id_pub = self.rng.choice(list(self.puntos))
+                self._cambiar(id_pub, _aleatorio(self.rng, id_pub))
+
+        vigentes = 0
+        for consulta in CONSULTAS:
+            datos, desde_cache = self._pedir(consulta)
+            vigentes += desde_cache
+            self.assertEqual(datos, self._de_cero(consulta), consulta)
+        # Las grillas sin capas por categoría nunca necesitan rehacerse
+        self.assertGreaterEqual(vigentes, 3)
+
+    def test_cambio_fuera_de_la_caja_no_toca_la_grilla(self):
+        datos, _ = self._pedir(CONSULTAS[0])
+        self._cambiar(99999, (99999, 10.0, 10.0, None, INICIO_TS))
+        self.assertEqual(self._pedir(CONSULTAS[0]), (datos, True))
+
+    def test_parametros_invalidos(self):
+        with self.assertRaises(ValueError):
+            obtener_mapa_calor(("-34", "-58", "-35", "-59"))
+        with self.assertRaises(ValueError):
+            obtener_mapa_calor(CAJA, resolucion=1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
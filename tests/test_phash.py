@@ -0,0 +1,93 @@
+"""
+Índice de hashes perceptuales (components/imagenes/phash.py).
+
+Sin base de datos ni descargas: hashes sintéticos de 64 bits. Se verifica la
+garantía del índice multi-hash (todo hash a distancia <= r aparece) contra una
+búsqueda por fuerza bruta.
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import random
+import unittest
+
+from components.imagenes.phash import DISTANCIA_MAXIMA, IndicePhash, distancia_hamming
+
+
+def _firmado(valor):
+    """Como se guarda en imagenes.phash (BIGINT con signo)."""
+    return valor - (1 << 64) if valor >= (1 << 63) else valor
+
+
+def _a_distancia(phash, distancia, rng):
+    """Un hash a exactamente `distancia` bits de `phash`."""
+    bits = rng.sample(range(64), distancia)
+    valor = phash & 0xFFFFFFFFFFFFFFFF
+    for bit in bits:
+        valor ^= 1 << bit
+    return _firmado(valor)
+
+
+class TestIndicePhash(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(20261018)
+
+    def test_encuentra_todo_lo_que_esta_dentro_del_radio(self):
+        # Cada distancia de 0 a DISTANCIA_MAXIMA, con los bits cambiados en cualquier tramo
+        base = _firmado(self.rng.getrandbits(64))
+        filas = [(id_imagen, _a_distancia(base, id_imagen % (DISTANCIA_MAXIMA + 1), self.rng), 1)
+                 for id_imagen in range(1, 400)]
+        indice = IndicePhash()
+        indice.cargar(filas)
+
+        for radio in range(DISTANCIA_MAXIMA + 1):
+            encontrados = {id_imagen for id_imagen, _, _ in indice.similares(base, radio)}
+            esperados = {id_imagen for id_imagen, phash, _ in filas if distancia_hamming(base, phash) <= radio}
+            self.assertEqual(encontrados, esperados, f"radio {radio}")
+
+    def test_igual_a_fuerza_bruta_con_hashes_aleatorios(self):
+        filas = [(id_imagen, _firmado(self.rng.getrandbits(64)), id_imagen // 5) for id_imagen in range(2000)]
+        # Algunos vecinos cercanos para que haya resultados
+        filas += [(10000 + i, _a_distancia(filas[i][1], self.rng.randint(0, 12), self.rng), 7) for i in range(200)]
+        indice = IndicePhash()
+        indice.cargar(filas)
+
+        for _, consulta, _ in filas[:50] + filas[-50:]:
+            for radio in (0, 4, 10, DISTANCIA_MAXIMA):
+                encontrados = sorted(indice.similares(consulta, radio))
+                esperados = sorted(
+                    (id_imagen, id_publicacion, distancia_hamming(consulta, phash))
+                    for id_imagen, phash, id_publicacion in filas
+                    if distancia_hamming(consulta, phash) <= radio
+                )
+                self.assertEqual(encontrados, esperados)
+
+    def test_agregar_y_quitar(self):
+        indice = IndicePhash()
+        indice.cargar([])
+        phash = _firmado(self.rng.getrandbits(64))
+        cercano = _a_distancia(phash, 3, self.rng)
+
+        indice.agregar(1, phash, 10)
+        indice.agregar(2, cercano, 20)
+        self.assertEqual(sorted(indice.similares(phash, 5)), [(1, 10, 0), (2, 20, 3)])
+
+        # Volver a agregar reemplaza el hash anterior
+        indice.agregar(2, _firmado(~phash & 0xFFFFFFFFFFFFFFFF), 20)
+        self.assertEqual(indice.similares(phash, 5), [(1, 10, 0)])
+
+        indice.quitar([1, 2])
+        self.assertEqual(indice.similares(phash, DISTANCIA_MAXIMA), [])
+        self.assertEqual(indice.estadisticas()["imagenes"], 0)
+
+    def test_distancia_mayor_a_la_maxima_se_recorta(self):
+        indice = IndicePhash()
+        base = _firmado(self.rng.getrandbits(64))
+        indice.cargar([(1, base, 10), (2, _a_distancia(base, DISTANCIA_MAXIMA + 4, self.rng), 20)])
+        # Sin recortar, la imagen 2 aparecería o no según en qué tramos cayeron los bits
+        self.assertEqual(indice.similares(base, DISTANCIA_MAXIMA + 8), [(1, 10, 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
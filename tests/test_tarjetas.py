@@ -0,0 +1,88 @@
+"""
+Guardado de tarjetas con versión (components/publicaciones/tarjetas.py).
+
+Un listado que leyó la publicación antes de una edición no puede pisar la
+tarjeta que guardó la edición. El upsert es el mismo INSERT ... ON CONFLICT
+DO UPDATE ... WHERE que en Postgres; acá corre sobre SQLite en memoria, que
+tiene la misma sintaxis, con solo la tabla tarjetas_publicacion.
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from flask import Flask
+from sqlalchemy import text
+
+from core.models import db
+from components.publicaciones.tarjetas import (
+    guardar_tarjetas,
+    invalidar_tarjetas,
+    leer_tarjetas,
+    version_tarjeta,
+)
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+T1 = T0 + timedelta(minutes=5)
+
+
+class TestTarjetas(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.contexto = self.app.app_context()
+        self.contexto.push()
+        db.session.execute(text(
+            "CREATE TABLE tarjetas_publicacion (id_publicacion INTEGER PRIMARY KEY, datos JSON NOT NULL, "
+            "fecha_actualizacion DATETIME NOT NULL, version DATETIME)"
+        ))
+
+    def tearDown(self):
+        db.session.remove()
+        self.contexto.pop()
+
+    def test_version_mas_nueva_reemplaza(self):
+        guardar_tarjetas({1: {"titulo": "viejo"}}, {1: T0})
+        guardar_tarjetas({1: {"titulo": "nuevo"}}, {1: T1})
+        self.assertEqual(leer_tarjetas([1]), {1: {"titulo": "nuevo"}})
+
+    def test_version_vieja_no_pisa_a_la_nueva(self):
+        # La edición guardó primero; un listado con la lectura de antes llega después
+        guardar_tarjetas({1: {"titulo": "nuevo"}}, {1: T1})
+        guardar_tarjetas({1: {"titulo": "viejo"}}, {1: T0})
+        self.assertEqual(leer_tarjetas([1]), {1: {"titulo": "nuevo"}})
+
+    def test_misma_version_reemplaza(self):
+        # Cambios que no tocan la publicación (imágenes, etiquetas) rearman con la misma versión
+        guardar_tarjetas({1: {"imagenes": 1}}, {1: T0})
+        guardar_tarjetas({1: {"imagenes": 2}}, {1: T0})
+        self.assertEqual(leer_tarjetas([1]), {1: {"imagenes": 2}})
+
+    def test_tarjeta_sin_version_se_reemplaza(self):
+        guardar_tarjetas({1: {"titulo": "sin version"}}, {})
+        guardar_tarjetas({1: {"titulo": "viejo"}}, {1: T0})
+        self.assertEqual(leer_tarjetas([1]), {1: {"titulo": "viejo"}})
+
+    def test_varias_en_una_sentencia(self):
+        guardar_tarjetas({1: {"v": "a1"}, 2: {"v": "a2"}}, {1: T1, 2: T0})
+        guardar_tarjetas({1: {"v": "b1"}, 2: {"v": "b2"}, 3: {"v": "b3"}}, {1: T0, 2: T1, 3: T0})
+        self.assertEqual(leer_tarjetas([1, 2, 3]), {1: {"v": "a1"}, 2: {"v": "b2"}, 3: {"v": "b3"}})
+
+    def test_invalidar_permite_rearmar(self):
+        guardar_tarjetas({1: {"titulo": "nuevo"}}, {1: T1})
+        invalidar_tarjetas([1, None])
+        self.assertEqual(leer_tarjetas([1]), {})
+        guardar_tarjetas({1: {"titulo": "viejo"}}, {1: T0})
+        self.assertEqual(leer_tarjetas([1]), {1: {"titulo": "viejo"}})
+
+    def test_version_tarjeta(self):
+        self.assertEqual(version_tarjeta(SimpleNamespace(fecha_modificacion=T1, fecha_creacion=T0)), T1)
+        self.assertEqual(version_tarjeta(SimpleNamespace(fecha_modificacion=None, fecha_creacion=T0)), T0)
+
+
+if __name__ == "__main__":
+    unittest.main()
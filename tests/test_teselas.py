@@ -0,0 +1,103 @@
+"""
+Mapa por teselas (components/publicaciones/teselas.py).
+
+Zooms de clusters con el índice geográfico en memoria y puntos sintéticos, sin
+base de datos: cada publicación cae en una sola tesela, los clusters suman el
+total y quedan dentro de su tesela, y la invalidación solo borra las teselas
+que contienen el punto que cambió.
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import random
+import unittest
+
+from components.publicaciones.indice_geo import indice_geo
+from components.publicaciones.teselas import (
+    CELDAS_POR_LADO,
+    ZOOM_MARCADORES,
+    ZOOM_MAXIMO,
+    caja_de_tesela,
+    cache_teselas,
+    invalidar_teselas,
+    obtener_tesela,
+    tesela_de_punto,
+)
+
+
+class TestTeselas(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(20261018)
+        puntos = [
+            (id_pub, rng.gauss(-34.6, 0.3), rng.gauss(-58.4, 0.3), rng.choice((None, 1, 2)), 0.0)
+            for id_pub in range(1, 2001)
+        ]
+        # Puntos exactamente sobre bordes de teselas (zoom 6): no se pueden contar dos veces
+        lat_min, lon_min, lat_max, lon_max = caja_de_tesela(6, *tesela_de_punto(-34.6, -58.4, 6))
+        puntos += [
+            (3001, lat_min, -58.4, None, 0.0), (3002, -34.6, lon_min, None, 0.0),
+            (3003, lat_max, lon_max, None, 0.0),
+        ]
+        self.puntos = puntos
+        indice_geo.cargar(puntos)
+        cache_teselas.limpiar()
+
+    def tearDown(self):
+        indice_geo.cargar([])
+        cache_teselas.limpiar()
+
+    def _teselas(self, z, id_categoria=None):
+        teselas = {tesela_de_punto(lat, lon, z) for _, lat, lon, _, _ in self.puntos}
+        return {(x, y): obtener_tesela(z, x, y, id_categoria)[0] for x, y in teselas}
+
+    def test_cada_punto_en_una_sola_tesela(self):
+        for z in (0, 4, 6, 9, ZOOM_MARCADORES - 1):
+            teselas = self._teselas(z)
+            self.assertEqual(sum(datos["total"] for datos in teselas.values()), len(self.puntos), z)
+
+    def test_clusters(self):
+        for z in (3, 7, 11):
+            for (x, y), datos in self._teselas(z).items():
+                self.assertEqual(datos["tipo"], "clusters")
+                clusters = datos["clusters"]
+                self.assertLessEqual(len(clusters), CELDAS_POR_LADO ** 2)
+                self.assertEqual(sum(c["cantidad"] for c in clusters), datos["total"])
+                lat_min, lon_min, lat_max, lon_max = caja_de_tesela(z, x, y)
+                for cluster in clusters:
+                    self.assertTrue(lat_min <= cluster["lat"] <= lat_max and lon_min <= cluster["lon"] <= lon_max)
+                    self.assertEqual("id" in cluster, cluster["cantidad"] == 1)
+
+    def test_filtro_por_categoria(self):
+        z = 8
+        esperado = sum(1 for p in self.puntos if p[3] == 2)
+        self.assertEqual(sum(d["total"] for d in self._teselas(z, id_categoria=2).values()), esperado)
+
+    def test_cache_e_invalidacion(self):
+        lat, lon = -34.6, -58.4
+        x, y = tesela_de_punto(lat, lon, 10)
+        vecina = (x + 3, y)
+        obtener_tesela(10, x, y)
+        obtener_tesela(10, *vecina)
+        obtener_tesela(2, *tesela_de_punto(lat, lon, 2))
+        self.assertTrue(obtener_tesela(10, x, y)[1])
+
+        invalidar_teselas([(lat, lon), (None, None)])
+        self.assertFalse(obtener_tesela(10, x, y)[1])
+        self.assertFalse(obtener_tesela(2, *tesela_de_punto(lat, lon, 2))[1])
+        self.assertTrue(obtener_tesela(10, *vecina)[1])
+
+    def test_caja_y_tesela_coinciden(self):
+        for z in (0, 5, 12, ZOOM_MAXIMO):
+            x, y = tesela_de_punto(-34.6, -58.4, z)
+            lat_min, lon_min, lat_max, lon_max = caja_de_tesela(z, x, y)
+            self.assertEqual(tesela_de_punto((lat_min + lat_max) / 2, (lon_min + lon_max) / 2, z), (x, y))
+
+    def test_fuera_de_rango(self):
+        for z, x, y in ((-1, 0, 0), (ZOOM_MAXIMO + 1, 0, 0), (3, 8, 0), (3, 0, -1)):
+            with self.assertRaises(ValueError):
+                obtener_tesela(z, x, y)
+
+
+if __name__ == "__main__":
+    unittest.main()